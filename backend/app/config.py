@@ -10,14 +10,140 @@ MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "autofix_ai")
 
 # ChromaDB configuration
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", "4"))
+VECTOR_SEARCH_BATCH_WINDOW_MS = float(os.getenv("VECTOR_SEARCH_BATCH_WINDOW_MS", "5"))
+VECTOR_SEARCH_MAX_BATCH = int(os.getenv("VECTOR_SEARCH_MAX_BATCH", "32"))
+
+# Embedding configuration
+# "default" is Chroma's all-MiniLM-L6-v2 ONNX model run locally; or "module:factory" for any Chroma embedding function
+EMBEDDING_FUNCTION = os.getenv("EMBEDDING_FUNCTION", "default")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# ONNX Runtime intra-op threads; 0 lets it use every core
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Embeddings kept in memory, keyed by a hash of the text; 0 disables the cache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Directory of a memory-mapped embedding store shared across restarts and workers; empty disables it
+EMBEDDING_DISK_CACHE_PATH = os.getenv("EMBEDDING_DISK_CACHE_PATH", "")
+EMBEDDING_DISK_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_DISK_CACHE_MAX_ENTRIES", "1000000"))
+
+# Knowledge-base ingestion configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "150"))
+
+# Diagnosis context assembly configuration
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.95"))
+# Used to estimate prefill time saved until Ollama has reported its own prompt evaluation rate
+CONTEXT_PREFILL_TOKENS_PER_SECOND = float(os.getenv("CONTEXT_PREFILL_TOKENS_PER_SECOND", "400"))
+
+# DTC knowledge engine configuration
+DTC_DATASET_PATH = os.getenv(
+    "DTC_DATASET_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "dtc_codes.jsonl")
+)
 
 # LLM configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
 HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "meta-llama/Llama-2-7b-chat-hf")
 
+# LLM routing configuration
+# Comma-separated backends, each "ollama=<base url>" or "huggingface"; requests are balanced across them
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", f"ollama={OLLAMA_BASE_URL}")
+# "least_outstanding" or "latency" (outstanding requests weighted by each backend's recent latency)
+LLM_BALANCING = os.getenv("LLM_BALANCING", "least_outstanding")
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# LLM HTTP client configuration (per backend)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Keep every pooled connection alive, so concurrency above the idle limit doesn't churn connections
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", str(LLM_MAX_CONNECTIONS)))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Share one generation among concurrent calls with the same prompt
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+# Structured output configuration
+# "schema" constrains Ollama to the output's JSON schema, "json" only to valid JSON (Ollama < 0.5), "off" to nothing
+LLM_OUTPUT_FORMAT = os.getenv("LLM_OUTPUT_FORMAT", "schema")
+# Regenerate once when a response can't be parsed even after repair
+LLM_PARSE_RETRY = os.getenv("LLM_PARSE_RETRY", "true").lower() == "true"
+
+# Batch diagnostics configuration
+BATCH_DIAGNOSIS_MAX_ITEMS = int(os.getenv("BATCH_DIAGNOSIS_MAX_ITEMS", "500"))
+BATCH_DIAGNOSIS_CONCURRENCY = int(os.getenv("BATCH_DIAGNOSIS_CONCURRENCY", "4"))
+BATCH_DIAGNOSIS_WRITE_SIZE = int(os.getenv("BATCH_DIAGNOSIS_WRITE_SIZE", "50"))
+
+# Repair guide store configuration
+REPAIR_GUIDE_PREGENERATE = os.getenv("REPAIR_GUIDE_PREGENERATE", "true").lower() == "true"
+REPAIR_GUIDE_WORKERS = int(os.getenv("REPAIR_GUIDE_WORKERS", "2"))
+REPAIR_GUIDE_QUEUE_SIZE = int(os.getenv("REPAIR_GUIDE_QUEUE_SIZE", "256"))
+REPAIR_GUIDE_CACHE_SIZE = int(os.getenv("REPAIR_GUIDE_CACHE_SIZE", "1024"))
+REPAIR_GUIDE_CACHE_TTL = float(os.getenv("REPAIR_GUIDE_CACHE_TTL", "3600"))
+
+# Diagnosis cache configuration
+DIAGNOSIS_CACHE_SIZE = int(os.getenv("DIAGNOSIS_CACHE_SIZE", "1024"))
+DIAGNOSIS_CACHE_TTL = float(os.getenv("DIAGNOSIS_CACHE_TTL", "86400"))
+DIAGNOSIS_CACHE_SIMILARITY = float(os.getenv("DIAGNOSIS_CACHE_SIMILARITY", "0.95"))
+
+# OBD-II telemetry configuration
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "1024"))
+TELEMETRY_BUCKET_SECONDS = int(os.getenv("TELEMETRY_BUCKET_SECONDS", "60"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
+TELEMETRY_IDLE_SECONDS = float(os.getenv("TELEMETRY_IDLE_SECONDS", "600"))
+TELEMETRY_MAX_BATCH = int(os.getenv("TELEMETRY_MAX_BATCH", "1000"))
+
+# Fleet analytics configuration
+# Width of the mileage bands issues are rolled up by; rebuild the rollups after changing it
+ANALYTICS_MILEAGE_BAND = int(os.getenv("ANALYTICS_MILEAGE_BAND", "25000"))
+
+# Predictive maintenance configuration
+MAINTENANCE_CHUNK_SIZE = int(os.getenv("MAINTENANCE_CHUNK_SIZE", "1000"))
+MAINTENANCE_LOOKBACK_DAYS = int(os.getenv("MAINTENANCE_LOOKBACK_DAYS", "730"))
+MAINTENANCE_HALF_LIFE_DAYS = float(os.getenv("MAINTENANCE_HALF_LIFE_DAYS", "180"))
+# Seconds between scoring runs inside the API process; 0 leaves it to `python -m app.score_maintenance`
+MAINTENANCE_SCORING_INTERVAL = float(os.getenv("MAINTENANCE_SCORING_INTERVAL", "0"))
+
+# Metrics configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
 # API configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 JWT_ALGORITHM = "HS256"
-JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
\ No newline at end of file
+JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+# Admission control configuration (LLM-backed routes)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Per-user token bucket: sustained requests per minute, and how many can be made at once after a quiet spell
+ADMISSION_RATE_PER_MINUTE = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "20"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "10"))
+# LLM-backed requests served at once by this worker; the rest wait by priority
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# Seconds a request may wait for a slot before it is shed with a 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "15"))
+# "memory" keeps token buckets per worker; "mongo" shares them across workers
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory")
+
+# Authentication cache configuration
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""Load service manuals, repair procedures and DTC descriptions into ChromaDB.
+
+Run from the backend directory:
+
+    python -m app.ingest --collection diagnostic_codes data/dtc_codes.jsonl
+    python -m app.ingest --collection repair_procedures manuals/ --batch-size 128 --workers 8
+"""
+import argparse
+import json
+import logging
+from app.config import INGEST_BATCH_SIZE, INGEST_WORKERS, INGEST_CHUNK_SIZE, INGEST_CHUNK_OVERLAP
+from app.services.vector_db_service import vector_db_service
+from app.services.ingestion_service import KnowledgeIngestionPipeline
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="JSONL, CSV or Markdown files, or directories containing them")
+    parser.add_argument("--collection", default="automotive_knowledge",
+                        help="Target collection (automotive_knowledge, repair_procedures, diagnostic_codes)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=INGEST_CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    vector_db_service.connect()
+    try:
+        pipeline = KnowledgeIngestionPipeline(
+            args.collection,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap
+        )
+        report = pipeline.run(args.paths)
+    finally:
+        vector_db_service.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
 import uvicorn
-import os
+from app.services.lifecycle_service import lifecycle_service
+from app.services.metrics_service import metrics_service, MetricsMiddleware
+from app.routes import auth, vehicles, diagnostics, telemetry, health, metrics, analytics, maintenance
+
+# Application lifecycle
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await lifecycle_service.startup()
+    yield
+    await lifecycle_service.shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(title="AutoFix AI API", 
-              description="API for automotive troubleshooting and diagnostics")
+              description="API for automotive troubleshooting and diagnostics",
+              lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -18,10 +27,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics, exposed on /metrics
+if metrics_service.enabled:
+    app.add_middleware(MetricsMiddleware, metrics=metrics_service)
+
+# Routers
+app.include_router(auth.router)
+app.include_router(vehicles.router)
+app.include_router(diagnostics.router)
+app.include_router(telemetry.router)
+app.include_router(analytics.router)
+app.include_router(maintenance.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+
 # Root endpoint
 @app.get("/")
 async def root():
     return {"message": "Welcome to AutoFix AI API"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
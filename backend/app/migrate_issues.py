@@ -0,0 +1,28 @@
+"""Move issues embedded in vehicle documents into the vehicle_issues collection.
+
+Run from the backend directory (safe to re-run):
+
+    python -m app.migrate_issues
+
+Migrated issues are not in the analytics rollups yet; rebuild them afterwards
+with ``python -m app.rebuild_analytics``.
+"""
+import argparse
+import asyncio
+import logging
+from app.services.db_service import mongodb_service
+
+async def main(batch_size: int):
+    await mongodb_service.connect()
+    try:
+        migrated = await mongodb_service.migrate_embedded_issues(batch_size=batch_size)
+    finally:
+        await mongodb_service.close()
+    print(f"Migrated {migrated} issues")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.batch_size))
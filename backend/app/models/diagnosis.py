@@ -0,0 +1,40 @@
+import json
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Type, Union
+from app.models.vehicle import IssueSeverity
+
+class Diagnosis(BaseModel):
+    """The diagnosis the LLM is asked for; its JSON schema also constrains generation"""
+    likely_causes: List[str]
+    severity: IssueSeverity
+    recommended_actions: List[str]
+    diagnostic_codes: List[str] = []
+    explanation: str
+
+# Sections may come back as prose or as a list of items
+Section = Union[str, List[str]]
+
+class RepairGuide(BaseModel):
+    """Repair guide sections, keyed by the titles the frontend renders"""
+    safety_precautions: Section = Field(..., alias="Safety Precautions")
+    tools_required: Section = Field(..., alias="Tools Required")
+    parts_required: Optional[Section] = Field(None, alias="Parts Required")
+    step_by_step_instructions: Section = Field(..., alias="Step-by-Step Instructions")
+    estimated_time: Section = Field(..., alias="Estimated Time")
+    tips_and_warnings: Optional[Section] = Field(None, alias="Tips and Warnings")
+
+def json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """JSON schema for a model, as Ollama's `format` parameter takes it"""
+    # Pydantic 2 renamed schema() to model_json_schema()
+    if hasattr(model, "model_json_schema"):
+        return model.model_json_schema(by_alias=True)
+    return model.schema(by_alias=True)
+
+def validate_output(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate parsed LLM output against a model, returning plain JSON-compatible values.
+
+    Raises ValueError (pydantic's ValidationError) if required fields are missing or invalid.
+    """
+    if hasattr(model, "model_validate"):
+        return model.model_validate(data).model_dump(mode="json", by_alias=True, exclude_none=True)
+    return json.loads(model.parse_obj(data).json(by_alias=True, exclude_none=True))
@@ -22,6 +22,7 @@ class IssueSeverity(str, Enum):
 
 class VehicleIssue(BaseModel):
     id: Optional[str] = None
+    vehicle_id: Optional[str] = None
     title: str
     description: str
     severity: IssueSeverity
@@ -42,4 +43,25 @@ class Vehicle(BaseModel):
     last_service_date: Optional[datetime] = None
     issues: List[VehicleIssue] = []
     created_at: datetime = Field(default_factory=datetime.now)
-    updated_at: datetime = Field(default_factory=datetime.now)
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+class VehicleSummary(BaseModel):
+    """The vehicle fields diagnostics needs, loaded with a projection"""
+    id: str
+    user_id: str
+    make: str
+    model: str
+    year: int
+    type: VehicleType
+    mileage: Optional[int] = None
+
+class VehicleListItem(BaseModel):
+    """The fields a vehicle list shows; issues and bookkeeping fields are left out"""
+    id: str
+    make: str
+    model: str
+    year: int
+    type: VehicleType
+    vin: Optional[str] = None
+    mileage: Optional[int] = None
+    last_service_date: Optional[datetime] = None
@@ -0,0 +1,26 @@
+"""Recompute the fleet analytics rollups from every stored issue.
+
+Issues update the rollups as they are recorded, so this is only needed after
+migrating issues, changing ANALYTICS_MILEAGE_BAND, or to repair drift. Run it
+from the backend directory, when few issues are being written (safe to re-run):
+
+    python -m app.rebuild_analytics
+"""
+import argparse
+import asyncio
+import logging
+from app.services.db_service import mongodb_service
+from app.services.analytics_service import analytics_service
+
+async def main():
+    await mongodb_service.connect()
+    try:
+        buckets = await analytics_service.rebuild()
+    finally:
+        await mongodb_service.close()
+    print(f"Rebuilt {buckets} rollup buckets")
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from app.services.analytics_service import analytics_service, DIMENSIONS
+from app.routes.auth import get_current_user
+from app.models.user import User
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+def get_filters(
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year: Optional[int] = None,
+    mileage: Optional[int] = Query(None, ge=0, description="Restrict to the mileage band containing this value")
+):
+    return analytics_service.filters(make, model, year, mileage)
+
+@router.get("/top-codes")
+async def get_top_codes(
+    limit: int = Query(10, ge=1, le=100),
+    filters: dict = Depends(get_filters),
+    current_user: User = Depends(get_current_user)
+):
+    """Most frequently reported diagnostic codes, optionally for one make/model/year/mileage band"""
+    return await analytics_service.top_codes(filters, limit)
+
+@router.get("/severity")
+async def get_severity_distribution(
+    group_by: Optional[str] = None,
+    filters: dict = Depends(get_filters),
+    current_user: User = Depends(get_current_user)
+):
+    """Issue severity distribution, optionally split by make, model, year or mileage_band"""
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise HTTPException(status_code=422, detail=f"group_by must be one of {', '.join(DIMENSIONS)}")
+    return await analytics_service.severity_distribution(filters, group_by)
+
+@router.get("/stats")
+async def get_analytics_stats(current_user: User = Depends(get_current_user)):
+    """Rollup write and query counters"""
+    return analytics_service.get_stats()
@@ -1,22 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta
 from typing import Optional
 from pydantic import BaseModel
 from app.models.user import User, UserCreate, UserResponse
 from app.services.db_service import mongodb_service
-from app.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.cache_service import TTLCache
+from app.services.password_service import password_service, PasswordServiceBusy
+from app.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+import time
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# Verified tokens -> email, so repeat requests skip signature verification
+token_cache = TTLCache(max_size=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
 # Token models
 class Token(BaseModel):
     access_token: str
@@ -26,11 +29,26 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt runs on the password service's worker pool so it never blocks the event loop
+async def verify_password(plain_password, hashed_password):
+    try:
+        return await password_service.verify(plain_password, hashed_password)
+    except PasswordServiceBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, please retry",
+            headers={"Retry-After": "1"},
+        )
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    try:
+        return await password_service.hash(password)
+    except PasswordServiceBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Registration service busy, please retry",
+            headers={"Retry-After": "1"},
+        )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -48,15 +66,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    email = token_cache.get(token)
+    if email is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            email = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = await mongodb_service.get_user_by_email(token_data.email)
+        # Never cache a token past its own expiry
+        token_cache.set(token, email, ttl=payload.get("exp", 0) - time.time())
+    token_data = TokenData(email=email)
+    user = await mongodb_service.get_cached_user_by_email(token_data.email)
     if user is None:
         raise credentials_exception
     return user
@@ -73,7 +95,7 @@ async def register_user(user_create: UserCreate):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_create.password)
+    hashed_password = await get_password_hash(user_create.password)
     user = User(
         email=user_create.email,
         hashed_password=hashed_password,
@@ -81,7 +103,14 @@ async def register_user(user_create: UserCreate):
         last_name=user_create.last_name
     )
     
-    user_id = await mongodb_service.create_user(user)
+    try:
+        user_id = await mongodb_service.create_user(user)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration; the unique index caught it
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     user.id = user_id
     
     return UserResponse(
@@ -95,7 +124,7 @@ async def register_user(user_create: UserCreate):
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await mongodb_service.get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
-from typing import Dict, Any, List
-from app.models.vehicle import IssueSeverity, VehicleIssue
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Dict, Any, List, Optional, Tuple
+from app.models.vehicle import IssueSeverity, VehicleIssue, VehicleSummary
 from app.services.llm_service import llm_service
 from app.services.db_service import mongodb_service
+from app.services.cache_service import diagnosis_cache
+from app.services.dtc_service import dtc_engine
+from app.services.context_service import context_assembler
+from app.services.vector_db_service import vector_db_service
+from app.services.repair_guide_service import repair_guide_service, guide_signature
+from app.services.analytics_service import analytics_service
+from app.services.serialization_service import FastJSONResponse, public_docs
+from app.services.admission_service import (
+    admission_controller, priority_for, AdmissionPriority, AdmissionTicket, RateLimited, Overloaded
+)
 from app.routes.auth import get_current_user
+from app.config import BATCH_DIAGNOSIS_MAX_ITEMS, BATCH_DIAGNOSIS_WRITE_SIZE
 from app.models.user import User
 from datetime import datetime
 from pydantic import BaseModel
+from bson import ObjectId
+import json
+import math
 
 router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
 
@@ -19,118 +35,373 @@ class DiagnosticResponse(BaseModel):
     diagnosis: Dict[str, Any]
     issue_id: str = None
 
-@router.post("/", response_model=DiagnosticResponse)
-async def diagnose_issue(
-    request: DiagnosticRequest,
-    current_user: User = Depends(get_current_user)
-):
+class BatchDiagnosticRequest(BaseModel):
+    items: List[DiagnosticRequest]
+
+class IssuePage(BaseModel):
+    issues: List[VehicleIssue]
+    next_cursor: Optional[str] = None
+
+# Helper functions
+async def get_user_vehicle(vehicle_id: str, current_user: User) -> VehicleSummary:
     # Get vehicle information
-    vehicle = await mongodb_service.get_vehicle(request.vehicle_id)
+    vehicle = await mongodb_service.get_vehicle_summary(vehicle_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
         
     # Check if vehicle belongs to user
     if vehicle.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this vehicle")
-    
-    # Prepare vehicle info for diagnosis
-    vehicle_info = {
+    return vehicle
+
+def get_vehicle_info(vehicle: VehicleSummary) -> Dict[str, Any]:
+    return {
         "make": vehicle.make,
         "model": vehicle.model,
         "year": vehicle.year,
         "mileage": vehicle.mileage,
         "type": vehicle.type
     }
-    
-    # Get diagnosis from LLM
-    diagnosis = await llm_service.diagnose_vehicle_issue(
-        vehicle_info, 
-        request.issue_description
-    )
-    
+
+def describe_issue(request: DiagnosticRequest) -> str:
+    # Spell out the OBD-II codes so the LLM sees what the rules engine could not resolve
+    if not request.obd_codes:
+        return request.issue_description
+    return f"{request.issue_description}\nOBD-II codes: {'; '.join(dtc_engine.describe_codes(request.obd_codes))}"
+
+def build_issue(vehicle: VehicleSummary, request: DiagnosticRequest, diagnosis: Dict[str, Any]) -> VehicleIssue:
     # Create a new vehicle issue
-    severity = IssueSeverity.medium  # Default
     try:
         severity = IssueSeverity(diagnosis.get("severity", "medium"))
     except ValueError:
-        pass
+        # Fall back to the codes' own severity when the LLM didn't give a usable one
+        severity = dtc_engine.classify_severity(request.obd_codes) or IssueSeverity.medium
         
-    new_issue = VehicleIssue(
+    # The id is assigned up front so it can be returned (or streamed) before the write
+    return VehicleIssue(
+        id=str(ObjectId()),
+        vehicle_id=vehicle.id,
         title=f"Issue on {datetime.now().strftime('%Y-%m-%d')}",
         description=request.issue_description,
         severity=severity,
-        diagnostic_codes=diagnosis.get("diagnostic_codes", []) + request.obd_codes
+        diagnostic_codes=list(dict.fromkeys(diagnosis.get("diagnostic_codes", []) + request.obd_codes))
     )
+
+async def record_issues(issues: List[Tuple[VehicleSummary, VehicleIssue]]) -> int:
+    # Store the issues in one bulk write and fold them into the analytics rollups
+    written = await mongodb_service.add_issues_bulk([issue for _, issue in issues])
+    await analytics_service.record_issues(issues)
+    return written
+
+async def record_issue(vehicle: VehicleSummary, request: DiagnosticRequest, diagnosis: Dict[str, Any]) -> str:
+    issue = build_issue(vehicle, request, diagnosis)
+    await record_issues([(vehicle, issue)])
+    # Start on the repair guide now so it is usually ready before the user opens it. Batch issues
+    # are not pre-generated: a large import would fill the queue ahead of interactive users' guides
+    repair_guide_service.enqueue(issue.id, get_vehicle_info(vehicle), issue.description, issue.diagnostic_codes)
+    return issue.id
+
+async def get_vehicle_issue(vehicle: VehicleSummary, issue_id: str) -> VehicleIssue:
+    # Indexed lookup scoped to the vehicle
+    issue = await mongodb_service.get_issue(issue_id, vehicle.id)
+    if not issue:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    return issue
+
+async def admit_llm_request(current_user: User, priority: AdmissionPriority) -> AdmissionTicket:
+    # Only requests that may reach the LLM are admitted; DTC and stored answers skip this
+    try:
+        return await admission_controller.admit(current_user.id, priority)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many diagnosis requests, please slow down",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Diagnosis service busy, please retry",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+
+def release_after(ticket: Optional[AdmissionTicket]) -> Optional[BackgroundTask]:
+    # Streams release their slot when they finish; this also covers clients that disconnect first
+    return BackgroundTask(ticket.release) if ticket is not None else None
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Server-sent events must not be buffered by proxies
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Routes
+@router.post("/", response_model=DiagnosticResponse)
+async def diagnose_issue(
+    request: DiagnosticRequest,
+    current_user: User = Depends(get_current_user)
+):
+    vehicle = await get_user_vehicle(request.vehicle_id, current_user)
     
-    # Add issue to vehicle
-    issue_id = await mongodb_service.add_issue_to_vehicle(vehicle.id, new_issue)
+    # Well-known codes are diagnosed locally; everything else goes to the LLM
+    diagnosis = dtc_engine.triage(request.obd_codes)
+    if diagnosis is None:
+        async with await admit_llm_request(current_user, priority_for(request.obd_codes)):
+            diagnosis = await llm_service.diagnose_vehicle_issue(
+                get_vehicle_info(vehicle), 
+                describe_issue(request)
+            )
+    
+    issue_id = await record_issue(vehicle, request, diagnosis)
     
     return DiagnosticResponse(
         diagnosis=diagnosis,
         issue_id=issue_id
     )
 
+@router.post("/stream")
+async def diagnose_issue_stream(
+    request: DiagnosticRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream diagnosis tokens as server-sent events, ending with the structured diagnosis"""
+    vehicle = await get_user_vehicle(request.vehicle_id, current_user)
+    # Admitted before the response starts, so a refusal can still be a 429/503
+    triaged = dtc_engine.triage(request.obd_codes)
+    ticket = await admit_llm_request(current_user, priority_for(request.obd_codes)) if triaged is None else None
+
+    async def event_stream():
+        if triaged is not None:
+            issue_id = await record_issue(vehicle, request, triaged)
+            yield format_sse("diagnosis", {"diagnosis": triaged, "issue_id": issue_id})
+            return
+
+        try:
+            async for event in llm_service.stream_diagnose_vehicle_issue(
+                get_vehicle_info(vehicle),
+                describe_issue(request)
+            ):
+                if event["event"] == "token":
+                    yield format_sse("token", {"token": event["data"]})
+                else:
+                    diagnosis = event["data"]
+                    issue_id = await record_issue(vehicle, request, diagnosis)
+                    yield format_sse("diagnosis", {"diagnosis": diagnosis, "issue_id": issue_id})
+        finally:
+            ticket.release()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS,
+                             background=release_after(ticket))
+
+@router.post("/batch")
+async def diagnose_batch(
+    request: BatchDiagnosticRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Diagnose many vehicle issues at once, streaming one NDJSON line per item as it completes.
+
+    Each line carries the item's index in the request. Issues are written with
+    bulk_write in groups; the final line reports how many were stored.
+    """
+    if not request.items or len(request.items) > BATCH_DIAGNOSIS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch must contain between 1 and {BATCH_DIAGNOSIS_MAX_ITEMS} items"
+        )
+
+    vehicles = await mongodb_service.get_vehicle_summaries([item.vehicle_id for item in request.items])
+
+    errors, triaged, accepted = [], [], []
+    for index, item in enumerate(request.items):
+        vehicle = vehicles.get(item.vehicle_id)
+        if not vehicle:
+            errors.append({"index": index, "status": 404, "detail": "Vehicle not found"})
+        elif vehicle.user_id != current_user.id:
+            errors.append({"index": index, "status": 403, "detail": "Not authorized to access this vehicle"})
+        else:
+            diagnosis = dtc_engine.triage(item.obd_codes)
+            if diagnosis is not None:
+                triaged.append((index, item, vehicle, diagnosis))
+            else:
+                accepted.append((index, item, vehicle))
+    # A batch holds one slot for all its LLM items and queues behind interactive requests
+    ticket = await admit_llm_request(current_user, AdmissionPriority.batch) if accepted else None
+
+    async def results():
+        # Rule-based diagnoses are ready immediately; LLM ones follow as they complete
+        for result in triaged:
+            yield result
+        async for position, diagnosis in llm_service.diagnose_vehicle_issues_batch(
+            [(get_vehicle_info(vehicle), describe_issue(item)) for _, item, vehicle in accepted]
+        ):
+            yield (*accepted[position], diagnosis)
+
+    async def result_stream():
+        for error in errors:
+            yield json.dumps(error) + "\n"
+
+        # (vehicle, issue) pairs awaiting the next bulk write
+        pending_issues, written = [], 0
+
+        async def write_pending() -> int:
+            # The same recording path as a single diagnosis, one bulk write per group
+            count = await record_issues(pending_issues)
+            pending_issues.clear()
+            return count
+
+        def result_line(index: int, item: DiagnosticRequest, vehicle: VehicleSummary, diagnosis: Dict[str, Any]) -> str:
+            issue = build_issue(vehicle, item, diagnosis)
+            pending_issues.append((vehicle, issue))
+            return json.dumps(
+                {"index": index, "status": 200, "diagnosis": diagnosis, "issue_id": issue.id},
+                default=str
+            ) + "\n"
+
+        try:
+            async for result in results():
+                yield result_line(*result)
+
+                if len(pending_issues) >= BATCH_DIAGNOSIS_WRITE_SIZE:
+                    written += await write_pending()
+        finally:
+            if ticket is not None:
+                ticket.release()
+            written += await write_pending()
+        diagnosed = len(triaged) + len(accepted)
+        yield json.dumps({"complete": True, "diagnosed": diagnosed, "issues_written": written}) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson", background=release_after(ticket))
+
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit, miss and eviction counters for the diagnosis cache"""
+    return diagnosis_cache.get_stats()
+
+@router.get("/coalescing-stats")
+async def get_coalescing_stats(current_user: User = Depends(get_current_user)):
+    """How many LLM calls joined an identical in-flight generation, per operation"""
+    return llm_service.get_single_flight_stats()
+
+@router.get("/parse-stats")
+async def get_parse_stats(current_user: User = Depends(get_current_user)):
+    """How LLM outputs parsed (cleanly, after repair, or not at all) and how often they were retried"""
+    return llm_service.get_structured_output_stats()
+
+@router.get("/dtc-stats")
+async def get_dtc_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate and latency of the rule-based DTC fast path"""
+    return dtc_engine.get_stats()
+
+@router.get("/context-stats")
+async def get_context_stats(current_user: User = Depends(get_current_user)):
+    """Prompt sizes and estimated prefill time saved by context budgeting"""
+    return context_assembler.get_stats()
+
+@router.get("/embedding-stats")
+async def get_embedding_stats(current_user: User = Depends(get_current_user)):
+    """Embedding cache hit rates (memory and disk) and time spent in the embedding model"""
+    return vector_db_service.get_embedding_stats()
+
+@router.get("/admission-stats")
+async def get_admission_stats(current_user: User = Depends(get_current_user)):
+    """Rate limiting and load shedding counters, active slots and queue depth for LLM-backed requests"""
+    return admission_controller.get_stats()
+
+@router.get("/repair-guide-stats")
+async def get_repair_guide_stats(current_user: User = Depends(get_current_user)):
+    """Queue depth and store hit counters for repair guide generation"""
+    return repair_guide_service.get_stats()
+
+@router.get("/issues", response_model=IssuePage)
+async def list_issues(
+    vehicle_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """List a vehicle's issues, newest first; pass next_cursor back to fetch the following page"""
+    vehicle = await get_user_vehicle(vehicle_id, current_user)
+    try:
+        docs, next_cursor = await mongodb_service.get_vehicle_issue_docs(vehicle.id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Stored issues were validated on write; skip rebuilding and revalidating them as models
+    return FastJSONResponse({"issues": public_docs(docs), "next_cursor": next_cursor})
+
 @router.get("/repair-guide/{issue_id}")
 async def get_repair_guide(
     issue_id: str,
     vehicle_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    # Get vehicle information
-    vehicle = await mongodb_service.get_vehicle(vehicle_id)
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-        
-    # Check if vehicle belongs to user
-    if vehicle.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to access this vehicle")
-    
-    # Find the issue
-    issue = next((i for i in vehicle.issues if i.id == issue_id), None)
-    if not issue:
-        raise HTTPException(status_code=404, detail="Issue not found")
+    vehicle = await get_user_vehicle(vehicle_id, current_user)
+    issue = await get_vehicle_issue(vehicle, issue_id)
     
-    # Generate repair guide using LLM
-    system_prompt = """You are an automotive repair expert. 
-    Create a detailed step-by-step repair guide for the given vehicle issue.
-    Include safety precautions, tools needed, and estimated time for each step."""
-    
-    prompt = f"""
-    Vehicle Information:
-    - Make: {vehicle.make}
-    - Model: {vehicle.model}
-    - Year: {vehicle.year}
-    
-    Issue Description:
-    {issue.description}
-    
-    Diagnostic Codes:
-    {', '.join(issue.diagnostic_codes) if issue.diagnostic_codes else 'None'}
-    
-    Create a detailed repair guide with the following sections:
-    1. Safety Precautions
-    2. Tools Required
-    3. Parts Required (if applicable)
-    4. Step-by-Step Instructions
-    5. Estimated Time
-    6. Tips and Warnings
-    
-    Format the response in JSON with these sections as keys.
-    """
-    
-    response = await llm_service.generate_response(prompt, system_prompt)
-    
-    # Extract JSON from response
-    try:
-        # Find JSON in the response
-        json_start = response.find('{')
-        json_end = response.rfind('}') + 1
-        if json_start >= 0 and json_end > json_start:
-            json_str = response[json_start:json_end]
-            repair_guide = json.loads(json_str)
-            return repair_guide
-        else:
-            # If no JSON found, return the raw response
-            return {"raw_guide": response}
-    except json.JSONDecodeError:
-        return {"raw_guide": response}
\ No newline at end of file
+    # Served from the guide store; generated with the LLM only the first time
+    vehicle_info = get_vehicle_info(vehicle)
+    guide = await repair_guide_service.lookup(guide_signature(vehicle_info, issue.description, issue.diagnostic_codes))
+    if guide is not None:
+        return guide
+    async with await admit_llm_request(current_user, priority_for(issue.diagnostic_codes, issue.severity)):
+        return await repair_guide_service.get_guide(
+            issue_id,
+            vehicle_info,
+            issue.description,
+            issue.diagnostic_codes
+        )
+
+@router.get("/repair-guide/{issue_id}/status")
+async def get_repair_guide_status(
+    issue_id: str,
+    vehicle_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Whether an issue's repair guide is ready, pending, failed or not generated yet"""
+    vehicle = await get_user_vehicle(vehicle_id, current_user)
+    issue = await get_vehicle_issue(vehicle, issue_id)
+    signature, status = await repair_guide_service.get_status(
+        get_vehicle_info(vehicle),
+        issue.description,
+        issue.diagnostic_codes
+    )
+    return {"issue_id": issue_id, "status": status, "signature": signature}
+
+@router.get("/repair-guide/{issue_id}/stream")
+async def get_repair_guide_stream(
+    issue_id: str,
+    vehicle_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream repair guide tokens as server-sent events, ending with the structured guide"""
+    vehicle = await get_user_vehicle(vehicle_id, current_user)
+    issue = await get_vehicle_issue(vehicle, issue_id)
+
+    vehicle_info = get_vehicle_info(vehicle)
+    signature = guide_signature(vehicle_info, issue.description, issue.diagnostic_codes)
+    # A stored guide is sent whole; only new guides are admitted and streamed token by token
+    guide = await repair_guide_service.lookup(signature)
+    ticket = None
+    if guide is None:
+        ticket = await admit_llm_request(current_user, priority_for(issue.diagnostic_codes, issue.severity))
+
+    async def event_stream():
+        if guide is not None:
+            yield format_sse("repair_guide", guide)
+            return
+
+        try:
+            async for event in llm_service.stream_repair_guide(
+                vehicle_info,
+                issue.description,
+                issue.diagnostic_codes
+            ):
+                if event["event"] == "token":
+                    yield format_sse("token", {"token": event["data"]})
+                else:
+                    yield format_sse("repair_guide", event["data"])
+                    await repair_guide_service.store(signature, issue_id, event["data"], event["complete"])
+        finally:
+            ticket.release()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS,
+                             background=release_after(ticket))
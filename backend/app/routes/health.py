@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.lifecycle_service import lifecycle_service
+from app.services.llm_service import llm_service
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+@router.get("/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """Backends are connected and models are warm; 503 until then"""
+    status = lifecycle_service.get_status()
+    return JSONResponse(status, status_code=200 if lifecycle_service.ready else 503)
+
+@router.get("/llm")
+async def llm_backends():
+    """Circuit breaker state, load and latency of each LLM backend"""
+    if llm_service.router is None:
+        return JSONResponse({"detail": "LLM router not started"}, status_code=503)
+    return llm_service.router.get_status()
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Depends
+from app.services.db_service import mongodb_service
+from app.services.maintenance_service import maintenance_service
+from app.routes.diagnostics import get_user_vehicle
+from app.routes.auth import get_current_user
+from app.models.user import User
+
+router = APIRouter(prefix="/api/maintenance", tags=["maintenance"])
+
+@router.get("/vehicles/{vehicle_id}")
+async def get_vehicle_risk(vehicle_id: str, refresh: bool = False, current_user: User = Depends(get_current_user)):
+    """Failure risk per subsystem over the next 90 days; refresh rescores from the latest history"""
+    vehicle = await get_user_vehicle(vehicle_id, current_user)
+    scores = await maintenance_service.get_vehicle_scores(vehicle.id, refresh)
+    if scores is None:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    return scores
+
+@router.get("/fleet")
+async def get_fleet_risk(current_user: User = Depends(get_current_user)):
+    """Risk scores for all of the user's vehicles, riskiest first"""
+    vehicles = await mongodb_service.get_vehicle_summaries_by_user(current_user.id)
+    return await maintenance_service.get_fleet_scores(current_user.id, [vehicle.id for vehicle in vehicles])
+
+@router.get("/stats")
+async def get_maintenance_stats(current_user: User = Depends(get_current_user)):
+    """Scoring run throughput and counters"""
+    return maintenance_service.get_stats()
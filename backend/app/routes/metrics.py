@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.metrics_service import metrics_service
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+# Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics_service.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@router.get("/summary")
+async def get_metrics_summary():
+    """Latency percentiles per route and stage, estimated from the histograms"""
+    return metrics_service.get_summary()
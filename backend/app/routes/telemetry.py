@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect, status
+from app.services.db_service import mongodb_service
+from app.services.telemetry_service import telemetry_service, PIDS
+from app.routes.auth import get_current_user
+from app.models.user import User
+from app.config import TELEMETRY_MAX_BATCH
+from bson import ObjectId
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/telemetry", tags=["telemetry"])
+
+async def get_owned_vehicle_id(vehicle_id: str, current_user: User) -> str:
+    vehicle = await mongodb_service.get_vehicle_summary(vehicle_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if vehicle.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this vehicle")
+    return vehicle.id
+
+@router.websocket("/ws/{vehicle_id}")
+async def telemetry_stream(websocket: WebSocket, vehicle_id: str, token: str = Query(...)):
+    """Ingest OBD-II PID samples for one vehicle.
+
+    Browsers cannot set headers on WebSocket requests, so the bearer token is
+    passed as a query parameter. Each message is a JSON object with a
+    ``samples`` list such as ``[{"t": 1700000000.1, "rpm": 820, "coolant_temp": 91}]``.
+    """
+    if not ObjectId.is_valid(vehicle_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Vehicle not found")
+        return
+    try:
+        current_user = await get_current_user(token)
+        vehicle_id = await get_owned_vehicle_id(vehicle_id, current_user)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                samples = json.loads(message).get("samples", [])
+                if len(samples) > TELEMETRY_MAX_BATCH:
+                    raise ValueError(f"At most {TELEMETRY_MAX_BATCH} samples per message")
+                telemetry_service.ingest(vehicle_id, samples)
+            except (ValueError, TypeError, AttributeError) as e:
+                await websocket.send_json({"error": f"Invalid telemetry message: {e}"})
+    except WebSocketDisconnect:
+        logger.debug(f"Telemetry stream closed for vehicle {vehicle_id}")
+
+@router.get("/{vehicle_id}/stats")
+async def get_telemetry_stats(
+    vehicle_id: str,
+    window: float = Query(60, gt=0, le=3600),
+    current_user: User = Depends(get_current_user)
+):
+    """Rolling min/max/mean/rate-of-change per PID over the last `window` seconds"""
+    vehicle_id = await get_owned_vehicle_id(vehicle_id, current_user)
+    stats = telemetry_service.window_stats(vehicle_id, window)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No recent telemetry for this vehicle")
+    return {"vehicle_id": vehicle_id, "window_seconds": window, "pids": stats}
+
+@router.get("/pids")
+async def list_pids():
+    return {"pids": list(PIDS)}
@@ -0,0 +1,38 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List
+from bson import ObjectId
+from app.models.vehicle import Vehicle, VehicleListItem
+from app.services.db_service import mongodb_service
+from app.services.serialization_service import FastJSONResponse, public_doc, public_docs
+from app.routes.auth import get_current_user
+from app.models.user import User
+
+# Documents come from MongoDB already validated, so these routes serialize them directly
+router = APIRouter(prefix="/api/vehicles", tags=["vehicles"], default_response_class=FastJSONResponse)
+
+@router.get("", response_model=List[VehicleListItem])
+async def list_vehicles(current_user: User = Depends(get_current_user)):
+    """The user's vehicles, without their issues"""
+    docs = await mongodb_service.get_vehicle_list_docs(current_user.id)
+    return FastJSONResponse(public_docs(docs))
+
+@router.get("/{vehicle_id}", response_model=Vehicle)
+async def get_vehicle(
+    vehicle_id: str,
+    issues: int = Query(20, ge=0, le=1000, description="How many of the most recent issues to include"),
+    current_user: User = Depends(get_current_user)
+):
+    """A vehicle with its most recent issues, newest first"""
+    if not ObjectId.is_valid(vehicle_id):
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    lookups = [mongodb_service.get_vehicle_doc(vehicle_id)]
+    if issues:
+        lookups.append(mongodb_service.get_vehicle_issue_docs(vehicle_id, limit=issues))
+    vehicle, *page = await asyncio.gather(*lookups)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if vehicle["user_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this vehicle")
+    vehicle["issues"] = public_docs(page[0][0]) if page else []
+    return FastJSONResponse(public_doc(vehicle))
@@ -0,0 +1,31 @@
+"""Score every vehicle's maintenance risk and store the results for the /api/maintenance routes.
+
+Vehicles are streamed in chunks of MAINTENANCE_CHUNK_SIZE and scored in
+batches, so a full run over a large fleet is meant for cron (or set
+MAINTENANCE_SCORING_INTERVAL to run it inside the API). Run it from the
+backend directory; it is safe to re-run:
+
+    python -m app.score_maintenance [--user-id USER_ID]
+"""
+import argparse
+import asyncio
+import logging
+from typing import Optional
+from app.services.db_service import mongodb_service
+from app.services.maintenance_service import maintenance_service
+
+async def main(user_id: Optional[str] = None):
+    await mongodb_service.connect()
+    try:
+        report = await maintenance_service.run(user_id=user_id)
+    finally:
+        await mongodb_service.close()
+    print(f"Scored {report['vehicles']} vehicles in {report['seconds']}s "
+          f"({report['vehicles_per_second']} vehicles/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", help="Only score this user's vehicles")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.user_id))
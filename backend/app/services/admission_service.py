@@ -0,0 +1,229 @@
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from datetime import datetime
+from enum import IntEnum
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import (
+    ADMISSION_ENABLED, ADMISSION_RATE_PER_MINUTE, ADMISSION_BURST, ADMISSION_MAX_CONCURRENT,
+    ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_BACKEND
+)
+from app.models.vehicle import IssueSeverity
+from app.services.cache_service import TTLCache
+from app.services.db_service import mongodb_service
+from app.services.dtc_service import dtc_engine
+
+logger = logging.getLogger(__name__)
+
+class AdmissionPriority(IntEnum):
+    """Queue order for LLM-backed requests; lower values are served first"""
+    critical = 0
+    diagnostic_codes = 1
+    normal = 2
+    batch = 3
+
+class AdmissionRejected(Exception):
+    """Base for refused requests; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RateLimited(AdmissionRejected):
+    """The user has used up their token bucket (HTTP 429)"""
+
+class Overloaded(AdmissionRejected):
+    """No slot freed up before the queue deadline, or the queue is full (HTTP 503)"""
+
+def priority_for(diagnostic_codes: List[str], severity: Optional[IssueSeverity] = None) -> AdmissionPriority:
+    """Critical issues first, then requests that carry trouble codes, then everything else"""
+    if severity == IssueSeverity.critical or (
+            diagnostic_codes and dtc_engine.classify_severity(diagnostic_codes) == IssueSeverity.critical):
+        return AdmissionPriority.critical
+    return AdmissionPriority.diagnostic_codes if diagnostic_codes else AdmissionPriority.normal
+
+class MemoryTokenBuckets:
+    """Per-user token buckets in this process"""
+
+    def __init__(self, rate: float, capacity: float, max_users: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        # An idle bucket is full again after capacity / rate seconds, the same as a missing one
+        self._buckets = TTLCache(max_size=max_users, ttl=capacity / rate if rate > 0 else float("inf"))
+
+    async def take(self, key: str, cost: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens = self.capacity if bucket is None else min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets.set(key, (tokens, now))
+        return allowed, tokens
+
+class MongoTokenBuckets:
+    """Per-user token buckets shared by every worker through MongoDB"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+
+    async def take(self, key: str, cost: float) -> Tuple[bool, float]:
+        bucket = await mongodb_service.take_rate_tokens(key, cost, self.rate, self.capacity, datetime.utcnow())
+        return bucket["allowed"], bucket["tokens"]
+
+class AdmissionTicket:
+    """A held slot; release it (or leave the async with block) when the request is done"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    async def __aenter__(self) -> "AdmissionTicket":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+class AdmissionController:
+    """Admission control for requests that may run an LLM generation.
+
+    Each request first takes a token from its user's bucket, so one client
+    cannot crowd out the rest (RateLimited when empty). It then needs one of
+    max_concurrent slots. Requests that find none wait in a priority queue:
+    critical issues first, then requests with trouble codes, then the rest,
+    then batches. A request that waits longer than queue_timeout, or arrives
+    to a full queue with nothing of lower priority to displace, is shed with
+    Overloaded instead of adding to everyone's latency.
+    """
+
+    def __init__(self, rate_per_minute: float = ADMISSION_RATE_PER_MINUTE, burst: float = ADMISSION_BURST,
+                 max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, backend: str = ADMISSION_BACKEND,
+                 enabled: bool = ADMISSION_ENABLED):
+        if backend not in ("memory", "mongo"):
+            raise ValueError(f"Unknown admission backend '{backend}'")
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backend = backend
+        self.enabled = enabled
+        self.buckets = MongoTokenBuckets(self.rate, burst) if backend == "mongo" else MemoryTokenBuckets(self.rate, burst)
+        self._active = 0
+        # (priority, arrival order, future); the future resolves when a slot is handed over
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self.stats = {
+            "admitted": 0, "queued": 0, "rate_limited": 0, "shed_queue_full": 0,
+            "shed_deadline": 0, "shed_displaced": 0, "bucket_errors": 0, "wait_seconds": 0.0
+        }
+
+    async def admit(self, user_id: str, priority: AdmissionPriority = AdmissionPriority.normal,
+                    cost: float = 1) -> AdmissionTicket:
+        """Take the user's tokens and wait for a slot; raises RateLimited or Overloaded"""
+        if not self.enabled:
+            return AdmissionTicket(_NULL_CONTROLLER)
+        await self._take_tokens(user_id, cost)
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.stats["admitted"] += 1
+            return AdmissionTicket(self)
+        await self._wait(int(priority))
+        return AdmissionTicket(self)
+
+    async def _take_tokens(self, user_id: str, cost: float):
+        try:
+            allowed, tokens = await self.buckets.take(user_id, cost)
+        except Exception as e:
+            # A shared bucket store outage shouldn't take the API down with it
+            self.stats["bucket_errors"] += 1
+            logger.error(f"Rate limit check failed, admitting request: {e}")
+            return
+        if not allowed:
+            self.stats["rate_limited"] += 1
+            raise RateLimited("rate_limited", (cost - tokens) / self.rate if self.rate > 0 else self.queue_timeout)
+
+    async def _wait(self, priority: int):
+        if len(self._waiters) >= self.max_queue:
+            self._displace(priority)
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._order), future)
+        heapq.heappush(self._waiters, entry)
+        self.stats["queued"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(entry)
+            self.stats["shed_deadline"] += 1
+            raise Overloaded("deadline", self.queue_timeout)
+        except asyncio.CancelledError:
+            self._remove(entry)
+            # The client went away just as a slot was handed over; pass it on
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            raise
+        finally:
+            self.stats["wait_seconds"] += time.perf_counter() - started
+        self.stats["admitted"] += 1
+
+    def _displace(self, priority: int):
+        """Make room in a full queue by shedding the newest lowest-priority waiter, if it ranks below this one"""
+        worst = max(self._waiters, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            self.stats["shed_queue_full"] += 1
+            raise Overloaded("queue_full", self.queue_timeout / 2)
+        self._remove(worst)
+        self.stats["shed_displaced"] += 1
+        worst[2].set_exception(Overloaded("displaced", self.queue_timeout / 2))
+
+    def _remove(self, entry: Tuple[int, int, asyncio.Future]):
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+
+    def _release(self):
+        # Hand the slot straight to the best waiter, so the count never dips and lets a newcomer jump the queue
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self._active -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        queued = self.stats["queued"]
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "mean_wait_ms": self.stats["wait_seconds"] / queued * 1000 if queued else 0.0,
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "backend": self.backend,
+            "enabled": self.enabled
+        }
+
+class _NullController:
+    def _release(self):
+        pass
+
+_NULL_CONTROLLER = _NullController()
+
+# Create a singleton instance
+admission_controller = AdmissionController()
@@ -0,0 +1,145 @@
+import heapq
+import logging
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from app.config import ANALYTICS_MILEAGE_BAND
+from app.models.vehicle import IssueSeverity, VehicleIssue, VehicleSummary
+from app.services.db_service import mongodb_service
+from app.services.dtc_service import dtc_engine, normalize_code
+
+logger = logging.getLogger(__name__)
+
+# Rollup bucket dimensions, in _id field order
+DIMENSIONS = ("make", "model", "year", "mileage_band")
+
+class AnalyticsService:
+    """Fleet-wide issue analytics served from precomputed rollups.
+
+    Every recorded issue increments one rollup document per (make, model, year,
+    mileage band) bucket in issue_rollups: its issue count, its count per
+    severity and its count per diagnostic code. Dashboard queries read only the
+    matching buckets, so their cost grows with the number of buckets rather than
+    the number of issues. rebuild() recomputes the rollups from vehicle_issues.
+    """
+
+    def __init__(self, mileage_band: int = ANALYTICS_MILEAGE_BAND):
+        self.mileage_band = mileage_band
+        self.stats = {"issues_recorded": 0, "rollup_writes": 0, "rollup_errors": 0, "queries": 0, "buckets_read": 0}
+
+    def bucket(self, vehicle: VehicleSummary) -> Dict[str, Any]:
+        return {
+            "make": _normalize(vehicle.make),
+            "model": _normalize(vehicle.model),
+            "year": vehicle.year,
+            "mileage_band": self.band_of(vehicle.mileage)
+        }
+
+    def band_of(self, mileage: Optional[int]) -> Optional[int]:
+        """Lower bound of the mileage band, e.g. 50000 for 61234 with 25000-mile bands"""
+        if mileage is None:
+            return None
+        return int(mileage) // self.mileage_band * self.mileage_band
+
+    async def record_issues(self, issues: Iterable[Tuple[VehicleSummary, VehicleIssue]]):
+        """Fold newly stored issues into their buckets' counters, one upsert per bucket"""
+        increments: Dict[Tuple, Tuple[Dict[str, Any], Dict[str, int]]] = {}
+        recorded = 0
+        for vehicle, issue in issues:
+            bucket = self.bucket(vehicle)
+            counters = increments.setdefault(tuple(bucket.values()), (bucket, {}))[1]
+            severity = IssueSeverity(issue.severity).value
+            for field in ("issues", f"severity.{severity}",
+                          *(f"codes.{code}" for code in _normalize_codes(issue.diagnostic_codes))):
+                counters[field] = counters.get(field, 0) + 1
+            recorded += 1
+        if not increments:
+            return
+
+        # The issues are already stored; a failed rollup update is logged and repaired by rebuild()
+        try:
+            self.stats["rollup_writes"] += await mongodb_service.increment_issue_rollups(list(increments.values()))
+            self.stats["issues_recorded"] += recorded
+        except Exception as e:
+            self.stats["rollup_errors"] += 1
+            logger.error(f"Failed to update issue rollups for {recorded} issues: {e}")
+
+    async def _rollups(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rollups = await mongodb_service.get_issue_rollups(filters)
+        self.stats["queries"] += 1
+        self.stats["buckets_read"] += len(rollups)
+        return rollups
+
+    def filters(self, make: Optional[str] = None, model: Optional[str] = None, year: Optional[int] = None,
+                mileage: Optional[int] = None) -> Dict[str, Any]:
+        """Bucket filters for the given dimensions; mileage selects the band containing it"""
+        filters = {
+            "make": _normalize(make) if make else None,
+            "model": _normalize(model) if model else None,
+            "year": year,
+            "mileage_band": self.band_of(mileage)
+        }
+        return {dimension: value for dimension, value in filters.items() if value is not None}
+
+    async def top_codes(self, filters: Dict[str, Any], limit: int = 10) -> Dict[str, Any]:
+        """The most frequently reported diagnostic codes across the matching buckets"""
+        rollups = await self._rollups(filters)
+        issues, counts = 0, {}
+        for rollup in rollups:
+            issues += rollup.get("issues", 0)
+            for code, count in rollup.get("codes", {}).items():
+                counts[code] = counts.get(code, 0) + count
+
+        codes = []
+        for code, count in heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], item[0])):
+            entry = dtc_engine.lookup(code)
+            codes.append({
+                "code": code,
+                "count": count,
+                "share": count / issues if issues else 0.0,
+                "description": entry["description"] if entry else None
+            })
+        return {"filters": filters, "issues": issues, "buckets": len(rollups), "codes": codes}
+
+    async def severity_distribution(self, filters: Dict[str, Any], group_by: Optional[str] = None) -> Dict[str, Any]:
+        """Issue counts per severity across the matching buckets, optionally split by one dimension"""
+        if group_by is not None and group_by not in DIMENSIONS:
+            raise ValueError(f"group_by must be one of {', '.join(DIMENSIONS)}")
+        rollups = await self._rollups(filters)
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for rollup in rollups:
+            value = rollup["_id"].get(group_by) if group_by else None
+            group = groups.get(value)
+            if group is None:
+                group = groups[value] = {
+                    **({group_by: value} if group_by else {}),
+                    "issues": 0,
+                    "severity": {severity.value: 0 for severity in IssueSeverity}
+                }
+            group["issues"] += rollup.get("issues", 0)
+            for severity, count in rollup.get("severity", {}).items():
+                group["severity"][severity] = group["severity"].get(severity, 0) + count
+
+        ordered = sorted(groups.values(), key=lambda group: group["issues"], reverse=True)
+        for group in ordered:
+            group["distribution"] = {
+                severity: count / group["issues"] if group["issues"] else 0.0
+                for severity, count in group["severity"].items()
+            }
+        return {"filters": filters, "group_by": group_by, "buckets": len(rollups), "groups": ordered}
+
+    async def rebuild(self) -> int:
+        """Recompute all rollups from the stored issues (after a migration or a mileage band change)"""
+        return await mongodb_service.rebuild_issue_rollups(self.mileage_band)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "mileage_band": self.mileage_band}
+
+def _normalize(value: str) -> str:
+    # Buckets are case-insensitive, so "Honda" and "honda " land together; rebuild() does the same
+    return value.strip().lower()
+
+def _normalize_codes(codes: List[str]) -> List[str]:
+    # Only well-formed DTCs become counter names; they also can't contain "." or "$"
+    return list(dict.fromkeys(filter(None, (normalize_code(code) for code in codes))))
+
+# Create a singleton instance
+analytics_service = AnalyticsService()
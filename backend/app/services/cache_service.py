@@ -0,0 +1,222 @@
+import re
+import time
+import asyncio
+import logging
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from app.config import DIAGNOSIS_CACHE_SIZE, DIAGNOSIS_CACHE_TTL, DIAGNOSIS_CACHE_SIMILARITY
+from app.services.metrics_service import metrics_service
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: Any) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivially different inputs share a key"""
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return " ".join(text.split())
+
+class TTLCache:
+    """Bounded LRU map whose entries expire after a TTL"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: Any) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def pop(self, key: Any):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self._entries), "max_size": self.max_size}
+
+class DiagnosisCache:
+    """Two-tier cache for LLM diagnoses.
+
+    The exact tier is an LRU/TTL map keyed on the normalized vehicle and issue
+    text. The semantic tier keeps the query embedding of every cached entry and
+    returns a stored diagnosis for the same vehicle when a new query's cosine
+    similarity reaches the configured threshold.
+    """
+
+    def __init__(self, max_size: int = DIAGNOSIS_CACHE_SIZE, ttl: float = DIAGNOSIS_CACHE_TTL,
+                 similarity_threshold: float = DIAGNOSIS_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (expires_at, vehicle_key, embedding, diagnosis)
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[np.ndarray], Dict[str, Any]]]" = OrderedDict()
+        # vehicle_key -> {key: unit embedding}, so similarity search only scans the same vehicle
+        self._embeddings: Dict[str, Dict[str, np.ndarray]] = {}
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    @staticmethod
+    def vehicle_key(vehicle_info: Dict[str, Any]) -> str:
+        return "|".join(normalize_text(vehicle_info.get(field, "")) for field in ("make", "model", "year"))
+
+    def make_key(self, vehicle_info: Dict[str, Any], issue_description: str) -> str:
+        return f"{self.vehicle_key(vehicle_info)}|{normalize_text(issue_description)}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Exact-tier lookup"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["exact_hits"] += 1
+        return entry[3]
+
+    def get_similar(self, vehicle_key: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Semantic-tier lookup among cached diagnoses for the same vehicle"""
+        candidates = self._embeddings.get(vehicle_key)
+        if not candidates:
+            return None
+        keys = list(candidates)
+        scores = np.stack([candidates[key] for key in keys]) @ _unit_vector(embedding)
+        now = time.monotonic()
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.similarity_threshold:
+                break
+            key = keys[index]
+            if self._entries[key][0] < now:
+                self._remove(key)
+                self.stats["expirations"] += 1
+                continue
+            self._entries.move_to_end(key)
+            self.stats["semantic_hits"] += 1
+            logger.debug(f"Semantic cache hit (similarity {scores[index]:.3f})")
+            return self._entries[key][3]
+        return None
+
+    def record_miss(self):
+        self.stats["misses"] += 1
+
+    def set(self, key: str, vehicle_key: str, diagnosis: Dict[str, Any],
+            embedding: Optional[List[float]] = None):
+        if key in self._entries:
+            self._remove(key)
+        vector = _unit_vector(embedding) if embedding is not None else None
+        self._entries[key] = (time.monotonic() + self.ttl, vehicle_key, vector, diagnosis)
+        if vector is not None:
+            self._embeddings.setdefault(vehicle_key, {})[key] = vector
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, vehicle_key, _, _ = self._entries.pop(key)
+        vehicle_embeddings = self._embeddings.get(vehicle_key)
+        if vehicle_embeddings is not None:
+            vehicle_embeddings.pop(key, None)
+            if not vehicle_embeddings:
+                del self._embeddings[vehicle_key]
+
+    def clear(self):
+        self._entries.clear()
+        self._embeddings.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Let concurrent callers with the same key share one in-flight call.
+
+    The first caller starts the call; callers arriving before it finishes await
+    the same result (or exception) instead of starting their own. The call is
+    cancelled only when every caller waiting on it has gone away.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._flights: Dict[Any, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        coalesced = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        self.stats["coalesced" if coalesced else "leaders"] += 1
+        metrics_service.record_single_flight(self.operation, coalesced)
+
+        flight.waiters += 1
+        try:
+            # Shielded so one caller disconnecting doesn't cancel the call for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: Any, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls = self.stats["leaders"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "in_flight": len(self._flights),
+            "coalesced_rate": self.stats["coalesced"] / calls if calls else 0.0
+        }
+
+def _unit_vector(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Create a singleton instance
+diagnosis_cache = DiagnosisCache()
@@ -0,0 +1,190 @@
+import logging
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import (
+    CONTEXT_CANDIDATES, CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA, CONTEXT_DUPLICATE_SIMILARITY,
+    CONTEXT_PREFILL_TOKENS_PER_SECOND
+)
+from app.services.cache_service import normalize_text
+from app.services.metrics_service import metrics_service
+
+logger = logging.getLogger(__name__)
+
+# Llama-family tokenizers average roughly four characters of English text per token
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count, close enough for budgeting without loading a tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class ContextAssembler:
+    """Turn a wide retrieval result into a compact, diverse prompt context.
+
+    Candidates are scored by cosine similarity to the query, chunks that nearly
+    duplicate a better-scoring one are dropped, and the rest are picked greedily
+    by maximal marginal relevance (relevance minus redundancy with the chunks
+    already picked) until the token budget is full. Every assembly is compared
+    with joining the top `baseline_results` chunks verbatim, to report the
+    tokens and estimated prefill time saved.
+    """
+
+    # Fields to request from Chroma; chunk embeddings drive deduplication and MMR
+    QUERY_INCLUDE = ["documents", "metadatas", "distances", "embeddings"]
+
+    def __init__(self, candidates: int = CONTEXT_CANDIDATES, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA, duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY,
+                 prefill_tokens_per_second: float = CONTEXT_PREFILL_TOKENS_PER_SECOND, baseline_results: int = 5):
+        self.candidates = candidates
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.baseline_results = baseline_results
+        self.stats = {
+            "requests": 0,
+            "candidates": 0,
+            "selected": 0,
+            "duplicates_dropped": 0,
+            "context_tokens": 0,
+            "baseline_tokens": 0,
+            "prompt_tokens": 0,
+            "tokens_saved": 0,
+            "estimated_seconds_saved": 0.0
+        }
+
+    @metrics_service.timed("context.assemble")
+    def assemble(self, relevant_info, query_embedding: Optional[List[float]] = None) -> Tuple[str, Dict[str, Any]]:
+        """Return (context, report) for one Chroma query result"""
+        documents, embeddings, distances = _unpack(relevant_info)
+        report = {
+            "candidates": len(documents),
+            "duplicates_dropped": 0,
+            "selected": 0,
+            "context_tokens": 0,
+            "baseline_tokens": estimate_tokens("\n".join(documents[:self.baseline_results]))
+        }
+        if not documents:
+            return "", report
+
+        relevance = _relevance(query_embedding, embeddings, distances, len(documents))
+        similarity = _similarity_matrix(documents, embeddings)
+
+        # Best first, so a near-duplicate always loses to the copy that scored higher
+        kept = []
+        for i in np.argsort(-relevance):
+            if not documents[i].strip() or (kept and similarity[i, kept].max() >= self.duplicate_similarity):
+                report["duplicates_dropped"] += 1
+                continue
+            kept.append(i)
+
+        tokens = {i: estimate_tokens(documents[i]) for i in kept}
+        selected = []
+        remaining = self.token_budget
+        pool = list(kept)
+        # Highest similarity of each candidate to anything already selected
+        redundancy = np.zeros(len(documents), dtype=np.float32)
+        while pool:
+            fitting = [i for i in pool if tokens[i] <= remaining]
+            if not fitting:
+                break
+            scores = self.mmr_lambda * relevance[fitting] - (1 - self.mmr_lambda) * redundancy[fitting]
+            best = fitting[int(np.argmax(scores))]
+            selected.append(best)
+            pool.remove(best)
+            remaining -= tokens[best]
+            redundancy = np.maximum(redundancy, similarity[best])
+
+        chunks = [documents[i] for i in selected]
+        if not chunks and kept:
+            # The best chunk alone is over budget; its opening is still better than no context
+            chunks = [_truncate(documents[kept[0]], self.token_budget)]
+        context = "\n".join(chunks)
+        report.update(selected=len(chunks), context_tokens=estimate_tokens(context))
+        return context, report
+
+    def record(self, report: Dict[str, Any], prompt_tokens: int):
+        """Log the prompt size for one request and add it to the running totals"""
+        tokens_saved = report["baseline_tokens"] - report["context_tokens"]
+        seconds_saved = tokens_saved / self.prefill_tokens_per_second
+        self.stats["requests"] += 1
+        for key in ("candidates", "selected", "duplicates_dropped", "context_tokens", "baseline_tokens"):
+            self.stats[key] += report[key]
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["tokens_saved"] += tokens_saved
+        self.stats["estimated_seconds_saved"] += seconds_saved
+        logger.info(
+            f"Diagnosis prompt ~{prompt_tokens} tokens: context {report['context_tokens']}/{self.token_budget} "
+            f"tokens from {report['selected']} of {report['candidates']} chunks "
+            f"({report['duplicates_dropped']} near-duplicates dropped), {tokens_saved:+d} tokens vs "
+            f"top-{self.baseline_results} (~{seconds_saved * 1000:+.0f} ms prefill)"
+        )
+
+    def observe_prefill(self, result: Dict[str, Any]):
+        """Track Ollama's measured prompt evaluation rate, so savings use real numbers"""
+        count = result.get("prompt_eval_count")
+        duration = result.get("prompt_eval_duration")
+        # Short evaluations are mostly fixed overhead (or a prompt-cache hit) and understate the rate
+        if not count or not duration or count < 64:
+            return
+        rate = count / (duration / 1e9)
+        self.prefill_tokens_per_second = 0.8 * self.prefill_tokens_per_second + 0.2 * rate
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.stats["requests"] or 1
+        return {
+            **self.stats,
+            "estimated_seconds_saved": round(self.stats["estimated_seconds_saved"], 3),
+            "avg_prompt_tokens": round(self.stats["prompt_tokens"] / requests, 1),
+            "avg_context_tokens": round(self.stats["context_tokens"] / requests, 1),
+            "avg_baseline_tokens": round(self.stats["baseline_tokens"] / requests, 1),
+            "token_budget": self.token_budget,
+            "prefill_tokens_per_second": round(self.prefill_tokens_per_second, 1)
+        }
+
+def _unpack(relevant_info) -> Tuple[List[str], Optional[np.ndarray], Optional[np.ndarray]]:
+    """Pull the first query's documents, embeddings and distances out of a Chroma result"""
+    if not relevant_info or not relevant_info.get("documents"):
+        return [], None, None
+    documents = list(relevant_info["documents"][0])
+
+    embeddings = relevant_info.get("embeddings")
+    embeddings = np.asarray(embeddings[0], dtype=np.float32) if embeddings is not None else None
+    if embeddings is not None and (embeddings.ndim != 2 or len(embeddings) != len(documents)):
+        embeddings = None
+
+    distances = relevant_info.get("distances")
+    distances = np.asarray(distances[0], dtype=np.float32) if distances is not None else None
+    return documents, embeddings, distances
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def _relevance(query_embedding, embeddings, distances, count: int) -> np.ndarray:
+    if query_embedding is not None and embeddings is not None:
+        query = _unit(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        return _unit(embeddings) @ query
+    if distances is not None:
+        return 1.0 / (1.0 + distances)
+    # Chroma returns results nearest first
+    return np.linspace(1.0, 0.0, count, endpoint=False)
+
+def _similarity_matrix(documents: List[str], embeddings: Optional[np.ndarray]) -> np.ndarray:
+    if embeddings is not None:
+        unit = _unit(embeddings)
+        return unit @ unit.T
+    # Without embeddings fall back to word-set overlap (Jaccard)
+    words = [set(normalize_text(document).split()) for document in documents]
+    similarity = np.zeros((len(documents), len(documents)), dtype=np.float32)
+    for i, a in enumerate(words):
+        for j, b in enumerate(words):
+            similarity[i, j] = len(a & b) / len(a | b) if a | b else 1.0
+    return similarity
+
+def _truncate(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0]
+
+# Create a singleton instance
+context_assembler = ContextAssembler()
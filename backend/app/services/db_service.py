@@ -1,40 +1,121 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
-from app.config import MONGODB_URI, MONGODB_DB_NAME
-from app.models.vehicle import Vehicle, VehicleIssue
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne, ReplaceOne, ReturnDocument
+from pymongo.errors import ConnectionFailure, BulkWriteError, OperationFailure
+from app.config import MONGODB_URI, MONGODB_DB_NAME, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from app.models.vehicle import Vehicle, VehicleIssue, VehicleSummary
 from app.models.user import User
+from app.services.cache_service import TTLCache
+from app.services.metrics_service import metrics_service
+from app.services.dtc_service import DTC_PATTERN
 from bson import ObjectId
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields loaded for VehicleSummary
+VEHICLE_SUMMARY_PROJECTION = {"user_id": 1, "make": 1, "model": 1, "year": 1, "type": 1, "mileage": 1}
+# Fields listed for VehicleListItem
+VEHICLE_LIST_PROJECTION = {
+    "make": 1, "model": 1, "year": 1, "type": 1, "vin": 1, "mileage": 1, "last_service_date": 1
+}
+# Fields the maintenance risk model reads
+VEHICLE_SCORING_PROJECTION = {"user_id": 1, "year": 1, "mileage": 1, "last_service_date": 1}
+ISSUE_SCORING_PROJECTION = {"_id": 0, "vehicle_id": 1, "created_at": 1, "severity": 1, "diagnostic_codes": 1}
+
 class MongoDBService:
     def __init__(self):
         self.client = None
         self.db = None
+        # Short-lived cache of user records for the auth dependency
+        self.user_cache = TTLCache(max_size=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
 
     async def connect(self):
+        if self.db is not None:
+            return
         try:
             self.client = AsyncIOMotorClient(MONGODB_URI)
             self.db = self.client[MONGODB_DB_NAME]
             # Ping the database to check connection
             await self.client.admin.command('ping')
             logger.info("Connected to MongoDB")
+            await self.ensure_indexes()
         except ConnectionFailure:
             logger.error("Failed to connect to MongoDB")
             raise
 
+    async def ensure_indexes(self):
+        """Create the indexes the hot queries rely on (no-op if they already exist)"""
+        try:
+            await self.db.users.create_index("email", unique=True, name="users_email_unique")
+        except OperationFailure as e:
+            logger.error(f"Could not create unique index on users.email (duplicate emails?): {e}")
+            raise
+        await self.db.vehicles.create_index("user_id", name="vehicles_by_user")
+        await self.db.vehicle_issues.create_index(
+            [("vehicle_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="vehicle_issues_by_vehicle"
+        )
+        await self.db.vehicle_issues.create_index("diagnostic_codes", name="vehicle_issues_by_code")
+        await self.db.telemetry_buckets.create_index(
+            [("vehicle_id", ASCENDING), ("bucket_start", ASCENDING)],
+            unique=True,
+            name="telemetry_by_vehicle_bucket"
+        )
+        await self.db.maintenance_scores.create_index("user_id", name="maintenance_scores_by_user")
+        # Idle buckets are refilled anyway, so they can be dropped after a day
+        await self.db.rate_limits.create_index("updated_at", expireAfterSeconds=86400, name="rate_limits_ttl")
+        await self.db.issue_rollups.create_index(
+            [("_id.make", ASCENDING), ("_id.model", ASCENDING), ("_id.year", ASCENDING)],
+            name="issue_rollups_by_model"
+        )
+        logger.info("MongoDB indexes ready")
+
+    async def explain_hot_queries(self) -> Dict[str, Dict[str, Any]]:
+        """Explain each hot query and report whether its winning plan uses an index"""
+        sample_id = ObjectId()
+        queries = {
+            "users.by_email": self.db.users.find({"email": "explain@example.com"}),
+            "vehicles.by_id": self.db.vehicles.find({"_id": sample_id}, VEHICLE_SUMMARY_PROJECTION),
+            "vehicles.by_user": self.db.vehicles.find({"user_id": "explain"}, VEHICLE_LIST_PROJECTION),
+            "vehicle_issues.by_id": self.db.vehicle_issues.find({"_id": sample_id, "vehicle_id": "explain"}),
+            "vehicle_issues.by_vehicle": self.db.vehicle_issues.find({"vehicle_id": "explain"})
+                .sort([("created_at", DESCENDING), ("_id", DESCENDING)]),
+            "vehicle_issues.by_code": self.db.vehicle_issues.find({"diagnostic_codes": "P0300"}),
+            "issue_rollups.by_model": self.db.issue_rollups.find({"_id.make": "explain", "_id.model": "explain"})
+        }
+        report = {}
+        for name, cursor in queries.items():
+            plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+            stages = _plan_stages(plan)
+            report[name] = {
+                "stages": stages,
+                "uses_index": "COLLSCAN" not in stages
+            }
+        return report
+
     async def close(self):
         if self.client:
             self.client.close()
+            self.client = None
+            self.db = None
             logger.info("Closed MongoDB connection")
 
     # User methods
+    @metrics_service.timed("mongo.create_user")
     async def create_user(self, user: User):
         user_dict = user.dict(exclude={"id"})
         result = await self.db.users.insert_one(user_dict)
+        self.invalidate_user(user.email)
         return str(result.inserted_id)
 
+    def invalidate_user(self, email: str):
+        """Drop a cached user record; call after any write to the user"""
+        self.user_cache.pop(email)
+
+    @metrics_service.timed("mongo.get_user_by_email")
     async def get_user_by_email(self, email: str):
         user = await self.db.users.find_one({"email": email})
         if user:
@@ -42,41 +123,351 @@ class MongoDBService:
             return User(**user)
         return None
 
+    async def get_cached_user_by_email(self, email: str):
+        """get_user_by_email backed by a bounded TTL cache"""
+        user = self.user_cache.get(email)
+        if user is None:
+            user = await self.get_user_by_email(email)
+            if user is not None:
+                self.user_cache.set(email, user)
+        return user
+
     # Vehicle methods
+    @metrics_service.timed("mongo.create_vehicle")
     async def create_vehicle(self, vehicle: Vehicle):
         vehicle_dict = vehicle.dict(exclude={"id"})
         result = await self.db.vehicles.insert_one(vehicle_dict)
         return str(result.inserted_id)
 
-    async def get_vehicles_by_user(self, user_id: str):
-        cursor = self.db.vehicles.find({"user_id": user_id})
-        vehicles = []
+    @metrics_service.timed("mongo.get_vehicle_list_docs")
+    async def get_vehicle_list_docs(self, user_id: str) -> List[Dict[str, Any]]:
+        """A user's vehicles as raw documents with only the list fields, for direct serialization"""
+        return await self.db.vehicles.find({"user_id": user_id}, VEHICLE_LIST_PROJECTION).to_list(length=None)
+
+    @metrics_service.timed("mongo.get_vehicle_summaries_by_user")
+    async def get_vehicle_summaries_by_user(self, user_id: str) -> List[VehicleSummary]:
+        cursor = self.db.vehicles.find({"user_id": user_id}, VEHICLE_SUMMARY_PROJECTION)
+        return [_vehicle_summary_from_doc(doc) async for doc in cursor]
+
+    @metrics_service.timed("mongo.get_vehicle_summary")
+    async def get_vehicle_summary(self, vehicle_id: str) -> Optional[VehicleSummary]:
+        """Fetch only the fields diagnostics needs"""
+        if not ObjectId.is_valid(vehicle_id):
+            return None
+        doc = await self.db.vehicles.find_one({"_id": ObjectId(vehicle_id)}, VEHICLE_SUMMARY_PROJECTION)
+        return _vehicle_summary_from_doc(doc) if doc else None
+
+    @metrics_service.timed("mongo.get_vehicle_summaries")
+    async def get_vehicle_summaries(self, vehicle_ids: List[str]) -> Dict[str, VehicleSummary]:
+        """Fetch many vehicles in one $in query, keyed by id; unknown or malformed ids are omitted"""
+        object_ids = [ObjectId(vehicle_id) for vehicle_id in set(vehicle_ids) if ObjectId.is_valid(vehicle_id)]
+        cursor = self.db.vehicles.find({"_id": {"$in": object_ids}}, VEHICLE_SUMMARY_PROJECTION)
+        summaries = {}
         async for doc in cursor:
-            doc["id"] = str(doc["_id"])
-            vehicles.append(Vehicle(**doc))
-        return vehicles
-
-    async def get_vehicle(self, vehicle_id: str):
-        vehicle = await self.db.vehicles.find_one({"_id": ObjectId(vehicle_id)})
-        if vehicle:
-            vehicle["id"] = str(vehicle["_id"])
-            return Vehicle(**vehicle)
-        return None
+            summary = _vehicle_summary_from_doc(doc)
+            summaries[summary.id] = summary
+        return summaries
+
+    @metrics_service.timed("mongo.get_vehicle_doc")
+    async def get_vehicle_doc(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        """A vehicle without any legacy embedded issues, as a raw document for direct serialization"""
+        if not ObjectId.is_valid(vehicle_id):
+            return None
+        return await self.db.vehicles.find_one({"_id": ObjectId(vehicle_id)}, {"issues": 0})
 
     # Vehicle issue methods
+    @metrics_service.timed("mongo.add_issue_to_vehicle")
     async def add_issue_to_vehicle(self, vehicle_id: str, issue: VehicleIssue):
         issue_dict = issue.dict(exclude={"id"})
-        issue_id = str(ObjectId())
-        issue_dict["id"] = issue_id
-        
-        result = await self.db.vehicles.update_one(
-            {"_id": ObjectId(vehicle_id)},
-            {"$push": {"issues": issue_dict}}
+        issue_dict["vehicle_id"] = vehicle_id
+        result = await self.db.vehicle_issues.insert_one(issue_dict)
+        return str(result.inserted_id)
+
+    @metrics_service.timed("mongo.add_issues_bulk")
+    async def add_issues_bulk(self, issues: List[VehicleIssue]) -> int:
+        """Insert many issues in one bulk_write; issues must already carry id and vehicle_id"""
+        if not issues:
+            return 0
+        operations = []
+        for issue in issues:
+            issue_dict = issue.dict(exclude={"id"})
+            issue_dict["_id"] = ObjectId(issue.id)
+            operations.append(InsertOne(issue_dict))
+        result = await self.db.vehicle_issues.bulk_write(operations, ordered=False)
+        return result.inserted_count
+
+    @metrics_service.timed("mongo.get_issue")
+    async def get_issue(self, issue_id: str, vehicle_id: Optional[str] = None):
+        if not ObjectId.is_valid(issue_id):
+            return None
+        query = {"_id": ObjectId(issue_id)}
+        if vehicle_id is not None:
+            query["vehicle_id"] = vehicle_id
+        doc = await self.db.vehicle_issues.find_one(query)
+        return _issue_from_doc(doc) if doc else None
+
+    @metrics_service.timed("mongo.get_vehicle_issues")
+    async def get_vehicle_issue_docs(self, vehicle_id: str, limit: int = 20,
+                                     cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of a vehicle's issues, newest first, as raw documents, and the cursor for the next page"""
+        query = {"vehicle_id": vehicle_id}
+        if cursor:
+            created_at, last_id = _decode_cursor(cursor)
+            # Keyset pagination on (created_at, _id) so deep pages stay on the index
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}}
+            ]
+        docs = await self.db.vehicle_issues.find(query) \
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+        return docs, next_cursor
+
+    # Rate limit methods
+    @metrics_service.timed("mongo.take_rate_tokens")
+    async def take_rate_tokens(self, key: str, cost: float, rate: float, capacity: float,
+                               now: datetime) -> Dict[str, Any]:
+        """Refill a token bucket for the time since its last use and take cost tokens if there are enough.
+
+        One atomic pipeline update, so every worker sees the same bucket. Returns
+        the bucket with its remaining tokens and whether the take was allowed.
+        """
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}
+        return await self.db.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count == 1:
-            return issue_id
-        return None
+
+    # Repair guide methods
+    @metrics_service.timed("mongo.get_repair_guide")
+    async def get_repair_guide(self, signature: str) -> Optional[Dict[str, Any]]:
+        return await self.db.repair_guides.find_one({"_id": signature})
+
+    @metrics_service.timed("mongo.claim_repair_guide")
+    async def claim_repair_guide(self, signature: str, issue_id: str) -> Optional[Dict[str, Any]]:
+        """Create a pending entry for a guide if there is none; returns the entry as it was before"""
+        return await self.db.repair_guides.find_one_and_update(
+            {"_id": signature},
+            {"$setOnInsert": {"status": "pending", "issue_id": issue_id, "created_at": datetime.now()}},
+            upsert=True
+        )
+
+    @metrics_service.timed("mongo.save_repair_guide")
+    async def save_repair_guide(self, signature: str, status: str, guide: Dict[str, Any], issue_id: str):
+        """Store a guide; issue_id records the issue it was first generated for"""
+        await self.db.repair_guides.update_one(
+            {"_id": signature},
+            {
+                "$set": {"status": status, "guide": guide, "updated_at": datetime.now()},
+                "$setOnInsert": {"issue_id": issue_id, "created_at": datetime.now()}
+            },
+            upsert=True
+        )
+
+    # Issue rollup methods
+    @metrics_service.timed("mongo.increment_issue_rollups")
+    async def increment_issue_rollups(self, increments: List[Tuple[Dict[str, Any], Dict[str, int]]]) -> int:
+        """Apply (bucket, counter increments) pairs as upserts in one bulk_write"""
+        if not increments:
+            return 0
+        now = datetime.now()
+        operations = [
+            UpdateOne({"_id": bucket}, {"$inc": counters, "$set": {"updated_at": now}}, upsert=True)
+            for bucket, counters in increments
+        ]
+        await self.db.issue_rollups.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @metrics_service.timed("mongo.get_issue_rollups")
+    async def get_issue_rollups(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Rollup documents whose bucket matches every given dimension"""
+        query = {f"_id.{dimension}": value for dimension, value in filters.items()}
+        return await self.db.issue_rollups.find(query, {"updated_at": 0, "rebuilt_at": 0}).to_list(length=None)
+
+    async def rebuild_issue_rollups(self, mileage_band: int) -> int:
+        """Recompute every rollup from vehicle_issues with two $merge pipelines.
+
+        The first replaces each bucket's issue and severity counts, the second
+        merges in its code counts; buckets that no longer have issues are then
+        removed. Increments landing while it runs can be lost, so run it when
+        writes are quiet, e.g. after a migration or a change of mileage band.
+        """
+        stamp = datetime.now()
+        bucket = {"make": "$make", "model": "$model", "year": "$year", "mileage_band": "$mileage_band"}
+        bucket_of_group = {dimension: f"$_id.{dimension}" for dimension in bucket}
+        issues_with_bucket = [
+            {"$lookup": {
+                "from": "vehicles",
+                "let": {"vehicle_id": {"$convert": {"input": "$vehicle_id", "to": "objectId",
+                                                    "onError": None, "onNull": None}}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$vehicle_id"]}}},
+                    {"$project": {"make": 1, "model": 1, "year": 1, "mileage": 1}}
+                ],
+                "as": "vehicle"
+            }},
+            {"$unwind": "$vehicle"},
+            {"$project": {
+                "make": {"$toLower": {"$trim": {"input": "$vehicle.make"}}},
+                "model": {"$toLower": {"$trim": {"input": "$vehicle.model"}}},
+                "year": "$vehicle.year",
+                # Same integers as the incremental path, so both address the same bucket _id
+                "mileage_band": {"$cond": [
+                    {"$isNumber": "$vehicle.mileage"},
+                    {"$toInt": {"$multiply": [{"$floor": {"$divide": ["$vehicle.mileage", mileage_band]}},
+                                              mileage_band]}},
+                    None
+                ]},
+                "severity": {"$ifNull": ["$severity", "unknown"]},
+                "codes": {"$setUnion": [{"$map": {
+                    "input": {"$ifNull": ["$diagnostic_codes", []]},
+                    "in": {"$toUpper": {"$trim": {"input": "$$this"}}}
+                }}]}
+            }}
+        ]
+        await self.db.vehicle_issues.aggregate(issues_with_bucket + [
+            {"$group": {"_id": {**bucket, "severity": "$severity"}, "count": {"$sum": 1}}},
+            {"$group": {
+                "_id": bucket_of_group,
+                "issues": {"$sum": "$count"},
+                "severity": {"$push": {"k": "$_id.severity", "v": "$count"}}
+            }},
+            {"$set": {
+                "severity": {"$arrayToObject": "$severity"},
+                "codes": {"$literal": {}},
+                "updated_at": stamp,
+                "rebuilt_at": stamp
+            }},
+            {"$merge": {"into": "issue_rollups", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]).to_list(length=None)
+        await self.db.vehicle_issues.aggregate(issues_with_bucket + [
+            {"$unwind": "$codes"},
+            {"$match": {"codes": {"$regex": DTC_PATTERN.pattern}}},
+            {"$group": {"_id": {**bucket, "code": "$codes"}, "count": {"$sum": 1}}},
+            {"$group": {"_id": bucket_of_group, "codes": {"$push": {"k": "$_id.code", "v": "$count"}}}},
+            {"$set": {"codes": {"$arrayToObject": "$codes"}}},
+            {"$merge": {"into": "issue_rollups", "whenMatched": "merge", "whenNotMatched": "discard"}}
+        ]).to_list(length=None)
+        await self.db.issue_rollups.delete_many({"rebuilt_at": {"$ne": stamp}})
+        buckets = await self.db.issue_rollups.count_documents({})
+        logger.info(f"Rebuilt {buckets} issue rollup buckets")
+        return buckets
+
+    # Maintenance score methods
+    async def iter_vehicles_for_scoring(self, chunk_size: int,
+                                        user_id: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream vehicles (only the fields the risk model needs) in chunks from one cursor"""
+        query = {"user_id": user_id} if user_id is not None else {}
+        cursor = self.db.vehicles.find(query, VEHICLE_SCORING_PROJECTION).batch_size(chunk_size)
+        chunk = []
+        async for doc in cursor:
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @metrics_service.timed("mongo.get_vehicles_for_scoring")
+    async def get_vehicles_for_scoring(self, vehicle_ids: List[str]) -> List[Dict[str, Any]]:
+        """The risk model's fields for the given vehicles; unknown or malformed ids are omitted"""
+        object_ids = [ObjectId(vehicle_id) for vehicle_id in set(vehicle_ids) if ObjectId.is_valid(vehicle_id)]
+        return await self.db.vehicles.find({"_id": {"$in": object_ids}}, VEHICLE_SCORING_PROJECTION) \
+            .to_list(length=None)
+
+    @metrics_service.timed("mongo.get_issues_since")
+    async def get_issues_since(self, vehicle_ids: List[str], since: datetime) -> List[Dict[str, Any]]:
+        """Issues of many vehicles created since a date, in one $in query on the per-vehicle index"""
+        cursor = self.db.vehicle_issues.find(
+            {"vehicle_id": {"$in": vehicle_ids}, "created_at": {"$gte": since}},
+            ISSUE_SCORING_PROJECTION
+        )
+        return await cursor.to_list(length=None)
+
+    @metrics_service.timed("mongo.save_maintenance_scores")
+    async def save_maintenance_scores(self, scores: List[Dict[str, Any]]) -> int:
+        """Replace each vehicle's stored scores (documents keyed by vehicle id) in one bulk_write"""
+        if not scores:
+            return 0
+        operations = [ReplaceOne({"_id": score["_id"]}, score, upsert=True) for score in scores]
+        await self.db.maintenance_scores.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @metrics_service.timed("mongo.get_maintenance_scores")
+    async def get_maintenance_scores(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.maintenance_scores.find_one({"_id": vehicle_id})
+
+    @metrics_service.timed("mongo.get_maintenance_scores_by_user")
+    async def get_maintenance_scores_by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        cursor = self.db.maintenance_scores.find({"user_id": user_id}).sort("overall", DESCENDING)
+        return await cursor.to_list(length=None)
+
+    async def migrate_embedded_issues(self, batch_size: int = 500) -> int:
+        """Move issues still embedded in vehicle documents into vehicle_issues.
+
+        Safe to re-run: issues keep their original id as _id, duplicates are
+        ignored, and the embedded array is only removed once its issues are copied.
+        """
+        migrated = 0
+        cursor = self.db.vehicles.find({"issues.0": {"$exists": True}}, {"issues": 1}).batch_size(batch_size)
+        async for vehicle in cursor:
+            vehicle_id = str(vehicle["_id"])
+            docs = []
+            for issue in vehicle["issues"]:
+                doc = dict(issue)
+                doc["_id"] = ObjectId(doc.pop("id")) if doc.get("id") else ObjectId()
+                doc["vehicle_id"] = vehicle_id
+                docs.append(doc)
+            try:
+                await self.db.vehicle_issues.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys mean an earlier run already copied these issues
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            await self.db.vehicles.update_one({"_id": vehicle["_id"]}, {"$unset": {"issues": ""}})
+            migrated += len(docs)
+        logger.info(f"Migrated {migrated} embedded issues to vehicle_issues")
+        return migrated
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    # Newer servers wrap the classic plan in queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = [plan.get("stage", "")]
+    for child in plan.get("inputStages", [plan["inputStage"]] if "inputStage" in plan else []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+def _vehicle_summary_from_doc(doc) -> VehicleSummary:
+    doc["id"] = str(doc.pop("_id"))
+    return VehicleSummary(**doc)
+
+def _issue_from_doc(doc) -> VehicleIssue:
+    doc["id"] = str(doc.pop("_id"))
+    return VehicleIssue(**doc)
+
+def _encode_cursor(created_at: datetime, issue_id: ObjectId) -> str:
+    raw = f"{created_at.isoformat()}|{issue_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        created_at, issue_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(issue_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
 
 # Create a singleton instance
 mongodb_service = MongoDBService()
\ No newline at end of file
@@ -0,0 +1,197 @@
+import json
+import re
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterable
+from app.config import DTC_DATASET_PATH
+from app.models.vehicle import IssueSeverity
+
+logger = logging.getLogger(__name__)
+
+# P/B/C/U, then 4 hex digits (e.g. P0300, U0100, P2A00)
+DTC_PATTERN = re.compile(r"^[PBCU][0-9A-F]{4}$")
+
+SEVERITY_RANK = {
+    IssueSeverity.low: 0,
+    IssueSeverity.medium: 1,
+    IssueSeverity.high: 2,
+    IssueSeverity.critical: 3
+}
+
+def normalize_code(code: str) -> Optional[str]:
+    code = code.strip().upper()
+    return code if DTC_PATTERN.match(code) else None
+
+class DTCKnowledgeEngine:
+    """In-memory DTC index that diagnoses well-understood codes without the LLM.
+
+    Exact codes live in a dict; code families (P03, P04, ...) live in a prefix
+    table that is walked from the longest prefix down, so unknown codes still
+    get a system and severity. A diagnosis is answered locally only when every
+    code is known exactly, definitive, and all codes point to the same fault group.
+    """
+
+    def __init__(self, dataset_path: str = DTC_DATASET_PATH, latency_samples: int = 1024):
+        self.dataset_path = dataset_path
+        self.codes: Dict[str, Dict[str, Any]] = {}
+        self.prefixes: Dict[str, Dict[str, Any]] = {}
+        self._max_prefix = 0
+        self._loaded = False
+        self.hits = 0
+        self.fallbacks = 0
+        # Recent triage latencies in microseconds, for the report
+        self._latencies = deque(maxlen=latency_samples)
+
+    def load(self, records: Optional[Iterable[Dict[str, Any]]] = None):
+        """Index the bundled dataset, or the given records (same shape as data/dtc_codes.jsonl)"""
+        if records is None:
+            with open(self.dataset_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        for record in records:
+            self.add_record(record)
+        self._loaded = True
+        logger.info(f"Loaded {len(self.codes)} DTC codes and {len(self.prefixes)} code families")
+
+    def load_from_collection(self, collection) -> int:
+        """Merge code records ingested into a Chroma collection (e.g. diagnostic_codes)"""
+        if not self._loaded:
+            self.load()
+        results = collection.get(include=["metadatas", "documents"])
+        added = 0
+        for metadata, document in zip(results["metadatas"], results["documents"]):
+            if metadata and (metadata.get("code") or metadata.get("prefix")):
+                record = {key: _decode_metadata_value(value) for key, value in metadata.items()}
+                record.setdefault("text", document)
+                self.add_record(record)
+                added += 1
+        logger.info(f"Merged {added} DTC records from collection '{collection.name}'")
+        return added
+
+    def add_record(self, record: Dict[str, Any]):
+        try:
+            severity = IssueSeverity(record.get("severity", "medium"))
+        except ValueError:
+            severity = IssueSeverity.medium
+        entry = {
+            "description": record.get("text", ""),
+            "group": record.get("group"),
+            "severity": severity,
+            "likely_causes": record.get("likely_causes", []),
+            "recommended_actions": record.get("recommended_actions", []),
+            "definitive": record.get("definitive", True)
+        }
+        if record.get("code"):
+            code = normalize_code(record["code"])
+            if code:
+                self.codes[code] = entry
+        elif record.get("prefix"):
+            prefix = record["prefix"].strip().upper()
+            self.prefixes[prefix] = entry
+            self._max_prefix = max(self._max_prefix, len(prefix))
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def lookup(self, code: str) -> Optional[Dict[str, Any]]:
+        """Exact entry for a code, else the entry of its longest known family prefix"""
+        self._ensure_loaded()
+        entry = self.codes.get(code)
+        if entry is not None:
+            return entry
+        for length in range(min(len(code), self._max_prefix), 0, -1):
+            entry = self.prefixes.get(code[:length])
+            if entry is not None:
+                return entry
+        return None
+
+    def classify_severity(self, codes: List[str]) -> Optional[IssueSeverity]:
+        """Highest severity across the codes, or None if none are recognised"""
+        severity = None
+        for code in filter(None, map(normalize_code, codes)):
+            entry = self.lookup(code)
+            if entry is not None and (severity is None or SEVERITY_RANK[entry["severity"]] > SEVERITY_RANK[severity]):
+                severity = entry["severity"]
+        return severity
+
+    def describe_codes(self, codes: List[str]) -> List[str]:
+        """One-line descriptions of the codes, to give the LLM context on ambiguous cases"""
+        self._ensure_loaded()
+        descriptions = []
+        for code in codes:
+            normalized = normalize_code(code)
+            if normalized in self.codes:
+                descriptions.append(self.codes[normalized]["description"])
+                continue
+            family = self.lookup(normalized) if normalized else None
+            descriptions.append(f"{code} ({family['description']})" if family else code)
+        return descriptions
+
+    def triage(self, codes: List[str]) -> Optional[Dict[str, Any]]:
+        """Diagnosis built from the codes alone, or None when the LLM should decide"""
+        self._ensure_loaded()
+        started = time.perf_counter()
+        diagnosis = self._triage(codes) if codes else None
+        if codes:
+            self._latencies.append((time.perf_counter() - started) * 1e6)
+            if diagnosis is not None:
+                self.hits += 1
+            else:
+                self.fallbacks += 1
+        return diagnosis
+
+    def _triage(self, codes: List[str]) -> Optional[Dict[str, Any]]:
+        normalized = []
+        for code in codes:
+            code = normalize_code(code)
+            if code is None:
+                return None
+            if code not in normalized:
+                normalized.append(code)
+
+        entries = [self.codes.get(code) for code in normalized]
+        if any(entry is None or not entry["definitive"] for entry in entries):
+            return None
+        # Codes from different systems interact (e.g. lean + misfire); leave those to the LLM
+        if len({entry["group"] for entry in entries}) > 1:
+            return None
+
+        severity = max((entry["severity"] for entry in entries), key=SEVERITY_RANK.get)
+        return {
+            "likely_causes": _merge(entry["likely_causes"] for entry in entries),
+            "severity": severity.value,
+            "recommended_actions": _merge(entry["recommended_actions"] for entry in entries),
+            "diagnostic_codes": normalized,
+            "explanation": " ".join(entry["description"] for entry in entries),
+            "source": "dtc_rules"
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.fallbacks
+        latencies = sorted(self._latencies)
+        return {
+            "codes": len(self.codes),
+            "families": len(self.prefixes),
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_rate": self.hits / total if total else 0.0,
+            "latency_us_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_us_p99": latencies[int(len(latencies) * 0.99)] if latencies else None
+        }
+
+def _merge(lists: Iterable[List[str]]) -> List[str]:
+    # Order-preserving de-duplication
+    return list(dict.fromkeys(item for items in lists for item in items))
+
+def _decode_metadata_value(value):
+    # The ingestion pipeline stores list metadata as JSON strings
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+# Create a singleton instance
+dtc_engine = DTCKnowledgeEngine()
@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from functools import cached_property
+from typing import Dict, Any, List, Optional
+from chromadb.api.types import Documents, Embeddings, EmbeddingFunction
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+from app.config import (
+    EMBEDDING_FUNCTION, EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+    EMBEDDING_CACHE_SIZE, EMBEDDING_DISK_CACHE_PATH, EMBEDDING_DISK_CACHE_MAX_ENTRIES
+)
+from app.services.metrics_service import metrics_service
+
+try:
+    import fcntl
+except ImportError:  # Windows; the disk store then assumes a single writing process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes of BLAKE2b digest used as a cache key
+KEY_SIZE = 16
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+class LocalEmbeddingFunction(ONNXMiniLM_L6_V2):
+    """Chroma's default all-MiniLM-L6-v2 ONNX model with a configurable batch size and CPU thread count"""
+
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE, threads: int = EMBEDDING_THREADS,
+                 preferred_providers: Optional[List[str]] = None):
+        super().__init__(preferred_providers=preferred_providers)
+        self.batch_size = batch_size
+        self.threads = threads
+
+    @staticmethod
+    def name() -> str:
+        # Same model and vectors as DefaultEmbeddingFunction, so existing collections accept it
+        return "default"
+
+    @cached_property
+    def model(self) -> Any:
+        options = self.ort.SessionOptions()
+        options.log_severity_level = 3
+        options.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=self._preferred_providers or ["CPUExecutionProvider"],
+            sess_options=options
+        )
+
+    def __call__(self, input: Documents) -> Embeddings:
+        self._download_model_if_not_exists()
+        return [np.asarray(embedding, dtype=np.float32) for embedding in self._forward(input, self.batch_size)]
+
+def create_embedding_function(spec: str = EMBEDDING_FUNCTION) -> EmbeddingFunction:
+    """The configured embedding function: "default", or a "module:factory" that returns one"""
+    if spec == "default":
+        return LocalEmbeddingFunction()
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"EMBEDDING_FUNCTION must be 'default' or 'module:factory', got '{spec}'")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+class MemmapEmbeddingStore:
+    """Append-only embedding store on disk, read through a memory map.
+
+    keys.bin holds one fixed-size text hash per row and vectors.f32 the rows
+    of float32 vectors, so a lookup is a dict probe and a slice of the map; the
+    OS page cache keeps hot rows in memory. Appends take an exclusive file lock
+    and each process picks up rows other processes added, so several API
+    workers can share one store. A vector is written before its key, so a crash
+    midway leaves at most an unreferenced row that the next append overwrites.
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBEDDING_DISK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.keys_path = os.path.join(path, "keys.bin")
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.dimensions: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._keys_read = 0
+        self._map: Optional[np.memmap] = None
+        self._opened_for: Optional[str] = None
+
+    def open(self, name: str, dimensions: int):
+        """Open the store for one embedding function, starting afresh if it was built by another"""
+        if self._opened_for == name and self.dimensions == dimensions:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        meta = {"name": name, "dimensions": dimensions}
+        with self._locked():
+            existing = None
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, encoding="utf-8") as f:
+                    existing = json.load(f)
+            if existing != meta:
+                if existing is not None:
+                    logger.warning(f"Embedding store at {self.path} was built for {existing}; starting afresh")
+                for file_path in (self.keys_path, self.vectors_path):
+                    open(file_path, "wb").close()
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+        self.close()
+        self.dimensions = dimensions
+        self._opened_for = name
+        self._refresh()
+        logger.info(f"Embedding store at {self.path} holds {len(self._rows)} embeddings")
+
+    def load(self, name: str) -> bool:
+        """Open an existing store built by this embedding function, so it serves hits before anything is embedded"""
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get("name") != name:
+            return False
+        self.open(name, meta["dimensions"])
+        return True
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        if row is None:
+            # Another worker may have added it since
+            self._refresh()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+        if self._map is None or row >= len(self._map):
+            rows = os.path.getsize(self.vectors_path) // (self.dimensions * 4)
+            if row >= rows:
+                return None
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+        return np.array(self._map[row])
+
+    def put(self, keys: List[bytes], vectors: np.ndarray) -> int:
+        """Append the vectors whose keys aren't stored yet; returns how many were added"""
+        with self._locked():
+            self._refresh()
+            fresh = [index for index, key in enumerate(keys) if key not in self._rows]
+            fresh = fresh[:max(self.max_entries - len(self._rows), 0)]
+            if not fresh:
+                return 0
+            first = self._keys_read // KEY_SIZE
+            with open(self.vectors_path, "r+b") as f:
+                f.seek(first * self.dimensions * 4)
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float32).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(keys[index] for index in fresh))
+            self._refresh()
+        return len(fresh)
+
+    def _refresh(self):
+        size = os.path.getsize(self.keys_path)
+        if size <= self._keys_read:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            data = f.read(size - self._keys_read)
+        data = data[:len(data) // KEY_SIZE * KEY_SIZE]
+        row = self._keys_read // KEY_SIZE
+        for offset in range(0, len(data), KEY_SIZE):
+            self._rows[data[offset:offset + KEY_SIZE]] = row
+            row += 1
+        self._keys_read += len(data)
+
+    def _locked(self):
+        return _FileLock(os.path.join(self.path, ".lock"))
+
+    def close(self):
+        self.dimensions = None
+        self._map = None
+        self._rows = {}
+        self._keys_read = 0
+        self._opened_for = None
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Serve repeated texts from an LRU of embeddings (and optionally a disk store) instead of the model.
+
+    Entries are keyed by a hash of the exact text. Texts missing from both
+    tiers are deduplicated and embedded by the wrapped function in one call,
+    then stored in both. It reports the wrapped function's name and config, so
+    Chroma treats collections as using that function.
+    """
+
+    def __init__(self, embedding_function: EmbeddingFunction, max_size: int = EMBEDDING_CACHE_SIZE,
+                 disk_path: str = EMBEDDING_DISK_CACHE_PATH):
+        self.embedding_function = embedding_function
+        self.max_size = max_size
+        self.disk = MemmapEmbeddingStore(disk_path) if disk_path else None
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_checked = False
+        self.stats = {
+            "texts": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "model_calls": 0, "model_texts": 0, "model_seconds": 0.0, "disk_errors": 0
+        }
+
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.embedding_function.get_config()
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "CachedEmbeddingFunction":
+        return CachedEmbeddingFunction(create_embedding_function())
+
+    def default_space(self):
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self):
+        return self.embedding_function.supported_spaces()
+
+    def peek(self, texts: List[str]) -> Optional[List[np.ndarray]]:
+        """Embeddings for texts that are all in memory, or None; cheap enough to call on the event loop"""
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            vectors = [self._entries.get(key) for key in keys]
+            if any(vector is None for vector in vectors):
+                return None
+            for key in keys:
+                self._entries.move_to_end(key)
+            self.stats["texts"] += len(texts)
+            self.stats["memory_hits"] += len(texts)
+        return vectors
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [text_key(text) for text in input]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing: "OrderedDict[bytes, List[int]]" = OrderedDict()
+        with self._lock:
+            self.stats["texts"] += len(keys)
+            for index, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[index] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(index)
+            if missing and self._disk_ready():
+                for key in list(missing):
+                    vector = self._disk_get(key)
+                    if vector is not None:
+                        vector.setflags(write=False)
+                        self._remember(key, vector)
+                        indexes = missing.pop(key)
+                        for index in indexes:
+                            vectors[index] = vector
+                        self.stats["disk_hits"] += len(indexes)
+            self.stats["misses"] += sum(len(indexes) for indexes in missing.values())
+
+        if missing:
+            texts = [input[indexes[0]] for indexes in missing.values()]
+            started = time.perf_counter()
+            with metrics_service.span("vector.embed_model"):
+                embedded = np.asarray(self.embedding_function(texts), dtype=np.float32)
+            with self._lock:
+                self.stats["model_calls"] += 1
+                self.stats["model_texts"] += len(texts)
+                self.stats["model_seconds"] += time.perf_counter() - started
+                for (key, indexes), vector in zip(missing.items(), embedded):
+                    vector.setflags(write=False)
+                    self._remember(key, vector)
+                    for index in indexes:
+                        vectors[index] = vector
+                self._disk_put(list(missing), embedded)
+        return vectors
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _disk_ready(self) -> bool:
+        if self.disk is None or self.disk.dimensions is not None:
+            return self.disk is not None
+        if not self._disk_checked:
+            # Reuse a store left by an earlier run; otherwise it is created on the first write
+            self._disk_checked = True
+            try:
+                return self.disk.load(self.name())
+            except (OSError, ValueError) as e:
+                self.stats["disk_errors"] += 1
+                logger.warning(f"Embedding store could not be opened: {e}")
+        return False
+
+    # The disk store only speeds things up, so its failures are logged and counted, never raised
+    def _disk_get(self, key: bytes) -> Optional[np.ndarray]:
+        try:
+            return self.disk.get(key)
+        except (OSError, ValueError, KeyError) as e:
+            self.stats["disk_errors"] += 1
+            logger.warning(f"Embedding store read failed: {e}")
+            return None
+
+    def _disk_put(self, keys: List[bytes], vectors: np.ndarray):
+        if self.disk is None:
+            return
+        try:
+            self.disk.open(self.name(), vectors.shape[1])
+            self.disk.put(keys, vectors)
+        except (OSError, ValueError) as e:
+            self.stats["disk_errors"] += 1
+            logger.warning(f"Embedding store write failed: {e}")
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self._disk_checked = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_size"] = len(self._entries)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = hits / stats["texts"] if stats["texts"] else 0.0
+        stats["model_ms_per_call"] = stats["model_seconds"] / stats["model_calls"] * 1000 if stats["model_calls"] else None
+        stats["model_seconds"] = round(stats["model_seconds"], 3)
+        stats["max_size"] = self.max_size
+        stats["disk_size"] = len(self.disk) if self.disk is not None else None
+        stats["embedding_function"] = self.name()
+        return stats
+
+def cached(embedding_function: EmbeddingFunction) -> EmbeddingFunction:
+    """Wrap an embedding function in the configured cache, unless caching is disabled"""
+    if isinstance(embedding_function, CachedEmbeddingFunction) or (EMBEDDING_CACHE_SIZE <= 0 and not EMBEDDING_DISK_CACHE_PATH):
+        return embedding_function
+    return CachedEmbeddingFunction(embedding_function)
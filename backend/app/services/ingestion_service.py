@@ -0,0 +1,209 @@
+import csv
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+from app.config import INGEST_BATCH_SIZE, INGEST_WORKERS, INGEST_CHUNK_SIZE, INGEST_CHUNK_OVERLAP
+from app.services.vector_db_service import vector_db_service
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Field names accepted as the document body in JSONL/CSV records
+TEXT_FIELDS = ("text", "document", "content", "description")
+
+Record = Tuple[str, Dict[str, Any]]
+
+# Readers
+def iter_jsonl(path: Path) -> Iterator[Record]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = _pop_text(record)
+            if text:
+                yield text, {**record, "source": str(path), "line": line_number}
+
+def iter_csv(path: Path) -> Iterator[Record]:
+    with open(path, encoding="utf-8", newline="") as f:
+        for row_number, row in enumerate(csv.DictReader(f), 1):
+            text = _pop_text(row)
+            if text:
+                yield text, {**row, "source": str(path), "row": row_number}
+
+def iter_markdown(path: Path) -> Iterator[Record]:
+    """Yield one record per section, split at headings of any level, so chunks keep their heading as context"""
+    title, lines = None, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") and lines:
+                yield "".join(lines).strip(), {"source": str(path), "title": title or path.stem}
+                lines = []
+            if line.startswith("#"):
+                title = line.lstrip("#").strip()
+            lines.append(line)
+    if lines:
+        yield "".join(lines).strip(), {"source": str(path), "title": title or path.stem}
+
+READERS = {
+    ".jsonl": iter_jsonl,
+    ".csv": iter_csv,
+    ".md": iter_markdown,
+    ".markdown": iter_markdown
+}
+
+def _pop_text(record: Dict[str, Any]) -> Optional[str]:
+    for field in TEXT_FIELDS:
+        if record.get(field):
+            return str(record.pop(field))
+    return None
+
+def iter_files(paths: Iterable[str]) -> Iterator[Path]:
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.suffix.lower() in READERS)
+        elif path.suffix.lower() in READERS:
+            yield path
+        else:
+            logger.warning(f"Skipping unsupported file '{path}'")
+
+# Chunking
+def chunk_text(text: str, chunk_size: int = INGEST_CHUNK_SIZE, overlap: int = INGEST_CHUNK_OVERLAP) -> Iterator[str]:
+    """Split text into chunks of at most chunk_size characters, preferring paragraph and sentence breaks"""
+    text = text.strip()
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Back off to the nearest natural break in the second half of the window
+            for separator in ("\n\n", "\n", ". ", " "):
+                index = text.rfind(separator, start + chunk_size // 2, end)
+                if index > start:
+                    end = index + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+def content_id(text: str) -> str:
+    """Stable ID derived from chunk content, so unchanged chunks map to the same entry on re-runs"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+def _clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # Chroma metadata values must be scalars
+    cleaned = {}
+    for key, value in metadata.items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, (str, int, float, bool)):
+            cleaned[key] = value
+        else:
+            cleaned[key] = json.dumps(value, default=str)
+    return cleaned
+
+class KnowledgeIngestionPipeline:
+    """Stream documents from disk into a Chroma collection in bounded batches.
+
+    Files are read lazily and chunked on the fly; at most ``workers * 2`` batches
+    are held in memory while they are being embedded.
+    """
+
+    def __init__(self, collection_name: str, batch_size: int = INGEST_BATCH_SIZE,
+                 workers: int = INGEST_WORKERS, chunk_size: int = INGEST_CHUNK_SIZE,
+                 chunk_overlap: int = INGEST_CHUNK_OVERLAP):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.stats = {"files": 0, "chunks": 0, "skipped": 0, "upserted": 0}
+
+    def iter_chunks(self, paths: Iterable[str]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        for path in iter_files(paths):
+            self.stats["files"] += 1
+            for text, metadata in READERS[path.suffix.lower()](path):
+                for index, chunk in enumerate(chunk_text(text, self.chunk_size, self.chunk_overlap)):
+                    yield content_id(chunk), chunk, _clean_metadata({**metadata, "chunk": index})
+
+    def iter_batches(self, paths: Iterable[str]) -> Iterator[List[Tuple[str, str, Dict[str, Any]]]]:
+        batch, seen = [], set()
+        for item in self.iter_chunks(paths):
+            self.stats["chunks"] += 1
+            # Identical chunks within a batch would collide on the same ID
+            if item[0] in seen:
+                self.stats["skipped"] += 1
+                continue
+            seen.add(item[0])
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch, seen = [], set()
+        if batch:
+            yield batch
+
+    def _prepare_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        """Drop chunks already stored and embed the rest (runs on a worker thread)"""
+        existing = set(vector_db_service.get_existing_ids(self.collection_name, [item[0] for item in batch]))
+        new_items = [item for item in batch if item[0] not in existing]
+        embeddings = vector_db_service.embed_texts([item[1] for item in new_items]) if new_items else []
+        return len(batch) - len(new_items), new_items, embeddings
+
+    def _write_batch(self, skipped: int, items: List[Tuple[str, str, Dict[str, Any]]],
+                     embeddings: List[List[float]]):
+        self.stats["skipped"] += skipped
+        if not items:
+            return
+        vector_db_service.upsert_embeddings(
+            self.collection_name,
+            ids=[item[0] for item in items],
+            embeddings=embeddings,
+            documents=[item[1] for item in items],
+            metadatas=[item[2] for item in items]
+        )
+        self.stats["upserted"] += len(items)
+
+    def run(self, paths: Iterable[str]) -> Dict[str, Any]:
+        # Create the collection up front so worker threads never race to create it
+        if self.collection_name not in vector_db_service.collections:
+            vector_db_service._create_collection(self.collection_name)
+
+        start = time.perf_counter()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as executor:
+            for batch in self.iter_batches(paths):
+                pending.append(executor.submit(self._prepare_batch, batch))
+                # Backpressure: don't read ahead further than the pool can embed
+                while len(pending) >= self.workers * 2:
+                    self._write_batch(*pending.popleft().result())
+            while pending:
+                self._write_batch(*pending.popleft().result())
+
+        elapsed = time.perf_counter() - start
+        report = {
+            **self.stats,
+            "collection": self.collection_name,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.stats["chunks"] / elapsed, 1) if elapsed else 0.0,
+            "peak_memory_mb": _peak_memory_mb()
+        }
+        logger.info(f"Ingestion finished: {report}")
+        return report
+
+def _peak_memory_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
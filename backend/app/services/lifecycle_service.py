@@ -0,0 +1,117 @@
+import asyncio
+import time
+import logging
+from typing import Dict, Any, Optional
+from app.services.db_service import mongodb_service
+from app.services.vector_db_service import vector_db_service
+from app.services.llm_service import llm_service
+from app.services.password_service import password_service
+from app.services.telemetry_service import telemetry_service
+from app.services.dtc_service import dtc_engine
+from app.services.repair_guide_service import repair_guide_service
+from app.services.maintenance_service import maintenance_service
+
+logger = logging.getLogger(__name__)
+
+class LifecycleService:
+    """Start and stop every backend, and track readiness for /health/ready.
+
+    Startup connects the pools concurrently and returns, so the process is live
+    straight away; model warm-up continues in the background and the service
+    only reports ready once it has finished.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.checks: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    async def startup(self):
+        started = time.perf_counter()
+        # Chroma's client is blocking, so it connects on a thread alongside the others
+        results = await asyncio.gather(
+            mongodb_service.connect(),
+            asyncio.to_thread(vector_db_service.connect),
+            llm_service.connect(),
+            return_exceptions=True
+        )
+        for name, result in zip(("mongodb", "chromadb", "llm_client"), results):
+            self.checks[name] = f"error: {result}" if isinstance(result, Exception) else "ok"
+        self.timings["connect_seconds"] = round(time.perf_counter() - started, 3)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            await self._close_connections()
+            raise failures[0]
+
+        await telemetry_service.start()
+        await repair_guide_service.start()
+        await maintenance_service.start()
+        self._warm_up_task = asyncio.create_task(self.warm_up(started))
+        logger.info(f"Backends connected in {self.timings['connect_seconds']}s; warming up")
+
+    async def _close_connections(self):
+        """Close the pools after a failed startup; a failed connect may have opened its client before failing"""
+        results = await asyncio.gather(
+            mongodb_service.close(),
+            asyncio.to_thread(vector_db_service.close),
+            llm_service.close(),
+            return_exceptions=True
+        )
+        for name, result in zip(("mongodb", "chromadb", "llm_client"), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to close {name} after a failed startup: {result}")
+
+    async def warm_up(self, startup_started: Optional[float] = None):
+        started = time.perf_counter()
+        embedding, llm, dtc = await asyncio.gather(
+            asyncio.to_thread(vector_db_service.warm_up),
+            llm_service.warm_up(),
+            asyncio.to_thread(self._load_dtc_rules),
+            return_exceptions=True
+        )
+        self.checks["embedding_model"] = _check(embedding, "warm")
+        self.checks["llm_model"] = _check(llm, "warm")
+        self.checks["dtc_rules"] = _check(dtc, "loaded")
+        self.timings["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+        if startup_started is not None:
+            self.timings["startup_to_ready_seconds"] = round(time.perf_counter() - startup_started, 3)
+
+        # The LLM is optional for readiness: DTC rules and cached diagnoses still work without it
+        self.ready = not isinstance(embedding, Exception)
+        if isinstance(llm, Exception):
+            logger.warning(f"LLM warm-up failed, first diagnosis will be slow: {llm}")
+        logger.info(f"Warm-up finished in {self.timings['warm_up_seconds']}s (ready: {self.ready})")
+
+    def _load_dtc_rules(self):
+        # Prefer codes ingested into Chroma, on top of the bundled dataset
+        collection = vector_db_service.collections.get("diagnostic_codes")
+        if collection is not None:
+            dtc_engine.load_from_collection(collection)
+        else:
+            dtc_engine.load()
+
+    async def shutdown(self):
+        self.ready = False
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+        await telemetry_service.stop()
+        await repair_guide_service.stop()
+        await maintenance_service.stop()
+        await llm_service.close()
+        password_service.close()
+        vector_db_service.close()
+        await mongodb_service.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "checks": self.checks,
+            "timings": self.timings
+        }
+
+def _check(result, ok: str) -> str:
+    return f"error: {result}" if isinstance(result, Exception) else ok
+
+# Create a singleton instance
+lifecycle_service = LifecycleService()
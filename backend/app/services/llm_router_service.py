@@ -0,0 +1,444 @@
+import abc
+import asyncio
+import json
+import time
+import logging
+import httpx
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable, Set, Tuple, Union
+from urllib.parse import urlparse
+from app.config import (
+    OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, HUGGINGFACE_API_KEY, HUGGINGFACE_MODEL,
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_CONCURRENCY,
+    LLM_BALANCING, LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MIN_SAMPLES,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS
+)
+from app.services.metrics_service import metrics_service
+from app.services.context_service import context_assembler
+
+logger = logging.getLogger(__name__)
+
+# Ollama's `format`: "json", or a JSON schema the output must match
+ResponseFormat = Optional[Union[str, Dict[str, Any]]]
+
+class LLMUnavailableError(Exception):
+    """Raised when no backend could answer a request"""
+
+class CircuitBreaker:
+    """Stop sending requests to a backend after repeated failures.
+
+    closed: requests flow. open: after `failure_threshold` consecutive failures,
+    nothing is sent for `reset_timeout` seconds. half-open: then a single trial
+    request is let through; success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 reset_timeout: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def on_dispatch(self):
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def record_cancelled(self):
+        # A cancelled trial (e.g. a hedge that lost) says nothing about health; allow another
+        self.trial_in_flight = False
+
+class LLMBackend(abc.ABC):
+    """One model endpoint: its own connection pool, concurrency cap, latency window and breaker"""
+
+    kind = ""
+
+    def __init__(self, url: str, model: str, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 headers: Optional[Dict[str, str]] = None, latency_samples: int = 256):
+        self.url = url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.headers = headers
+        self.name = f"{self.kind}@{urlparse(url).netloc}"
+        self.breaker = CircuitBreaker()
+        # Requests queued on or running against this backend
+        self.outstanding = 0
+        self.latencies = deque(maxlen=latency_samples)
+        self.ewma_latency: Optional[float] = None
+        self.stats = {"requests": 0, "failures": 0, "cancelled": 0}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def connect(self):
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            )
+            timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            self._client = httpx.AsyncClient(limits=limits, timeout=timeout, headers=self.headers)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.outstanding >= self.max_concurrency
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def _record_latency(self, seconds: float):
+        self.latencies.append(seconds)
+        self.ewma_latency = seconds if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * seconds
+
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                       response_format: ResponseFormat = None) -> str:
+        """Generate a completion, keeping the load, latency and breaker bookkeeping"""
+        self.outstanding += 1
+        self.stats["requests"] += 1
+        self.breaker.on_dispatch()
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                text = await self._generate(prompt, system_prompt, response_format)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            self.breaker.record_cancelled()
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.outstanding -= 1
+        self.breaker.record_success()
+        self._record_latency(time.perf_counter() - started)
+        return text
+
+    async def stream(self, prompt: str, system_prompt: Optional[str] = None,
+                     response_format: ResponseFormat = None) -> AsyncIterator[str]:
+        """Stream a completion token by token, with the same bookkeeping as generate"""
+        self.outstanding += 1
+        self.stats["requests"] += 1
+        self.breaker.on_dispatch()
+        try:
+            async with self._semaphore:
+                async for token in self._stream(prompt, system_prompt, response_format):
+                    yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            self.stats["cancelled"] += 1
+            self.breaker.record_cancelled()
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.outstanding -= 1
+        self.breaker.record_success()
+
+    async def warm_up(self):
+        pass
+
+    @abc.abstractmethod
+    async def _generate(self, prompt: str, system_prompt: Optional[str], response_format: ResponseFormat) -> str:
+        """Send one completion request to the endpoint and return its text"""
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str],
+                      response_format: ResponseFormat) -> AsyncIterator[str]:
+        yield await self._generate(prompt, system_prompt, response_format)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            **self.stats,
+            "breaker_opens": self.breaker.opens,
+            "latency_p50": self.latency_quantile(0.5),
+            "latency_p95": self.latency_quantile(0.95),
+            "latency_ewma": self.ewma_latency
+        }
+
+class OllamaBackend(LLMBackend):
+    kind = "ollama"
+
+    def __init__(self, base_url: str, model: str = OLLAMA_MODEL, **kwargs):
+        super().__init__(f"{base_url.rstrip('/')}/api/generate", model, **kwargs)
+
+    def _payload(self, prompt: str, system_prompt: Optional[str], response_format: ResponseFormat,
+                 stream: bool) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        }
+        if system_prompt:
+            payload["system"] = system_prompt
+        if response_format:
+            payload["format"] = response_format
+        return payload
+
+    def _record_usage(self, result: Dict[str, Any]):
+        metrics_service.record_ollama_usage(result, self.name)
+        context_assembler.observe_prefill(result)
+
+    async def _generate(self, prompt: str, system_prompt: Optional[str], response_format: ResponseFormat) -> str:
+        payload = self._payload(prompt, system_prompt, response_format, False)
+        response = await self._client.post(self.url, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        self._record_usage(result)
+        return result.get("response", "")
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str],
+                      response_format: ResponseFormat) -> AsyncIterator[str]:
+        payload = self._payload(prompt, system_prompt, response_format, True)
+        async with self._client.stream("POST", self.url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if token:
+                    yield token
+                if chunk.get("done"):
+                    self._record_usage(chunk)
+                    break
+
+    async def warm_up(self):
+        """Have Ollama load the model now so the first request doesn't pay for it"""
+        # A generate request without a prompt only loads the model
+        response = await self._client.post(self.url, json={"model": self.model, "keep_alive": OLLAMA_KEEP_ALIVE})
+        response.raise_for_status()
+        logger.info(f"Ollama model '{self.model}' loaded on {self.name}")
+
+class HuggingFaceBackend(LLMBackend):
+    kind = "huggingface"
+
+    def __init__(self, model: str = HUGGINGFACE_MODEL, api_key: str = HUGGINGFACE_API_KEY, **kwargs):
+        super().__init__(
+            f"https://api-inference.huggingface.co/models/{model}", model,
+            headers={"Authorization": f"Bearer {api_key}"}, **kwargs
+        )
+
+    async def _generate(self, prompt: str, system_prompt: Optional[str], response_format: ResponseFormat) -> str:
+        # The inference API takes a bare prompt, has no token stream and can't constrain the output format
+        response = await self._client.post(self.url, json={"inputs": prompt})
+        response.raise_for_status()
+        result = response.json()
+
+        # Handle different response formats
+        if isinstance(result, list) and len(result) > 0:
+            if isinstance(result[0], dict) and "generated_text" in result[0]:
+                return result[0]["generated_text"]
+            return str(result[0])
+        return str(result)
+
+def parse_backend_specs(specs: str) -> List[Tuple[str, Optional[str]]]:
+    """Split an LLM_BACKENDS value into (kind, url) pairs, e.g. "ollama=http://gpu1:11434,huggingface" """
+    parsed = []
+    for spec in filter(None, (part.strip() for part in specs.split(","))):
+        kind, _, url = spec.partition("=")
+        kind = kind.strip().lower()
+        if kind not in ("ollama", "huggingface"):
+            raise ValueError(f"Unknown LLM backend '{kind}' in LLM_BACKENDS")
+        if kind == "ollama" and not url:
+            raise ValueError("Ollama backends need a base URL, e.g. ollama=http://localhost:11434")
+        parsed.append((kind, url.strip() or None))
+    return parsed
+
+def build_backend(kind: str, url: Optional[str], max_concurrency: int = LLM_MAX_CONCURRENCY) -> LLMBackend:
+    if kind == "ollama":
+        return OllamaBackend(url, max_concurrency=max_concurrency)
+    return HuggingFaceBackend(max_concurrency=max_concurrency)
+
+class LLMRouter:
+    """Spread LLM requests over a pool of backends.
+
+    Each request goes to the healthy backend with the fewest outstanding requests
+    ("least_outstanding") or the lowest expected wait, outstanding requests times
+    recent latency ("latency"). Backends whose circuit breaker is open are skipped,
+    and a failed request is retried on the next backend. With hedging on, a
+    generation still running after the backend's own p95 latency is also sent to
+    a second, non-saturated backend, and whichever answers first wins.
+    """
+
+    def __init__(self, backends: List[LLMBackend], balancing: str = LLM_BALANCING,
+                 hedge: bool = LLM_HEDGE_ENABLED, hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        if balancing not in ("least_outstanding", "latency"):
+            raise ValueError(f"Unknown LLM balancing strategy '{balancing}'")
+        self.backends = backends
+        self.balancing = balancing
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = {"requests": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "unavailable": 0}
+        # Rotates which backend wins ties, so an idle pool is used round-robin
+        self._turn = 0
+
+    async def connect(self):
+        await asyncio.gather(*(backend.connect() for backend in self.backends))
+
+    async def close(self):
+        await asyncio.gather(*(backend.close() for backend in self.backends))
+
+    async def warm_up(self):
+        """Warm every backend; fails only if none of them could be warmed"""
+        results = await asyncio.gather(*(backend.warm_up() for backend in self.backends), return_exceptions=True)
+        errors = [f"{backend.name}: {result}" for backend, result in zip(self.backends, results)
+                  if isinstance(result, Exception)]
+        if errors and len(errors) == len(self.backends):
+            raise LLMUnavailableError("; ".join(errors))
+        for error in errors:
+            logger.warning(f"LLM backend warm-up failed: {error}")
+
+    def _expected_wait(self, backend: LLMBackend) -> float:
+        if self.balancing == "least_outstanding":
+            return backend.outstanding
+        # Backends without a latency sample yet are treated as fast, so they get tried
+        return (backend.outstanding + 1) * (backend.ewma_latency or 0.0)
+
+    def pick(self, exclude: Iterable[LLMBackend] = (), idle_only: bool = False) -> Optional[LLMBackend]:
+        exclude = set(exclude)
+        candidates = [
+            backend for backend in self.backends
+            if backend not in exclude and backend.breaker.available() and not (idle_only and backend.saturated)
+        ]
+        if not candidates:
+            return None
+        self._turn += 1
+        count = len(self.backends)
+        return min(candidates, key=lambda backend: (
+            self._expected_wait(backend), backend.outstanding, (self.backends.index(backend) - self._turn) % count
+        ))
+
+    def _hedge_delay(self, backend: LLMBackend) -> Optional[float]:
+        if not self.hedge or len(backend.latencies) < self.hedge_min_samples:
+            return None
+        return max(backend.latency_quantile(0.95), self.hedge_min_delay)
+
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                       response_format: ResponseFormat = None) -> str:
+        self.stats["requests"] += 1
+        attempts: Dict[asyncio.Task, LLMBackend] = {}
+        tried: Set[LLMBackend] = set()
+        errors: List[str] = []
+        hedge_backend: Optional[LLMBackend] = None
+
+        def launch(idle_only: bool = False) -> Optional[LLMBackend]:
+            backend = self.pick(exclude=tried, idle_only=idle_only)
+            if backend is not None:
+                tried.add(backend)
+                attempts[asyncio.create_task(backend.generate(prompt, system_prompt, response_format))] = backend
+            return backend
+
+        primary = launch()
+        try:
+            while attempts:
+                # Only the first attempt is hedged, and only once
+                hedgeable = hedge_backend is None and list(attempts.values()) == [primary]
+                delay = self._hedge_delay(primary) if hedgeable else None
+                done, _ = await asyncio.wait(attempts, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_backend = launch(idle_only=True) or primary
+                    if hedge_backend is not primary:
+                        self.stats["hedges"] += 1
+                    continue
+
+                for task in done:
+                    backend = attempts.pop(task)
+                    if task.exception() is None:
+                        if backend is hedge_backend and backend is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    errors.append(f"{backend.name}: {task.exception()!r}")
+                    logger.warning(f"LLM backend {backend.name} failed: {task.exception()!r}")
+
+                if not attempts and launch() is not None:
+                    self.stats["failovers"] += 1
+        finally:
+            for task in attempts:
+                task.cancel()
+
+        self.stats["unavailable"] += 1
+        raise LLMUnavailableError("; ".join(errors) or "No healthy LLM backend")
+
+    async def stream(self, prompt: str, system_prompt: Optional[str] = None,
+                     response_format: ResponseFormat = None) -> AsyncIterator[str]:
+        """Stream from one backend, failing over only until the first token has been sent"""
+        self.stats["requests"] += 1
+        tried: Set[LLMBackend] = set()
+        errors: List[str] = []
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                self.stats["unavailable"] += 1
+                raise LLMUnavailableError("; ".join(errors) or "No healthy LLM backend")
+            if tried:
+                self.stats["failovers"] += 1
+            tried.add(backend)
+
+            started = False
+            tokens = backend.stream(prompt, system_prompt, response_format)
+            try:
+                async for token in tokens:
+                    started = True
+                    yield token
+                return
+            except Exception as e:
+                # Tokens already sent can't be taken back, so a stream never switches backends midway
+                if started:
+                    raise
+                errors.append(f"{backend.name}: {e!r}")
+                logger.warning(f"LLM backend {backend.name} failed: {e!r}")
+            finally:
+                # Release the backend straight away if the client stops reading
+                await tokens.aclose()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "balancing": self.balancing,
+            "hedging": self.hedge,
+            **self.stats,
+            "backends": [backend.get_status() for backend in self.backends]
+        }
@@ -1,84 +1,222 @@
-import httpx
-import json
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
-from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL, HUGGINGFACE_API_KEY, HUGGINGFACE_MODEL
+from typing import Dict, Any, List, NamedTuple, Optional, AsyncIterator, Awaitable, Callable, Tuple
+from app.config import (
+    LLM_BACKENDS, LLM_MAX_CONCURRENCY, LLM_SINGLE_FLIGHT, LLM_PARSE_RETRY, BATCH_DIAGNOSIS_CONCURRENCY
+)
+from app.models.diagnosis import Diagnosis, RepairGuide
 from app.services.vector_db_service import vector_db_service
+from app.services.cache_service import diagnosis_cache, SingleFlight
+from app.services.metrics_service import metrics_service
+from app.services.context_service import context_assembler, estimate_tokens
+from app.services.llm_router_service import (
+    LLMRouter, LLMUnavailableError, ResponseFormat, build_backend, parse_backend_specs
+)
+from app.services.structured_output_service import StructuredOutput, JSONScanner
 
 logger = logging.getLogger(__name__)
 
+# Appended to the prompt for the one regeneration after an unusable response
+RETRY_INSTRUCTION = "\n\nYour previous reply was not valid JSON. Reply with only the complete JSON object."
+
+class StructuredResult(NamedTuple):
+    """A structured generation: the validated value or None, and the raw response (or the error)"""
+    value: Optional[Dict[str, Any]]
+    response: str
+    # Every backend failed, during generation or midway through a stream
+    failed: bool = False
+    # The value was recovered from malformed or cut-off output; fine to show, not to cache
+    repaired: bool = False
+
+    @property
+    def complete(self) -> bool:
+        """Validated without repair, so fit to cache or store for reuse"""
+        return self.value is not None and not self.repaired
+
 class LLMService:
-    def __init__(self, use_ollama: bool = True):
-        self.use_ollama = use_ollama
-        self.ollama_url = f"{OLLAMA_BASE_URL}/api/generate"
-        self.ollama_model = OLLAMA_MODEL
-        self.huggingface_api_key = HUGGINGFACE_API_KEY
-        self.huggingface_model = HUGGINGFACE_MODEL
-        
-    async def generate_response(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Generate a response from the LLM"""
-        if self.use_ollama:
-            return await self._generate_with_ollama(prompt, system_prompt)
-        else:
-            return await self._generate_with_huggingface(prompt)
-            
-    async def _generate_with_ollama(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Generate text using Ollama"""
+    def __init__(self, backends: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, single_flight: bool = LLM_SINGLE_FLIGHT,
+                 parse_retry: bool = LLM_PARSE_RETRY):
+        # (kind, url) pairs, e.g. [("ollama", "http://gpu1:11434"), ("huggingface", None)]
+        self.backend_specs = backends if backends is not None else parse_backend_specs(LLM_BACKENDS)
+        # Per backend, so every model server gets its own cap
+        self.max_concurrency = max_concurrency
+        self.router: Optional[LLMRouter] = None
+        self.single_flight = single_flight
+        # One group per operation (diagnosis, repair_guide, ...), so coalescing is reported per operation
+        self._flights: Dict[str, SingleFlight] = {}
+        self.parse_retry = parse_retry
+        self.diagnosis_output = StructuredOutput(Diagnosis, "diagnosis")
+        self.repair_guide_output = StructuredOutput(RepairGuide, "repair_guide")
+
+    async def connect(self):
+        """Build the backend pool; each backend opens its own pooled HTTP client"""
+        if self.router is None:
+            self.router = LLMRouter([build_backend(kind, url, self.max_concurrency) for kind, url in self.backend_specs])
+        await self.router.connect()
+        logger.info(
+            f"LLM router ready with {len(self.router.backends)} backend(s): "
+            f"{', '.join(backend.name for backend in self.router.backends)} "
+            f"(max in-flight requests per backend: {self.max_concurrency})"
+        )
+
+    async def close(self):
+        if self.router is not None:
+            await self.router.close()
+            self.router = None
+        logger.info("Closed LLM clients")
+
+    async def warm_up(self):
+        """Have every backend load its model now so the first diagnosis doesn't pay for it"""
+        router = await self._get_router()
+        await router.warm_up()
+
+    async def _get_router(self) -> LLMRouter:
+        # Fall back to lazy creation so the service still works outside the app lifespan
+        if self.router is None:
+            await self.connect()
+        return self.router
+
+    async def generate_response(self, prompt: str, system_prompt: Optional[str] = None,
+                                operation: str = "generate", response_format: ResponseFormat = None) -> str:
+        """Generate a response from the LLM; concurrent calls with the same prompt share one generation.
+
+        A failure on every backend comes back as "Error: ..." text.
+        """
+        async def generate():
+            try:
+                return await self._generate(prompt, system_prompt, response_format)
+            except LLMUnavailableError as e:
+                return f"Error: {str(e)}"
+        return await self._coalesce(operation, prompt, system_prompt, generate)
+
+    async def generate_structured(self, output: StructuredOutput, prompt: str,
+                                  system_prompt: Optional[str] = None) -> StructuredResult:
+        """Generate, parse and validate a structured output.
+
+        Generation is constrained to the output's schema where the backend
+        supports it, and concurrent identical calls share the generation and
+        the parse, including any retry.
+        """
+        async def generate():
+            try:
+                response = await self._generate(prompt, system_prompt, output.format)
+            except LLMUnavailableError as e:
+                return StructuredResult(None, f"Error: {str(e)}", failed=True)
+            return await self._parse_or_retry(output, response, prompt, system_prompt)
+        return await self._coalesce(output.operation, prompt, system_prompt, generate)
+
+    async def _coalesce(self, operation: str, prompt: str, system_prompt: Optional[str],
+                        func: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.single_flight:
+            return await func()
+        flight = self._flights.get(operation)
+        if flight is None:
+            flight = self._flights[operation] = SingleFlight(operation)
+        key = (_normalize_prompt(system_prompt or ""), _normalize_prompt(prompt))
+        return await flight.do(key, func)
+
+    async def _parse_or_retry(self, output: StructuredOutput, response: str, prompt: str,
+                              system_prompt: Optional[str],
+                              scanner: Optional[JSONScanner] = None) -> StructuredResult:
+        parsed, repaired = output.parse(response, scanner)
+        if parsed is not None or not self.parse_retry:
+            return StructuredResult(parsed, response, repaired=repaired)
+
+        # One retry, and only when a real answer was unusable even after repair
+        output.record_retry()
         try:
-            payload = {
-                "model": self.ollama_model,
-                "prompt": prompt,
-                "stream": False
-            }
-            
-            if system_prompt:
-                payload["system"] = system_prompt
-                
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.ollama_url, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                return result.get("response", "")
-                
-        except Exception as e:
-            logger.error(f"Error generating text with Ollama: {e}")
-            return f"Error: {str(e)}"
-            
-    async def _generate_with_huggingface(self, prompt: str) -> str:
-        """Generate text using Hugging Face API"""
+            response = await self._generate(prompt + RETRY_INSTRUCTION, system_prompt, output.format)
+        except LLMUnavailableError as e:
+            return StructuredResult(None, f"Error: {str(e)}", failed=True)
+        parsed, repaired = output.parse(response)
+        return StructuredResult(parsed, response, repaired=repaired)
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        return {operation: flight.get_stats() for operation, flight in self._flights.items()}
+
+    def get_structured_output_stats(self) -> Dict[str, Any]:
+        return {output.operation: output.get_stats() for output in (self.diagnosis_output, self.repair_guide_output)}
+
+    async def _generate(self, prompt: str, system_prompt: Optional[str] = None,
+                        response_format: ResponseFormat = None) -> str:
+        """Generate on whichever backend the router picks; raises LLMUnavailableError if none could answer"""
+        router = await self._get_router()
         try:
-            url = f"https://api-inference.huggingface.co/models/{self.huggingface_model}"
-            headers = {"Authorization": f"Bearer {self.huggingface_api_key}"}
-            payload = {"inputs": prompt}
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Handle different response formats
-                if isinstance(result, list) and len(result) > 0:
-                    if isinstance(result[0], dict) and "generated_text" in result[0]:
-                        return result[0]["generated_text"]
-                    return str(result[0])
-                return str(result)
-                
+            with metrics_service.span("llm.generate"):
+                return await router.generate(prompt, system_prompt, response_format)
+        except LLMUnavailableError as e:
+            logger.error(f"Error generating text: {e}")
+            raise
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str] = None,
+                      response_format: ResponseFormat = None) -> AsyncIterator[str]:
+        """Stream from whichever backend the router picks; raises LLMUnavailableError if the stream fails"""
+        router = await self._get_router()
+        try:
+            with metrics_service.span("llm.stream"):
+                async for token in router.stream(prompt, system_prompt, response_format):
+                    yield token
         except Exception as e:
-            logger.error(f"Error generating text with Hugging Face: {e}")
-            return f"Error: {str(e)}"
-            
-    async def diagnose_vehicle_issue(self, vehicle_info: Dict[str, Any], issue_description: str) -> Dict[str, Any]:
-        """Diagnose a vehicle issue using LLM and vector database"""
-        # Get relevant knowledge from vector DB
-        relevant_info = vector_db_service.query_collection(
+            # Includes a backend dropping out midway, after some tokens were already sent
+            logger.error(f"Error streaming text: {e}")
+            if isinstance(e, LLMUnavailableError):
+                raise
+            raise LLMUnavailableError(str(e)) from e
+
+    async def stream_response(self, prompt: str, system_prompt: Optional[str] = None,
+                              response_format: ResponseFormat = None) -> AsyncIterator[str]:
+        """Stream a response from the LLM token by token; a failure ends it with an "Error: ..." token"""
+        try:
+            async for token in self._stream(prompt, system_prompt, response_format):
+                yield token
+        except LLMUnavailableError as e:
+            yield f"Error: {str(e)}"
+
+    # Diagnosis methods
+    @metrics_service.timed("diagnosis_cache.lookup")
+    async def _lookup_cached_diagnosis(self, vehicle_info: Dict[str, Any], issue_description: str):
+        """Check both cache tiers, returning (diagnosis, cache_key, query_embedding)"""
+        cache_key = diagnosis_cache.make_key(vehicle_info, issue_description)
+        diagnosis = diagnosis_cache.get(cache_key)
+        if diagnosis is not None:
+            return diagnosis, cache_key, None
+
+        # The query embedding is reused for the similarity tier and the vector search
+        query_embedding = (await vector_db_service.aembed_texts([self._diagnosis_query_text(vehicle_info, issue_description)]))[0]
+        diagnosis = diagnosis_cache.get_similar(diagnosis_cache.vehicle_key(vehicle_info), query_embedding)
+        if diagnosis is None:
+            diagnosis_cache.record_miss()
+        return diagnosis, cache_key, query_embedding
+
+    def _cache_diagnosis(self, cache_key: str, vehicle_info: Dict[str, Any],
+                         result: StructuredResult, query_embedding: List[float]):
+        # Never cache fallbacks or repaired output, otherwise one bad generation would be served for the whole TTL
+        if not result.complete:
+            return
+        diagnosis_cache.set(cache_key, diagnosis_cache.vehicle_key(vehicle_info), result.value, query_embedding)
+
+    def _diagnosis_query_text(self, vehicle_info: Dict[str, Any], issue_description: str) -> str:
+        return f"{vehicle_info['make']} {vehicle_info['model']} {issue_description}"
+
+    async def _build_diagnosis_prompt(self, vehicle_info: Dict[str, Any], issue_description: str,
+                                      query_embedding: Optional[List[float]] = None):
+        """Build the diagnosis prompt with context from the vector database"""
+        # Fetch a wide candidate set; the context assembler narrows it to the token budget
+        relevant_info = await vector_db_service.aquery_collection(
             "automotive_knowledge", 
-            f"{vehicle_info['make']} {vehicle_info['model']} {issue_description}"
+            self._diagnosis_query_text(vehicle_info, issue_description),
+            n_results=context_assembler.candidates,
+            query_embedding=query_embedding,
+            include=context_assembler.QUERY_INCLUDE
         )
-        
-        # Construct context from relevant information
-        context = ""
-        if relevant_info and "documents" in relevant_info and len(relevant_info["documents"]) > 0:
-            context = "\n".join(relevant_info["documents"][0])
+        return self._format_diagnosis_prompt(vehicle_info, issue_description, relevant_info, query_embedding)
+
+    @metrics_service.timed("prompt.diagnosis")
+    def _format_diagnosis_prompt(self, vehicle_info: Dict[str, Any], issue_description: str, relevant_info,
+                                 query_embedding: Optional[List[float]] = None):
+        # Rerank, deduplicate and pack the retrieved chunks into the context budget
+        context, context_report = context_assembler.assemble(relevant_info, query_embedding)
         
         # Construct prompt with vehicle info, issue description, and context
         system_prompt = """You are an automotive diagnostic expert. 
@@ -106,37 +244,195 @@ class LLMService:
         - diagnostic_codes: list of potential OBD-II codes (if applicable)
         - explanation: detailed explanation of the diagnosis
         """
+        context_assembler.record(context_report, estimate_tokens(system_prompt) + estimate_tokens(prompt))
+        return prompt, system_prompt
+
+    def _diagnosis_or_fallback(self, diagnosis: Optional[Dict[str, Any]], response: str) -> Dict[str, Any]:
+        """The parsed diagnosis, or a placeholder carrying the raw response when there is none"""
+        if diagnosis is not None:
+            return diagnosis
+        return {
+            "likely_causes": ["Unable to parse diagnosis"],
+            "severity": "unknown",
+            "recommended_actions": ["Consult a professional mechanic"],
+            "diagnostic_codes": [],
+            "explanation": response
+        }
+
+    async def diagnose_vehicle_issue(self, vehicle_info: Dict[str, Any], issue_description: str) -> Dict[str, Any]:
+        """Diagnose a vehicle issue using LLM and vector database"""
+        diagnosis, cache_key, query_embedding = await self._lookup_cached_diagnosis(vehicle_info, issue_description)
+        if diagnosis is not None:
+            return diagnosis
+
+        prompt, system_prompt = await self._build_diagnosis_prompt(vehicle_info, issue_description, query_embedding)
         
         # Generate diagnosis
-        response = await self.generate_response(prompt, system_prompt)
-        
-        # Extract JSON from response
+        result = await self.generate_structured(self.diagnosis_output, prompt, system_prompt)
+        self._cache_diagnosis(cache_key, vehicle_info, result, query_embedding)
+        return self._diagnosis_or_fallback(result.value, result.response)
+
+    async def stream_diagnose_vehicle_issue(self, vehicle_info: Dict[str, Any],
+                                            issue_description: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream diagnosis tokens, followed by the parsed diagnosis as the final event"""
+        diagnosis, cache_key, query_embedding = await self._lookup_cached_diagnosis(vehicle_info, issue_description)
+        if diagnosis is not None:
+            yield {"event": "diagnosis", "data": diagnosis}
+            return
+
+        prompt, system_prompt = await self._build_diagnosis_prompt(vehicle_info, issue_description, query_embedding)
+
+        # The scanner follows the JSON as it streams, so parsing at the end doesn't rescan it
+        tokens, scanner = [], self.diagnosis_output.scanner()
         try:
-            # Find JSON in the response (it might be surrounded by text)
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                diagnosis = json.loads(json_str)
-                return diagnosis
+            async for token in self._stream(prompt, system_prompt, self.diagnosis_output.format):
+                tokens.append(token)
+                scanner.feed(token)
+                yield {"event": "token", "data": token}
+        except LLMUnavailableError as e:
+            # What streamed before the failure is an unfinished answer, not a truncated one to repair
+            result = StructuredResult(None, f"Error: {str(e)}", failed=True)
+        else:
+            result = await self._parse_or_retry(self.diagnosis_output, "".join(tokens), prompt,
+                                                system_prompt, scanner)
+        self._cache_diagnosis(cache_key, vehicle_info, result, query_embedding)
+        yield {"event": "diagnosis", "data": self._diagnosis_or_fallback(result.value, result.response)}
+
+    async def diagnose_vehicle_issues_batch(self, requests: List[Tuple[Dict[str, Any], str]],
+                                            max_parallel: int = BATCH_DIAGNOSIS_CONCURRENCY
+                                            ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Diagnose many (vehicle_info, issue_description) pairs, yielding (index, diagnosis) as each completes.
+
+        Cache hits are returned first; the remaining queries are embedded and
+        searched in one batched call each, then generated with at most
+        max_parallel LLM calls in flight for this batch.
+        """
+        pending = []
+        for index, (vehicle_info, issue_description) in enumerate(requests):
+            cache_key = diagnosis_cache.make_key(vehicle_info, issue_description)
+            diagnosis = diagnosis_cache.get(cache_key)
+            if diagnosis is not None:
+                yield index, diagnosis
+            else:
+                pending.append((index, vehicle_info, issue_description, cache_key))
+        if not pending:
+            return
+
+        embeddings = await vector_db_service.aembed_texts(
+            [self._diagnosis_query_text(vehicle_info, issue) for _, vehicle_info, issue, _ in pending]
+        )
+        misses = []
+        for item, embedding in zip(pending, embeddings):
+            diagnosis = diagnosis_cache.get_similar(diagnosis_cache.vehicle_key(item[1]), embedding)
+            if diagnosis is not None:
+                yield item[0], diagnosis
             else:
-                # If no JSON found, create a structured response
-                return {
-                    "likely_causes": ["Unable to parse diagnosis"],
-                    "severity": "unknown",
-                    "recommended_actions": ["Consult a professional mechanic"],
-                    "diagnostic_codes": [],
-                    "explanation": response
-                }
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse JSON from LLM response: {response}")
-            return {
-                "likely_causes": ["Unable to parse diagnosis"],
-                "severity": "unknown",
-                "recommended_actions": ["Consult a professional mechanic"],
-                "diagnostic_codes": [],
-                "explanation": response
-            }
+                diagnosis_cache.record_miss()
+                misses.append((*item, embedding))
+        if not misses:
+            return
+
+        relevant_infos = await vector_db_service.aquery_collection_batch(
+            "automotive_knowledge",
+            n_results=context_assembler.candidates,
+            query_embeddings=[miss[4] for miss in misses],
+            include=context_assembler.QUERY_INCLUDE
+        )
+
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def generate(miss, relevant_info):
+            index, vehicle_info, issue_description, cache_key, embedding = miss
+            prompt, system_prompt = self._format_diagnosis_prompt(vehicle_info, issue_description, relevant_info,
+                                                                  embedding)
+            async with semaphore:
+                result = await self.generate_structured(self.diagnosis_output, prompt, system_prompt)
+            self._cache_diagnosis(cache_key, vehicle_info, result, embedding)
+            return index, self._diagnosis_or_fallback(result.value, result.response)
+
+        tasks = [asyncio.ensure_future(generate(miss, info)) for miss, info in zip(misses, relevant_infos)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop outstanding generations if the consumer goes away
+            for task in tasks:
+                task.cancel()
+
+    # Repair guide methods
+    @metrics_service.timed("prompt.repair_guide")
+    def _build_repair_guide_prompt(self, vehicle_info: Dict[str, Any], issue_description: str,
+                                   diagnostic_codes: List[str]):
+        """Build the repair guide prompt for a diagnosed issue"""
+        system_prompt = """You are an automotive repair expert. 
+        Create a detailed step-by-step repair guide for the given vehicle issue.
+        Include safety precautions, tools needed, and estimated time for each step."""
+        
+        prompt = f"""
+        Vehicle Information:
+        - Make: {vehicle_info['make']}
+        - Model: {vehicle_info['model']}
+        - Year: {vehicle_info['year']}
+        
+        Issue Description:
+        {issue_description}
+        
+        Diagnostic Codes:
+        {', '.join(diagnostic_codes) if diagnostic_codes else 'None'}
+        
+        Create a detailed repair guide with the following sections:
+        1. Safety Precautions
+        2. Tools Required
+        3. Parts Required (if applicable)
+        4. Step-by-Step Instructions
+        5. Estimated Time
+        6. Tips and Warnings
+        
+        Format the response in JSON with these sections as keys.
+        """
+        return prompt, system_prompt
+
+    async def get_repair_guide(self, vehicle_info: Dict[str, Any], issue_description: str,
+                               diagnostic_codes: List[str]) -> Tuple[Dict[str, Any], bool]:
+        """Generate a step-by-step repair guide for a vehicle issue.
+
+        Returns the guide (the raw response if no usable JSON came back) and
+        whether it is complete, i.e. validated without repair and fit to store.
+        """
+        prompt, system_prompt = self._build_repair_guide_prompt(vehicle_info, issue_description, diagnostic_codes)
+        result = await self.generate_structured(self.repair_guide_output, prompt, system_prompt)
+        return self._repair_guide_or_raw(result), result.complete
+
+    async def stream_repair_guide(self, vehicle_info: Dict[str, Any], issue_description: str,
+                                  diagnostic_codes: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Stream repair guide tokens, followed by the parsed guide as the final event (with its complete flag)"""
+        prompt, system_prompt = self._build_repair_guide_prompt(vehicle_info, issue_description, diagnostic_codes)
+
+        tokens, scanner = [], self.repair_guide_output.scanner()
+        try:
+            async for token in self._stream(prompt, system_prompt, self.repair_guide_output.format):
+                tokens.append(token)
+                scanner.feed(token)
+                yield {"event": "token", "data": token}
+        except LLMUnavailableError as e:
+            result = StructuredResult(None, f"Error: {str(e)}", failed=True)
+        else:
+            result = await self._parse_or_retry(self.repair_guide_output, "".join(tokens), prompt,
+                                                system_prompt, scanner)
+        yield {"event": "repair_guide", "data": self._repair_guide_or_raw(result), "complete": result.complete}
+
+    def _repair_guide_or_raw(self, result: StructuredResult) -> Dict[str, Any]:
+        """The parsed guide, or the raw response when no usable JSON came back; failed marks a backend failure"""
+        if result.value is not None:
+            return result.value
+        guide = {"raw_guide": result.response}
+        if result.failed:
+            guide["failed"] = True
+        return guide
+
+def _normalize_prompt(text: str) -> str:
+    # Prompts are built from indented templates, so only whitespace differences are ignored
+    return " ".join(text.split())
 
 # Create a singleton instance
-llm_service = LLMService(use_ollama=True)  # Set to False to use Hugging Face
\ No newline at end of file
+llm_service = LLMService()  # Backends come from LLM_BACKENDS
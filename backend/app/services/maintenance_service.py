@@ -0,0 +1,299 @@
+import asyncio
+import time
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import (
+    MAINTENANCE_CHUNK_SIZE, MAINTENANCE_LOOKBACK_DAYS, MAINTENANCE_HALF_LIFE_DAYS, MAINTENANCE_SCORING_INTERVAL
+)
+from app.services.db_service import mongodb_service
+from app.services.dtc_service import dtc_engine, normalize_code
+from app.services.metrics_service import metrics_service
+
+logger = logging.getLogger(__name__)
+
+# Subsystems scored, in column order
+SUBSYSTEMS = ("engine", "fuel_emissions", "cooling", "transmission", "electrical", "brakes_chassis", "body")
+SUBSYSTEM_INDEX = {subsystem: index for index, subsystem in enumerate(SUBSYSTEMS)}
+
+# DTC knowledge engine fault groups, by subsystem
+GROUP_SUBSYSTEMS = {
+    "misfire": "engine", "ignition": "engine", "engine_position": "engine", "idle_control": "engine",
+    "idle_speed": "engine", "lubrication": "engine", "throttle": "engine", "powertrain": "engine",
+    "fuel_trim": "fuel_emissions", "air_metering": "fuel_emissions", "oxygen_sensor": "fuel_emissions",
+    "evap": "fuel_emissions", "catalyst": "fuel_emissions", "fuel_air": "fuel_emissions", "egr": "fuel_emissions",
+    "emissions": "fuel_emissions",
+    "cooling": "cooling",
+    "transmission": "transmission", "vehicle_speed": "transmission",
+    "charging": "electrical", "control_module": "electrical", "network": "electrical",
+    "abs": "brakes_chassis", "chassis": "brakes_chassis",
+    "airbag": "body", "body": "body"
+}
+# For codes the engine doesn't know at all, by the code's first letter
+LETTER_SUBSYSTEMS = {"P": "engine", "B": "body", "C": "brakes_chassis", "U": "electrical"}
+
+SEVERITY_WEIGHTS = {"low": 0.5, "medium": 1.0, "high": 2.0, "critical": 3.0}
+
+# Shared feature columns
+FEATURES = ("mileage_100k", "age_decades", "service_overdue_years", "issue_history")
+TYPICAL_MILES_PER_YEAR = 12000
+# Overdue years assumed when a vehicle has no service date on record
+UNKNOWN_SERVICE_OVERDUE = 1.0
+
+# Hand-set priors, not fitted: intercept, one weight per FEATURES column, then the weight of the
+# subsystem's own decayed issue history. Logits are for a failure within HORIZON_DAYS.
+HORIZON_DAYS = 90
+MODEL_VERSION = "priors-1"
+SUBSYSTEM_PRIORS = {
+    "engine":         (-4.1, 0.6, 0.3, 0.5, 0.3, 1.2),
+    "fuel_emissions": (-3.9, 0.5, 0.3, 0.3, 0.3, 1.2),
+    "cooling":        (-4.6, 0.5, 0.4, 0.4, 0.2, 1.3),
+    "transmission":   (-4.9, 0.7, 0.3, 0.4, 0.2, 1.3),
+    "electrical":     (-4.3, 0.3, 0.4, 0.1, 0.3, 1.1),
+    "brakes_chassis": (-4.2, 0.6, 0.2, 0.5, 0.2, 1.2),
+    "body":           (-5.2, 0.1, 0.3, 0.0, 0.2, 1.0)
+}
+
+class RiskModel:
+    """Logistic risk per subsystem, scored for a whole chunk of vehicles with one matrix product.
+
+    logit[v, s] = intercept[s] + features[v] @ weights[:, s] + history_weight[s] * log1p(history[v, s])
+    """
+
+    def __init__(self, priors: Dict[str, Tuple[float, ...]] = SUBSYSTEM_PRIORS, version: str = MODEL_VERSION):
+        table = np.array([priors[subsystem] for subsystem in SUBSYSTEMS], dtype=np.float64)
+        self.intercepts = table[:, 0]
+        self.weights = table[:, 1:1 + len(FEATURES)].T
+        self.history_weights = table[:, 1 + len(FEATURES)]
+        self.version = version
+
+    def score(self, features: np.ndarray, history: np.ndarray) -> np.ndarray:
+        """Probabilities of shape (vehicles, subsystems) from features (vehicles, FEATURES) and history"""
+        logits = self.intercepts + features @ self.weights + self.history_weights * np.log1p(history)
+        return 1.0 / (1.0 + np.exp(-logits))
+
+@lru_cache(maxsize=4096)
+def subsystem_of(code: str) -> Optional[str]:
+    """Subsystem a diagnostic code belongs to, via its DTC group, or None for malformed codes"""
+    code = normalize_code(code)
+    if code is None:
+        return None
+    entry = dtc_engine.lookup(code)
+    subsystem = GROUP_SUBSYSTEMS.get(entry["group"]) if entry else None
+    return subsystem or LETTER_SUBSYSTEMS[code[0]]
+
+class MaintenanceService:
+    """Predictive maintenance scores for every vehicle, computed in batches and stored for instant reads.
+
+    A scoring run streams vehicles from one Motor cursor in chunks, loads each
+    chunk's recent issues with a single $in query, builds feature arrays
+    (mileage, age, time since service, issue history decayed by age and
+    weighted by severity, per subsystem) and scores the chunk with NumPy. The
+    chunk's scores are written while the next chunk is read. Reads then come
+    from maintenance_scores, so fleet views never wait on a model.
+    """
+
+    def __init__(self, chunk_size: int = MAINTENANCE_CHUNK_SIZE, lookback_days: int = MAINTENANCE_LOOKBACK_DAYS,
+                 half_life_days: float = MAINTENANCE_HALF_LIFE_DAYS, interval: float = MAINTENANCE_SCORING_INTERVAL,
+                 model: Optional[RiskModel] = None):
+        self.chunk_size = chunk_size
+        self.lookback_days = lookback_days
+        self.half_life_days = half_life_days
+        self.interval = interval
+        self.model = model or RiskModel()
+        self.stats = {"runs": 0, "vehicles_scored": 0, "on_demand": 0, "last_run": None}
+        self._run_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._schedule())
+            logger.info(f"Maintenance scoring scheduled every {self.interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule(self):
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Maintenance scoring run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def build_features(self, vehicles: List[Dict[str, Any]], issues: List[Dict[str, Any]],
+                       now: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """Feature matrix (vehicles, FEATURES) and per-subsystem decayed issue history (vehicles, SUBSYSTEMS)"""
+        count = len(vehicles)
+        index = {str(vehicle["_id"]): row for row, vehicle in enumerate(vehicles)}
+        years = np.array([vehicle.get("year") or now.year for vehicle in vehicles], dtype=np.float64)
+        mileage = np.array([np.nan if vehicle.get("mileage") is None else vehicle["mileage"] for vehicle in vehicles],
+                           dtype=np.float64)
+        service_days = np.array([
+            np.nan if vehicle.get("last_service_date") is None else (now - vehicle["last_service_date"]).days
+            for vehicle in vehicles
+        ], dtype=np.float64)
+
+        age = np.clip(now.year - years, 0, 40)
+        # Vehicles without a reading are assumed to have typical mileage for their age
+        mileage = np.where(np.isnan(mileage), age * TYPICAL_MILES_PER_YEAR, mileage)
+        overdue = np.where(np.isnan(service_days), UNKNOWN_SERVICE_OVERDUE,
+                           np.maximum(service_days - 365, 0) / 365)
+
+        # One row per issue, and one per (issue, subsystem) its codes touch
+        issue_rows, severities, ages = [], [], []
+        subsystem_rows, subsystem_columns, subsystem_issues = [], [], []
+        for issue in issues:
+            row = index.get(issue["vehicle_id"])
+            if row is None:
+                continue
+            position = len(issue_rows)
+            issue_rows.append(row)
+            severities.append(SEVERITY_WEIGHTS.get(issue.get("severity"), 1.0))
+            ages.append((now - issue["created_at"]).total_seconds() / 86400)
+            for subsystem in {subsystem_of(code) for code in issue.get("diagnostic_codes") or []} - {None}:
+                subsystem_rows.append(row)
+                subsystem_columns.append(SUBSYSTEM_INDEX[subsystem])
+                subsystem_issues.append(position)
+
+        # Severity weight halves every half_life_days of issue age
+        weights = np.asarray(severities) * np.exp2(-np.maximum(np.asarray(ages), 0) / self.half_life_days)
+        general = np.bincount(np.asarray(issue_rows, dtype=np.int64), weights, minlength=count)
+        flat = np.asarray(subsystem_rows, dtype=np.int64) * len(SUBSYSTEMS) + np.asarray(subsystem_columns, dtype=np.int64)
+        history = np.bincount(flat, weights[np.asarray(subsystem_issues, dtype=np.int64)],
+                              minlength=count * len(SUBSYSTEMS)).reshape(count, len(SUBSYSTEMS))
+
+        features = np.column_stack([mileage / 100000, age / 10, overdue, np.log1p(general)])
+        return features, history
+
+    def score_vehicles(self, vehicles: List[Dict[str, Any]], issues: List[Dict[str, Any]],
+                       now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Score documents for a chunk of vehicles, ready to store"""
+        if not vehicles:
+            return []
+        now = now or datetime.now()
+        features, history = self.build_features(vehicles, issues, now)
+        probabilities = self.model.score(features, history)
+        overall = 1.0 - np.prod(1.0 - probabilities, axis=1)
+        top = np.argsort(-probabilities, axis=1)[:, :3]
+
+        rounded = np.round(probabilities, 4).tolist()
+        overall = np.round(overall, 4).tolist()
+        return [
+            {
+                "_id": str(vehicle["_id"]),
+                "user_id": vehicle.get("user_id"),
+                "scores": dict(zip(SUBSYSTEMS, rounded[row])),
+                "overall": overall[row],
+                "top_risks": [SUBSYSTEMS[column] for column in top[row]],
+                "horizon_days": HORIZON_DAYS,
+                "model_version": self.model.version,
+                "scored_at": now
+            }
+            for row, vehicle in enumerate(vehicles)
+        ]
+
+    async def run(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Score every vehicle (or every vehicle of one user) and store the results"""
+        async with self._run_lock:
+            # Codes merged into the DTC engine since the last run may map to a different group
+            subsystem_of.cache_clear()
+            started = time.perf_counter()
+            now = datetime.now()
+            since = now - timedelta(days=self.lookback_days)
+            vehicles = issues = 0
+            score_seconds = 0.0
+            pending_write: Optional[asyncio.Task] = None
+            try:
+                async for chunk in mongodb_service.iter_vehicles_for_scoring(self.chunk_size, user_id):
+                    chunk_issues = await mongodb_service.get_issues_since([str(v["_id"]) for v in chunk], since)
+                    with metrics_service.span("maintenance.score_chunk"):
+                        scoring_started = time.perf_counter()
+                        scores = self.score_vehicles(chunk, chunk_issues, now)
+                        score_seconds += time.perf_counter() - scoring_started
+                    # Write this chunk while the next one is read
+                    if pending_write is not None:
+                        await pending_write
+                    pending_write = asyncio.create_task(mongodb_service.save_maintenance_scores(scores))
+                    vehicles += len(chunk)
+                    issues += len(chunk_issues)
+                if pending_write is not None:
+                    await pending_write
+            finally:
+                if pending_write is not None and not pending_write.done():
+                    pending_write.cancel()
+
+            elapsed = time.perf_counter() - started
+            report = {
+                "vehicles": vehicles,
+                "issues": issues,
+                "seconds": round(elapsed, 3),
+                "vehicles_per_second": round(vehicles / elapsed, 1) if elapsed else None,
+                "scoring_vehicles_per_second": round(vehicles / score_seconds, 1) if score_seconds else None,
+                "finished_at": datetime.now()
+            }
+            self.stats["runs"] += 1
+            self.stats["vehicles_scored"] += vehicles
+            if user_id is None:
+                self.stats["last_run"] = report
+            logger.info(f"Scored {vehicles} vehicles ({issues} issues) in {elapsed:.2f}s")
+            return report
+
+    async def get_vehicle_scores(self, vehicle_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Stored scores for a vehicle, scoring it on the spot if it has none yet (or refresh is set)"""
+        scores = None if refresh else await mongodb_service.get_maintenance_scores(vehicle_id)
+        if scores is None:
+            scored = await self._score_now([vehicle_id])
+            if not scored:
+                return None
+            scores = scored[0]
+        return _public(scores)
+
+    async def get_fleet_scores(self, user_id: str, vehicle_ids: List[str]) -> List[Dict[str, Any]]:
+        """Stored scores of a user's vehicles, riskiest first; vehicles never scored are scored first"""
+        vehicle_ids = set(vehicle_ids)
+        # Scores of deleted vehicles may still be stored, so match by id rather than by count
+        scores = [score for score in await mongodb_service.get_maintenance_scores_by_user(user_id)
+                  if score["_id"] in vehicle_ids]
+        missing = vehicle_ids - {score["_id"] for score in scores}
+        if missing:
+            scores += await self._score_now(list(missing))
+            scores.sort(key=lambda score: score["overall"], reverse=True)
+        return [_public(score) for score in scores]
+
+    async def _score_now(self, vehicle_ids: List[str]) -> List[Dict[str, Any]]:
+        # Request-time scoring of a few vehicles; it doesn't wait on the run lock, which a fleet run holds throughout
+        vehicles = await mongodb_service.get_vehicles_for_scoring(vehicle_ids)
+        if not vehicles:
+            return []
+        since = datetime.now() - timedelta(days=self.lookback_days)
+        issues = await mongodb_service.get_issues_since([str(vehicle["_id"]) for vehicle in vehicles], since)
+        scores = self.score_vehicles(vehicles, issues)
+        await mongodb_service.save_maintenance_scores(scores)
+        self.stats["on_demand"] += len(scores)
+        return scores
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "chunk_size": self.chunk_size,
+            "interval": self.interval,
+            "model_version": self.model.version,
+            "subsystems": list(SUBSYSTEMS)
+        }
+
+def _public(scores: Dict[str, Any]) -> Dict[str, Any]:
+    scores = dict(scores)
+    scores["vehicle_id"] = scores.pop("_id")
+    return scores
+
+# Create a singleton instance
+maintenance_service = MaintenanceService()
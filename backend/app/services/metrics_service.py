@@ -0,0 +1,292 @@
+import time
+import asyncio
+import functools
+import logging
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Tuple, Sequence
+from app.config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans everything from a cached Mongo read to a slow LLM generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered in Prometheus format"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within its bucket, like histogram_quantile()"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the last bound; the best we can say is "at least the last bound"
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+class _Family:
+    """A named metric and its children, one per label value combination"""
+
+    def __init__(self, kind: str, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def histogram(self, *labels: str) -> Histogram:
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = Histogram(self.buckets)
+        return child
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.children[labels] = self.children.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.children[labels] = self.children.get(labels, 0) - amount
+
+    def _label_text(self, labels: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in sorted(self.children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{self._label_text(labels)} {child}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_text(labels, ('le', _format_bound(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._label_text(labels, ('le', '+Inf'))} {child.count}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {child.sum}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {child.count}")
+        return lines
+
+class _Span:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics: "MetricsService", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.metrics.stage_in_flight.inc(self.stage)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.stage_duration.histogram(self.stage).observe(time.perf_counter() - self.started)
+        self.metrics.stage_in_flight.dec(self.stage)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class MetricsService:
+    """Process-local request, stage and LLM metrics, exposed in Prometheus text format.
+
+    Updates are plain dict and list operations on the event loop thread, so the
+    cost per span is a couple of perf_counter() calls and a bisect.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, prefix: str = "autofix"):
+        self.enabled = enabled
+        self.http_requests = _Family(
+            "counter", f"{prefix}_http_requests_total", "HTTP requests by route and status",
+            ("method", "route", "status")
+        )
+        self.http_duration = _Family(
+            "histogram", f"{prefix}_http_request_duration_seconds",
+            "Time from request start until the response body is complete", ("method", "route")
+        )
+        self.http_in_flight = _Family("gauge", f"{prefix}_http_requests_in_flight", "HTTP requests being served")
+        self.stage_duration = _Family(
+            "histogram", f"{prefix}_stage_duration_seconds",
+            "Time spent in a service stage (mongo, vector search, prompt assembly, LLM)", ("stage",)
+        )
+        self.stage_in_flight = _Family(
+            "gauge", f"{prefix}_stage_in_flight", "Calls currently inside a service stage", ("stage",)
+        )
+        self.llm_prompt_tokens = _Family(
+            "counter", f"{prefix}_llm_prompt_tokens_total", "Prompt tokens evaluated by the LLM", ("backend",)
+        )
+        self.llm_completion_tokens = _Family(
+            "counter", f"{prefix}_llm_completion_tokens_total", "Tokens generated by the LLM", ("backend",)
+        )
+        self.llm_tokens_per_second = _Family(
+            "histogram", f"{prefix}_llm_tokens_per_second", "Generation throughput per LLM call",
+            ("backend",), buckets=TOKENS_PER_SECOND_BUCKETS
+        )
+        self.single_flight_calls = _Family(
+            "counter", f"{prefix}_single_flight_calls_total",
+            "Calls through a single-flight group, by whether they led or joined an identical in-flight call",
+            ("operation", "role")
+        )
+        self.structured_outputs = _Family(
+            "counter", f"{prefix}_structured_outputs_total",
+            "LLM outputs by how they parsed: parsed, repaired, invalid, failed, or retried", ("operation", "outcome")
+        )
+        self.families = [
+            self.http_requests, self.http_duration, self.http_in_flight,
+            self.stage_duration, self.stage_in_flight,
+            self.llm_prompt_tokens, self.llm_completion_tokens, self.llm_tokens_per_second,
+            self.single_flight_calls, self.structured_outputs
+        ]
+
+    def span(self, stage: str):
+        """Context manager timing one stage, e.g. ``with metrics_service.span("llm.generate"):``"""
+        return _Span(self, stage) if self.enabled else _NULL_SPAN
+
+    def timed(self, stage: str):
+        """Decorator form of span(), for sync or async functions"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(stage):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_llm_usage(self, backend: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                         generation_seconds: Optional[float]):
+        if not self.enabled:
+            return
+        if prompt_tokens:
+            self.llm_prompt_tokens.inc(backend, amount=prompt_tokens)
+        if completion_tokens:
+            self.llm_completion_tokens.inc(backend, amount=completion_tokens)
+            if generation_seconds:
+                self.llm_tokens_per_second.histogram(backend).observe(completion_tokens / generation_seconds)
+
+    def record_ollama_usage(self, result: Dict[str, Any], backend: str = "ollama"):
+        # Ollama reports token counts and durations (nanoseconds) on the final response
+        eval_duration = result.get("eval_duration")
+        self.record_llm_usage(
+            backend,
+            result.get("prompt_eval_count"),
+            result.get("eval_count"),
+            eval_duration / 1e9 if eval_duration else None
+        )
+
+    def record_single_flight(self, operation: str, coalesced: bool):
+        if self.enabled:
+            self.single_flight_calls.inc(operation, "coalesced" if coalesced else "leader")
+
+    def record_structured_output(self, operation: str, outcome: str):
+        if self.enabled:
+            self.structured_outputs.inc(operation, outcome)
+
+    def render(self) -> str:
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def get_summary(self) -> Dict[str, Any]:
+        """p50/p95/p99 estimates per route and stage, for humans rather than Prometheus"""
+        def summarize(family: _Family):
+            return {
+                " ".join(labels): {
+                    "count": histogram.count,
+                    **{f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES}
+                }
+                for labels, histogram in sorted(family.children.items())
+            }
+        return {
+            "http": summarize(self.http_duration),
+            "stages": summarize(self.stage_duration),
+            "llm_tokens_per_second": summarize(self.llm_tokens_per_second),
+            "in_flight": sum(self.http_in_flight.children.values())
+        }
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests.
+
+    Written as raw ASGI rather than BaseHTTPMiddleware so streaming responses pass
+    through untouched; latency covers the full body, including streamed events.
+    """
+
+    def __init__(self, app, metrics: "MetricsService"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        metrics = self.metrics
+        metrics.http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.http_in_flight.dec()
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            metrics.http_requests.inc(scope["method"], route_path, status)
+            metrics.http_duration.histogram(scope["method"], route_path).observe(elapsed)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+# Create a singleton instance
+metrics_service = MetricsService()
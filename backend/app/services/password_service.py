@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing queue is full and the caller should retry later"""
+
+class PasswordService:
+    """Run bcrypt hashing and verification on a dedicated, size-limited thread pool.
+
+    bcrypt is deliberately slow, so running it inline in an async route stalls
+    the event loop for every other client. At most ``workers + max_queue``
+    operations are admitted at once; callers beyond that wait up to
+    ``queue_timeout`` seconds and then get PasswordServiceBusy.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_MAX_QUEUE, queue_timeout: float = PASSWORD_HASH_QUEUE_TIMEOUT):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self._slots = asyncio.Semaphore(self.workers + self.max_queue)
+        return self._executor
+
+    async def _run(self, func, *args):
+        executor = self._get_executor()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Password hashing queue is full")
+            raise PasswordServiceBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._slots = None
+
+# Create a singleton instance
+password_service = PasswordService()
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Set, Tuple
+from app.config import (
+    REPAIR_GUIDE_PREGENERATE, REPAIR_GUIDE_WORKERS, REPAIR_GUIDE_QUEUE_SIZE,
+    REPAIR_GUIDE_CACHE_SIZE, REPAIR_GUIDE_CACHE_TTL
+)
+from app.services.db_service import mongodb_service
+from app.services.llm_service import llm_service
+from app.services.cache_service import TTLCache, normalize_text
+from app.services.dtc_service import normalize_code
+
+logger = logging.getLogger(__name__)
+
+def guide_signature(vehicle_info: Dict[str, Any], issue_description: str, diagnostic_codes: List[str]) -> str:
+    """Key under which a repair guide is stored and shared.
+
+    Issues on the same make/model/year with the same codes share one guide.
+    Issues without valid codes fall back to a hash of the normalized description.
+    """
+    vehicle = "|".join(normalize_text(vehicle_info.get(field, "")) for field in ("make", "model", "year"))
+    codes = sorted({code for code in map(normalize_code, diagnostic_codes) if code})
+    if codes:
+        return f"{vehicle}|codes:{','.join(codes)}"
+    return f"{vehicle}|issue:{hashlib.sha1(normalize_text(issue_description).encode()).hexdigest()[:16]}"
+
+def _is_failed(guide: Dict[str, Any]) -> bool:
+    # Set by the LLM service when every backend failed, as opposed to output that didn't parse
+    return bool(guide.get("failed"))
+
+class RepairGuideService:
+    """Generate each repair guide once, store it in MongoDB and serve repeat views from there.
+
+    New issues are queued for background generation as soon as they are
+    recorded, so the guide is usually ready before it is opened. A bounded pool
+    of workers drains the queue, and a guide being generated is shared with any
+    request that asks for it in the meantime.
+    """
+
+    def __init__(self, workers: int = REPAIR_GUIDE_WORKERS, queue_size: int = REPAIR_GUIDE_QUEUE_SIZE,
+                 pregenerate: bool = REPAIR_GUIDE_PREGENERATE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pregenerate = pregenerate
+        # Ready guides are immutable, so a local copy saves the MongoDB round trip
+        self.cache = TTLCache(max_size=REPAIR_GUIDE_CACHE_SIZE, ttl=REPAIR_GUIDE_CACHE_TTL)
+        self.stats = {"queued": 0, "dropped": 0, "generated": 0, "failed": 0, "store_hits": 0, "on_demand": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._worker_tasks or not self.pregenerate:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Repair guide workers started ({self.workers} workers)")
+
+    async def stop(self):
+        for task in [*self._worker_tasks, *self._in_flight.values()]:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, *self._in_flight.values(), return_exceptions=True)
+        self._worker_tasks = []
+        self._in_flight.clear()
+        self._queued.clear()
+        self._queue = None
+
+    def enqueue(self, issue_id: str, vehicle_info: Dict[str, Any], issue_description: str,
+                diagnostic_codes: List[str]):
+        """Queue background generation of an issue's guide; never blocks the caller"""
+        if self._queue is None:
+            return
+        signature = guide_signature(vehicle_info, issue_description, diagnostic_codes)
+        if signature in self._queued or signature in self._in_flight or self.cache.get(signature) is not None:
+            return
+        try:
+            self._queue.put_nowait((signature, issue_id, vehicle_info, issue_description, diagnostic_codes))
+        except asyncio.QueueFull:
+            # The guide is generated on demand instead
+            self.stats["dropped"] += 1
+            logger.warning(f"Repair guide queue full, not pre-generating guide for issue {issue_id}")
+            return
+        self._queued.add(signature)
+        self.stats["queued"] += 1
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._queued.discard(job[0])
+            try:
+                await self._start(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background repair guide generation failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _start(self, signature: str, issue_id: str, vehicle_info: Dict[str, Any], issue_description: str,
+               diagnostic_codes: List[str]) -> asyncio.Task:
+        """Generation task for a signature, joining one already running"""
+        task = self._in_flight.get(signature)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate(signature, issue_id, vehicle_info, issue_description, diagnostic_codes)
+            )
+            self._in_flight[signature] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(signature, None))
+        return task
+
+    async def _generate(self, signature: str, issue_id: str, vehicle_info: Dict[str, Any],
+                        issue_description: str, diagnostic_codes: List[str]) -> Dict[str, Any]:
+        existing = await mongodb_service.claim_repair_guide(signature, issue_id)
+        if existing is not None and existing.get("status") == "ready":
+            self.stats["store_hits"] += 1
+            guide = existing["guide"]
+        else:
+            guide, complete = await llm_service.get_repair_guide(vehicle_info, issue_description, diagnostic_codes)
+            # Raw or repaired output is returned once but stored as failed, so the next request regenerates it
+            await mongodb_service.save_repair_guide(signature, "ready" if complete else "failed", guide, issue_id)
+            self.stats["generated" if complete else "failed"] += 1
+            if not complete:
+                return guide
+        self.cache.set(signature, guide)
+        return guide
+
+    async def lookup(self, signature: str) -> Optional[Dict[str, Any]]:
+        """A stored guide (waiting for one being generated), or None if it has to be generated"""
+        guide = self.cache.get(signature)
+        if guide is not None:
+            return guide
+        task = self._in_flight.get(signature)
+        if task is not None:
+            # Shielded so a client disconnecting doesn't cancel a generation others are waiting on
+            guide = await asyncio.shield(task)
+            return None if _is_failed(guide) else guide
+        stored = await mongodb_service.get_repair_guide(signature)
+        if stored is not None and stored.get("status") == "ready":
+            self.stats["store_hits"] += 1
+            self.cache.set(signature, stored["guide"])
+            return stored["guide"]
+        return None
+
+    async def get_guide(self, issue_id: str, vehicle_info: Dict[str, Any], issue_description: str,
+                        diagnostic_codes: List[str]) -> Dict[str, Any]:
+        """Serve the stored guide for an issue, generating and storing it if there is none yet"""
+        signature = guide_signature(vehicle_info, issue_description, diagnostic_codes)
+        guide = await self.lookup(signature)
+        if guide is not None:
+            return guide
+        self.stats["on_demand"] += 1
+        return await asyncio.shield(
+            self._start(signature, issue_id, vehicle_info, issue_description, diagnostic_codes)
+        )
+
+    async def store(self, signature: str, issue_id: str, guide: Dict[str, Any], complete: bool):
+        """Save a guide generated elsewhere (e.g. streamed to the client); incomplete guides are not kept"""
+        if not complete:
+            self.stats["failed"] += 1
+            return
+        await mongodb_service.save_repair_guide(signature, "ready", guide, issue_id)
+        self.stats["generated"] += 1
+        self.cache.set(signature, guide)
+
+    async def get_status(self, vehicle_info: Dict[str, Any], issue_description: str,
+                         diagnostic_codes: List[str]) -> Tuple[str, str]:
+        """(signature, status) where status is ready, pending, failed or missing"""
+        signature = guide_signature(vehicle_info, issue_description, diagnostic_codes)
+        if self.cache.get(signature) is not None:
+            return signature, "ready"
+        if signature in self._queued or signature in self._in_flight:
+            return signature, "pending"
+        stored = await mongodb_service.get_repair_guide(signature)
+        return signature, stored["status"] if stored is not None else "missing"
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": len(self._in_flight),
+            "workers": len(self._worker_tasks),
+            "cache": self.cache.get_stats()
+        }
+
+# Create a singleton instance
+repair_guide_service = RepairGuideService()
@@ -0,0 +1,47 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Dict, Any, Iterable, List
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional; responses fall back to the stdlib encoder, which is slower
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Encode straight to response bytes; ObjectIds become strings and datetimes ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def public_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename a Mongo document's _id to a string id, in place"""
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    return doc
+
+def public_docs(docs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [public_doc(doc) for doc in docs]
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for documents read from MongoDB, which were validated when they were written.
+
+    Routes return Mongo documents (via public_doc) in this response instead of
+    building Pydantic models: FastAPI then skips response_model validation and
+    jsonable_encoder, and the body is encoded in one pass, with orjson when it
+    is installed. The route's response_model still documents the shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,210 @@
+import re
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from app.config import LLM_OUTPUT_FORMAT
+from app.models.diagnosis import json_schema, validate_output
+from app.services.metrics_service import metrics_service
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # Optional; the stdlib parser gives the same results, only slower
+    orjson = None
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Characters that change the scanner's state, outside and inside a string
+_STRUCTURAL = re.compile(r'[{}\[\]",\\]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_CLOSERS = {"{": "}", "[": "]"}
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+class JSONScanner:
+    """Incrementally track the first JSON object in an LLM response.
+
+    Text can be fed token by token while a response streams. The scanner skips
+    anything before the first '{', tracks string and bracket state with a regex
+    jump between structural characters, and stops at the brace that closes the
+    object, so trailing prose is ignored. If the response ends early (the token
+    limit, a dropped stream) result() closes the open string and brackets,
+    dropping whatever member was cut off midway.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self.repaired = False
+        self._chunks: List[str] = []
+        self._length = 0
+        self._end: Optional[int] = None
+        # One [closer, boundary] per open container; boundary is where its last complete member ends
+        self._stack: List[List[Any]] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str):
+        if self.done or not chunk:
+            return
+        if not self.started:
+            start = chunk.find("{")
+            if start < 0:
+                return
+            chunk = chunk[start:]
+            self.started = True
+
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        position = 0
+        if self._escape:
+            # The previous chunk ended on a backslash inside a string
+            position = 1
+            self._escape = False
+
+        stack = self._stack
+        while True:
+            match = (_STRING_SPECIAL if self._in_string else _STRUCTURAL).search(chunk, position)
+            if match is None:
+                return
+            char = match.group()
+            position = match.end()
+            if self._in_string:
+                if char == "\\":
+                    if position >= len(chunk):
+                        self._escape = True
+                        return
+                    position += 1
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                stack.append([_CLOSERS[char], offset + position])
+            elif char == ",":
+                if stack:
+                    stack[-1][1] = offset + match.start()
+            else:
+                if stack:
+                    stack.pop()
+                if not stack:
+                    self._end = offset + position
+                    self.done = True
+                    return
+
+    @property
+    def text(self) -> str:
+        text = "".join(self._chunks)
+        return text[:self._end] if self.done else text
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """The parsed object, repaired if the response was cut short, or None if nothing usable was found"""
+        if not self.started:
+            return None
+        text = self.text
+        if self.done:
+            candidates = [text, _TRAILING_COMMA.sub(r"\1", text)]
+        else:
+            self.repaired = True
+            if self._in_string:
+                # Drop a dangling escape, then close the string
+                text = (text[:-1] if self._escape else text) + '"'
+            frames = self._stack
+            closers = "".join(frame[0] for frame in reversed(frames))
+            candidates = [text + closers]
+            # Otherwise cut the innermost member that was still being written, then the next level out
+            for depth in range(len(frames) - 1, -1, -1):
+                cut = text[:frames[depth][1]].rstrip().rstrip(",")
+                candidates.append(cut + "".join(frame[0] for frame in reversed(frames[:depth + 1])))
+
+        for index, candidate in enumerate(candidates):
+            try:
+                value = _loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                self.repaired = self.repaired or index > 0
+                return value
+        return None
+
+def parse_json_object(response: str) -> Optional[Dict[str, Any]]:
+    """Return the first JSON object in a response, repairing truncated output, or None"""
+    return _parse(response)[0]
+
+def _parse(response: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    # Fast path: the whole response, or its outermost braces, is valid JSON
+    start = response.find("{")
+    end = response.rfind("}") + 1
+    if 0 <= start < end:
+        try:
+            value = _loads(response[start:end])
+            if isinstance(value, dict):
+                return value, False
+        except ValueError:
+            pass
+    scanner = JSONScanner()
+    scanner.feed(response)
+    value = scanner.result()
+    # Reaching the scanner means the fast path failed, so anything it returns needed repair
+    return value, value is not None
+
+class StructuredOutput:
+    """Parse and validate one kind of LLM output (a diagnosis, a repair guide).
+
+    Holds the JSON schema sent to the backend as Ollama's `format` and counts
+    how responses parse: cleanly, only after repair, retried, or not at all.
+    """
+
+    def __init__(self, model: Type[BaseModel], operation: str, output_format: str = LLM_OUTPUT_FORMAT):
+        if output_format not in ("schema", "json", "off"):
+            raise ValueError(f"Unknown LLM output format '{output_format}'")
+        self.model = model
+        self.operation = operation
+        self.output_format = output_format
+        self.schema = json_schema(model)
+        # What to send as Ollama's `format`: the full schema, plain JSON mode, or nothing
+        self.format = {"schema": self.schema, "json": "json", "off": None}[output_format]
+        self.stats = {"parsed": 0, "repaired": 0, "invalid": 0, "failed": 0, "retries": 0}
+
+    def scanner(self) -> JSONScanner:
+        """A scanner to feed streamed tokens into, for parse()"""
+        return JSONScanner()
+
+    def parse(self, response: str, scanner: Optional[JSONScanner] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(validated output or None if the response holds no usable object, whether it needed repair)"""
+        if scanner is not None:
+            data, repaired = scanner.result(), scanner.repaired
+        else:
+            data, repaired = _parse(response)
+
+        if data is None:
+            return self._record("failed", response), False
+        try:
+            value = validate_output(self.model, data)
+        except ValueError as e:
+            return self._record("invalid", response, e), False
+        self._record("repaired" if repaired else "parsed")
+        return value, repaired
+
+    def record_retry(self):
+        self.stats["retries"] += 1
+        metrics_service.record_structured_output(self.operation, "retry")
+
+    def _record(self, outcome: str, response: str = "", error: Optional[Exception] = None) -> None:
+        self.stats[outcome] += 1
+        metrics_service.record_structured_output(self.operation, outcome)
+        if outcome in ("failed", "invalid"):
+            # Only the first line of a validation error, e.g. "2 validation errors for Diagnosis"
+            reason = f"{outcome}: {str(error).splitlines()[0]}" if error else outcome
+            logger.warning(f"Unusable {self.operation} output ({reason}): {response[:200]!r}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        parsed = self.stats["parsed"] + self.stats["repaired"]
+        total = parsed + self.stats["invalid"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "format": self.output_format,
+            "failure_rate": (total - parsed) / total if total else 0.0
+        }
@@ -0,0 +1,319 @@
+import asyncio
+import math
+import time
+import logging
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import (
+    TELEMETRY_BUFFER_SIZE, TELEMETRY_BUCKET_SECONDS, TELEMETRY_FLUSH_INTERVAL, TELEMETRY_IDLE_SECONDS
+)
+from app.services.db_service import mongodb_service
+from app.services.metrics_service import metrics_service
+
+logger = logging.getLogger(__name__)
+
+# Supported OBD-II PIDs, in buffer column order
+PIDS = (
+    "rpm",
+    "speed",
+    "coolant_temp",
+    "intake_air_temp",
+    "engine_load",
+    "throttle_pos",
+    "maf",
+    "short_fuel_trim",
+    "long_fuel_trim",
+    "o2_voltage"
+)
+PID_INDEX = {pid: index for index, pid in enumerate(PIDS)}
+
+# Accepted sample times in epoch seconds (2000-01-01 to 2100-01-01); larger values are taken as milliseconds
+MIN_TIMESTAMP = 946684800.0
+MAX_TIMESTAMP = 4102444800.0
+
+class VehicleTelemetryBuffer:
+    """Fixed-size ring buffer of PID samples for one vehicle.
+
+    Samples are stored column-wise in preallocated NumPy arrays (NaN where a PID
+    was not reported), so memory per vehicle is constant and window statistics
+    are computed without Python-level loops.
+    """
+
+    def __init__(self, capacity: int = TELEMETRY_BUFFER_SIZE):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, len(PIDS)), np.nan, dtype=np.float32)
+        # Total samples ever written; the ring position is total % capacity
+        self.total = 0
+        self.flushed = 0
+        self.last_seen = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray):
+        """Append a block of samples (timestamps shape (n,), values shape (n, len(PIDS)))"""
+        count = len(timestamps)
+        if count > self.capacity:
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            self.total += count - self.capacity
+            count = self.capacity
+        positions = (self.total + np.arange(count)) % self.capacity
+        self.timestamps[positions] = timestamps
+        self.values[positions] = values
+        self.total += count
+        self.last_seen = time.monotonic()
+
+    def _ordered(self, start: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples from absolute sequence number start to the newest, oldest first"""
+        start = max(start, self.total - self.capacity)
+        positions = np.arange(start, self.total) % self.capacity
+        return self.timestamps[positions], self.values[positions]
+
+    def window(self, seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps, values = self._ordered(0)
+        if len(timestamps) == 0:
+            return timestamps, values
+        mask = timestamps >= timestamps.max() - seconds
+        return timestamps[mask], values[mask]
+
+    def take_unflushed(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Samples not yet persisted, and the position to pass to mark_flushed once they are stored"""
+        timestamps, values = self._ordered(self.flushed)
+        return timestamps, values, self.total
+
+    def mark_flushed(self, end: int) -> int:
+        """Record samples up to end as persisted; returns how many were overwritten before they could be"""
+        dropped = max(0, end - self.capacity - self.flushed)
+        self.flushed = end
+        return dropped
+
+    def window_stats(self, seconds: float) -> Dict[str, Dict[str, Optional[float]]]:
+        timestamps, values = self.window(seconds)
+        return compute_window_stats(timestamps, values)
+
+def compute_window_stats(timestamps: np.ndarray, values: np.ndarray) -> Dict[str, Dict[str, Optional[float]]]:
+    """Per-PID min/max/mean and least-squares rate of change (units per second), vectorized over PIDs"""
+    if len(timestamps) == 0:
+        return {}
+    mask = ~np.isnan(values)
+    counts = mask.sum(axis=0)
+    present = counts > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        filled = np.where(mask, values, 0.0)
+        means = filled.sum(axis=0) / counts
+        minimums = np.where(mask, values, np.inf).min(axis=0)
+        maximums = np.where(mask, values, -np.inf).max(axis=0)
+
+        t = (timestamps - timestamps[0])[:, None]
+        t_mean = (t * mask).sum(axis=0) / counts
+        t_centered = np.where(mask, t - t_mean, 0.0)
+        v_centered = np.where(mask, values - means, 0.0)
+        variance = (t_centered ** 2).sum(axis=0)
+        slopes = np.where(variance > 0, (t_centered * v_centered).sum(axis=0) / variance, np.nan)
+
+    stats = {}
+    for index in np.flatnonzero(present):
+        stats[PIDS[index]] = {
+            "min": float(minimums[index]),
+            "max": float(maximums[index]),
+            "mean": float(means[index]),
+            "rate_of_change": None if np.isnan(slopes[index]) else float(slopes[index]),
+            "samples": int(counts[index])
+        }
+    return stats
+
+def samples_to_arrays(samples: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert [{"t": epoch_seconds, "rpm": ..., ...}, ...] into timestamp and value arrays.
+
+    Millisecond timestamps are converted to seconds; anything still outside
+    MIN_TIMESTAMP..MAX_TIMESTAMP (or not finite) raises ValueError.
+    """
+    timestamps = np.empty(len(samples), dtype=np.float64)
+    values = np.full((len(samples), len(PIDS)), np.nan, dtype=np.float32)
+    now = time.time()
+    for row, sample in enumerate(samples):
+        timestamp = float(sample.get("t", now))
+        if timestamp > MAX_TIMESTAMP:
+            timestamp /= 1000
+        if not (math.isfinite(timestamp) and MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP):
+            # A time that can't be bucketed would block the vehicle's flushes
+            raise ValueError(f"Sample {row} has a timestamp outside the supported range")
+        timestamps[row] = timestamp
+        for pid, value in sample.items():
+            column = PID_INDEX.get(pid)
+            if column is not None and value is not None:
+                values[row, column] = float(value)
+    return timestamps, values
+
+class TelemetryService:
+    """Per-vehicle telemetry buffers with periodic time-bucketed flushes to MongoDB.
+
+    Each flush groups new samples into TELEMETRY_BUCKET_SECONDS buckets and
+    upserts one document per (vehicle, bucket) with $push/$inc/$min/$max, instead
+    of inserting every sample.
+    """
+
+    def __init__(self, buffer_size: int = TELEMETRY_BUFFER_SIZE, bucket_seconds: int = TELEMETRY_BUCKET_SECONDS,
+                 flush_interval: float = TELEMETRY_FLUSH_INTERVAL, idle_seconds: float = TELEMETRY_IDLE_SECONDS):
+        self.buffer_size = buffer_size
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.buffers: Dict[str, VehicleTelemetryBuffer] = {}
+        self.stats = {"samples": 0, "flushed_samples": 0, "dropped_samples": 0, "rejected_samples": 0,
+                      "bucket_writes": 0}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            logger.info("Telemetry flusher started")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+            await self.flush()
+            logger.info("Telemetry flusher stopped")
+
+    def ingest(self, vehicle_id: str, samples: List[Dict[str, Any]]) -> int:
+        if not samples:
+            return 0
+        # Converted first, so a rejected message doesn't leave an empty buffer behind
+        timestamps, values = samples_to_arrays(samples)
+        buffer = self.buffers.get(vehicle_id)
+        if buffer is None:
+            buffer = VehicleTelemetryBuffer(self.buffer_size)
+            self.buffers[vehicle_id] = buffer
+        buffer.append(timestamps, values)
+        self.stats["samples"] += len(samples)
+        return len(samples)
+
+    def window_stats(self, vehicle_id: str, seconds: float) -> Optional[Dict[str, Any]]:
+        buffer = self.buffers.get(vehicle_id)
+        if buffer is None:
+            return None
+        return buffer.window_stats(seconds)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._evict_idle()
+            except Exception as e:
+                logger.error(f"Telemetry flush failed: {e}")
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for vehicle_id in [vid for vid, buffer in self.buffers.items()
+                           if buffer.last_seen < cutoff and buffer.flushed == buffer.total]:
+            del self.buffers[vehicle_id]
+
+    def _bucket_operations(self, vehicle_id: str, timestamps: np.ndarray, values: np.ndarray) -> List[UpdateOne]:
+        operations = []
+        bucket_ids = (timestamps // self.bucket_seconds).astype(np.int64)
+        # Samples are time-ordered, so each bucket is a contiguous run
+        boundaries = np.flatnonzero(np.diff(bucket_ids)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(bucket_ids)]):
+            bucket_start = int(bucket_ids[start]) * self.bucket_seconds
+            block = values[start:end]
+            present = ~np.all(np.isnan(block), axis=0)
+            push = {"t": {"$each": (timestamps[start:end] - bucket_start).round(3).tolist()}}
+            # Every PID column is pushed (null when absent) so each stays aligned with t
+            for index, pid in enumerate(PIDS):
+                push[f"pids.{pid}"] = {"$each": [None if np.isnan(v) else round(float(v), 3) for v in block[:, index]]}
+            minimums, maximums = {}, {}
+            for index in np.flatnonzero(present):
+                column = block[:, index]
+                pid = PIDS[index]
+                minimums[f"min.{pid}"] = float(np.nanmin(column))
+                maximums[f"max.{pid}"] = float(np.nanmax(column))
+            update = {"$push": push, "$inc": {"count": int(end - start)}}
+            if minimums:
+                update["$min"] = minimums
+                update["$max"] = maximums
+            operations.append(UpdateOne(
+                {
+                    "vehicle_id": vehicle_id,
+                    "bucket_start": datetime.fromtimestamp(bucket_start, tz=timezone.utc)
+                },
+                update,
+                upsert=True
+            ))
+        return operations
+
+    async def flush(self) -> int:
+        """Persist every buffer's new samples as bucket upserts in one bulk_write.
+
+        Each vehicle's samples are committed on their own: a vehicle whose
+        operations fail stays unflushed and is retried with the next flush,
+        without holding back the others.
+        """
+        if mongodb_service.db is None:
+            # Keep samples buffered until MongoDB is connected
+            return 0
+        # (buffer, end, sample count, first operation, end operation) per vehicle
+        operations, taken = [], []
+        for vehicle_id, buffer in list(self.buffers.items()):
+            if buffer.flushed == buffer.total:
+                continue
+            timestamps, values, end = buffer.take_unflushed()
+            # Batches can arrive out of order; bucketing needs time order
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+            try:
+                vehicle_operations = self._bucket_operations(vehicle_id, timestamps, values)
+            except (ValueError, OverflowError, OSError) as e:
+                # Samples that can't be bucketed never will be; retrying them would block this vehicle for good
+                logger.error(f"Discarding {len(timestamps)} telemetry samples for vehicle {vehicle_id}: {e}")
+                self.stats["rejected_samples"] += len(timestamps)
+                self.stats["dropped_samples"] += buffer.mark_flushed(end)
+                continue
+            taken.append((buffer, end, len(timestamps), len(operations), len(operations) + len(vehicle_operations)))
+            operations.extend(vehicle_operations)
+        if not operations:
+            return 0
+
+        failed = set()
+        try:
+            with metrics_service.span("mongo.telemetry_flush"):
+                await mongodb_service.db.telemetry_buckets.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Unordered, so every operation not listed here was applied
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"Telemetry flush: {len(failed)} of {len(operations)} bucket writes failed")
+        # If the write raised anything else, nothing is marked flushed and it all goes out with the next flush
+        flushed = 0
+        for buffer, end, samples, first, last in taken:
+            if failed.intersection(range(first, last)):
+                # Retried whole; buckets of it that were written get those samples again
+                continue
+            self.stats["dropped_samples"] += buffer.mark_flushed(end)
+            self.stats["bucket_writes"] += last - first
+            flushed += samples
+        self.stats["flushed_samples"] += flushed
+        return flushed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "vehicles": len(self.buffers),
+            "buffer_bytes": sum(buffer.nbytes for buffer in self.buffers.values())
+        }
+
+# Create a singleton instance
+telemetry_service = TelemetryService()
@@ -1,44 +1,63 @@
-import chromadb
-from chromadb.config import Settings
-from app.config import CHROMA_DB_PATH
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.services.metrics_service import metrics_service
+from app.config import CHROMA_DB_PATH, VECTOR_SEARCH_WORKERS, VECTOR_SEARCH_BATCH_WINDOW_MS, VECTOR_SEARCH_MAX_BATCH
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Set
 
 logger = logging.getLogger(__name__)
 
+# Query result keys that hold one entry per query text/embedding
+PER_QUERY_RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings", "uris", "data")
+
 class ChromaDBService:
-    def __init__(self):
+    def __init__(self, max_workers: int = VECTOR_SEARCH_WORKERS):
         self.client = None
         self.collections = {}
+        self.embedding_function = None
+        self.max_workers = max_workers
+        # Chroma calls are blocking, so async callers run them on this bounded pool
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._batchers: Dict[tuple, "_QueryBatcher"] = {}
 
-    def connect(self):
+    def connect(self, path: Optional[str] = None, embedding_function=None):
+        """Open the persistent client; path and embedding_function default to CHROMA_DB_PATH and Chroma's default model"""
+        if self.client is not None:
+            return
         try:
-            self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+            # chromadb takes most of a second to import, so only processes that connect pay for it
+            import chromadb
+
+            self.client = chromadb.PersistentClient(path=path or CHROMA_DB_PATH)
+            self.embedding_function = _default_embedding_function(embedding_function)
             logger.info("Connected to ChromaDB")
-            
+
             # Create collections if they don't exist
             self._create_collection("automotive_knowledge")
             self._create_collection("repair_procedures")
             self._create_collection("diagnostic_codes")
-            
+
         except Exception as e:
             logger.error(f"Failed to connect to ChromaDB: {e}")
             raise
 
     def _create_collection(self, name: str):
         try:
-            self.collections[name] = self.client.get_or_create_collection(name=name)
+            self.collections[name] = self.client.get_or_create_collection(
+                name=name, embedding_function=self.embedding_function
+            )
             logger.info(f"Collection '{name}' ready")
         except Exception as e:
             logger.error(f"Failed to create collection '{name}': {e}")
             raise
 
-    def add_documents(self, collection_name: str, documents: List[str], 
+    def add_documents(self, collection_name: str, documents: List[str],
                      metadatas: List[Dict[str, Any]], ids: List[str]):
         """Add documents to a collection with their embeddings"""
         if collection_name not in self.collections:
             self._create_collection(collection_name)
-            
+
         collection = self.collections[collection_name]
         collection.add(
             documents=documents,
@@ -47,23 +66,223 @@ class ChromaDBService:
         )
         logger.info(f"Added {len(documents)} documents to '{collection_name}'")
 
-    def query_collection(self, collection_name: str, query_text: str, n_results: int = 5):
-        """Query a collection for similar documents"""
+    def get_existing_ids(self, collection_name: str, ids: List[str]) -> List[str]:
+        """Return which of the given ids are already stored in a collection"""
+        if collection_name not in self.collections:
+            self._create_collection(collection_name)
+        return self.collections[collection_name].get(ids=ids, include=[])["ids"]
+
+    def upsert_embeddings(self, collection_name: str, ids: List[str], embeddings: List[List[float]],
+                          documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Insert or replace documents whose embeddings were computed by the caller"""
+        if collection_name not in self.collections:
+            self._create_collection(collection_name)
+        self.collections[collection_name].upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the same function the collections use"""
+        if self.embedding_function is None:
+            self.embedding_function = _default_embedding_function()
+        return [np.asarray(embedding, dtype=np.float32).tolist() for embedding in self.embedding_function(texts)]
+
+    def get_embedding_stats(self) -> Dict[str, Any]:
+        """Embedding cache hit rates and time spent in the model"""
+        get_stats = getattr(self.embedding_function, "get_stats", None)
+        return get_stats() if get_stats else {"cache": "disabled"}
+
+    def query_collection(self, collection_name: str, query_text: str, n_results: int = 5,
+                         query_embedding: Optional[List[float]] = None, include: Optional[List[str]] = None):
+        """Query a collection for similar documents.
+
+        Pass a precomputed query_embedding to skip re-embedding the query text, and
+        include to change which fields Chroma returns (e.g. add "embeddings").
+        """
         if collection_name not in self.collections:
             logger.error(f"Collection '{collection_name}' does not exist")
             return []
-            
+
         collection = self.collections[collection_name]
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
-        
+        options = {"include": include} if include else {}
+        if query_embedding is not None:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                **options
+            )
+        else:
+            results = collection.query(
+                query_texts=[query_text],
+                n_results=n_results,
+                **options
+            )
+
         return results
 
+    def query_collection_batch(self, collection_name: str, query_texts: Optional[List[str]] = None,
+                               n_results: int = 5, query_embeddings: Optional[List[List[float]]] = None,
+                               include: Optional[List[str]] = None):
+        """Run several queries against a collection in a single Chroma call.
+
+        Returns one result per query, each shaped like a query_collection result.
+        """
+        count = len(query_embeddings) if query_embeddings is not None else len(query_texts)
+        if collection_name not in self.collections:
+            logger.error(f"Collection '{collection_name}' does not exist")
+            return [[] for _ in range(count)]
+
+        collection = self.collections[collection_name]
+        options = {"include": include} if include else {}
+        if query_embeddings is not None:
+            results = collection.query(query_embeddings=query_embeddings, n_results=n_results, **options)
+        else:
+            results = collection.query(query_texts=query_texts, n_results=n_results, **options)
+
+        # Chroma returns one list per query under each result key; split them back out
+        return [
+            {
+                key: [value[i]] if key in PER_QUERY_RESULT_KEYS and value is not None else value
+                for key, value in results.items()
+            }
+            for i in range(count)
+        ]
+
+    def warm_up(self):
+        """Load the embedding model now rather than on the first query"""
+        self.embed_texts(["warm up"])
+
+    # Async methods
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="vector-search")
+        return self._executor
+
+    def _get_batcher(self, key: tuple, run_batch: Callable[[List[Any]], List[Any]]) -> "_QueryBatcher":
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            batcher = _QueryBatcher(run_batch, self._get_executor)
+            self._batchers[key] = batcher
+        return batcher
+
+    @metrics_service.timed("vector.embed")
+    async def aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts off the event loop, coalescing concurrent single-text callers into one batch"""
+        # Texts already in the embedding cache's memory tier don't need a worker thread at all
+        peek = getattr(self.embedding_function, "peek", None)
+        cached = peek(texts) if peek else None
+        if cached is not None:
+            return [embedding.tolist() for embedding in cached]
+        if len(texts) > 1:
+            # Already a batch: embed it in one call
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), self.embed_texts, texts)
+        batcher = self._get_batcher(("embed",), self.embed_texts)
+        return await asyncio.gather(*(batcher.submit(text) for text in texts))
+
+    @metrics_service.timed("vector.query")
+    async def aquery_collection(self, collection_name: str, query_text: str, n_results: int = 5,
+                                query_embedding: Optional[List[float]] = None, include: Optional[List[str]] = None):
+        """Async query_collection; concurrent queries to the same collection share one Chroma call"""
+        include_key = tuple(include) if include else None
+        if query_embedding is not None:
+            batcher = self._get_batcher(
+                ("query", collection_name, n_results, include_key, "embeddings"),
+                lambda embeddings: self.query_collection_batch(
+                    collection_name, n_results=n_results, query_embeddings=embeddings, include=include
+                )
+            )
+            return await batcher.submit(query_embedding)
+
+        batcher = self._get_batcher(
+            ("query", collection_name, n_results, include_key, "texts"),
+            lambda texts: self.query_collection_batch(collection_name, texts, n_results=n_results, include=include)
+        )
+        return await batcher.submit(query_text)
+
+    @metrics_service.timed("vector.query_batch")
+    async def aquery_collection_batch(self, collection_name: str, query_texts: Optional[List[str]] = None,
+                                      n_results: int = 5, query_embeddings: Optional[List[List[float]]] = None,
+                                      include: Optional[List[str]] = None):
+        """Async query_collection_batch for callers that already hold a batch of queries"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            lambda: self.query_collection_batch(collection_name, query_texts, n_results, query_embeddings, include)
+        )
+
     def close(self):
         # ChromaDB doesn't require explicit closing
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._batchers.clear()
+        close_cache = getattr(self.embedding_function, "close", None)
+        if close_cache:
+            close_cache()
+        self.client = None
+        self.collections = {}
         logger.info("ChromaDB service shutdown")
 
+def _default_embedding_function(embedding_function=None):
+    """The given (or configured) embedding function behind the embedding cache"""
+    # Imports chromadb, so only processes that embed pay for it
+    from app.services.embedding_service import cached, create_embedding_function
+    return cached(embedding_function or create_embedding_function())
+
+class _QueryBatcher:
+    """Coalesce calls that arrive within a short window into one batched executor call"""
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 get_executor: Callable[[], ThreadPoolExecutor],
+                 window: float = VECTOR_SEARCH_BATCH_WINDOW_MS / 1000,
+                 max_batch: int = VECTOR_SEARCH_MAX_BATCH):
+        self.run_batch = run_batch
+        self.get_executor = get_executor
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches; the event loop only keeps weak references to tasks
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.get_executor(), self.run_batch, items)
+        except Exception as e:
+            logger.error(f"Batched vector search failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
 # Create a singleton instance
-vector_db_service = ChromaDBService()
\ No newline at end of file
+vector_db_service = ChromaDBService()
@@ -0,0 +1,98 @@
+"""Admission control for LLM-backed requests under overload.
+
+A stub backend with --backend-slots generation slots of --llm-ms each stands
+in for Ollama, so no model is needed. One greedy user fires requests as fast
+as they are answered while a mix of other users sends critical, trouble-code
+and plain requests. Runs once without admission control and once with it,
+and reports per-priority latency, how many requests each side got through
+and how many were shed:
+
+    python -m benchmarks.bench_admission --users 20 --greedy 40 --duration 5
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+from app.services.admission_service import AdmissionController, AdmissionPriority, AdmissionRejected
+
+PRIORITIES = (AdmissionPriority.critical, AdmissionPriority.diagnostic_codes, AdmissionPriority.normal)
+
+async def _run(controller: AdmissionController, users: int, greedy: int, duration: float, llm_ms: float,
+               gap_ms: float, backend_slots: int):
+    backend = asyncio.Semaphore(backend_slots)
+    latencies: Dict[str, List[float]] = {}
+    outcomes: Dict[str, Dict[str, int]] = {}
+    deadline = time.perf_counter() + duration
+
+    async def request(user_id: str, label: str, priority: AdmissionPriority):
+        started = time.perf_counter()
+        try:
+            async with await controller.admit(user_id, priority):
+                async with backend:
+                    await asyncio.sleep(llm_ms / 1000)
+        except AdmissionRejected as e:
+            counts = outcomes.setdefault(label, {})
+            counts[e.reason] = counts.get(e.reason, 0) + 1
+            return False
+        latencies.setdefault(label, []).append(time.perf_counter() - started)
+        outcomes.setdefault(label, {}).setdefault("ok", 0)
+        outcomes[label]["ok"] += 1
+        return True
+
+    async def greedy_client():
+        while time.perf_counter() < deadline:
+            if not await request("greedy", "greedy", AdmissionPriority.normal):
+                await asyncio.sleep(0.01)
+
+    async def user_client(index: int):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            priority = rng.choice(PRIORITIES)
+            await request(f"user-{index}", priority.name, priority)
+            await asyncio.sleep(rng.expovariate(1000 / gap_ms))
+
+    await asyncio.gather(
+        *(greedy_client() for _ in range(greedy)),
+        *(user_client(i) for i in range(users))
+    )
+    return latencies, outcomes
+
+def _report(title: str, latencies: Dict[str, List[float]], outcomes: Dict[str, Dict[str, int]]):
+    print(title)
+    for label in ("critical", "diagnostic_codes", "normal", "greedy"):
+        samples = sorted(latencies.get(label, []))
+        counts = outcomes.get(label, {})
+        shed = ", ".join(f"{reason} {count}" for reason, count in sorted(counts.items()) if reason != "ok") or "none"
+        if samples:
+            p50 = samples[len(samples) // 2] * 1000
+            p95 = samples[max(0, int(len(samples) * 0.95) - 1)] * 1000
+            print(f"  {label:<17} ok {len(samples):>5}  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  shed: {shed}")
+        else:
+            print(f"  {label:<17} ok     0  shed: {shed}")
+
+async def main(users: int, greedy: int, duration: float, llm_ms: float, gap_ms: float, backend_slots: int):
+    settings = dict(rate_per_minute=120, burst=5, max_concurrent=backend_slots, max_queue=backend_slots * 2,
+                    queue_timeout=max(0.5, llm_ms / 1000 * 4), backend="memory")
+    # With admission disabled every request queues at the backend in arrival order, behind the greedy user's
+    unlimited = AdmissionController(**settings, enabled=False)
+    _report("Without admission control",
+            *await _run(unlimited, users, greedy, duration, llm_ms, gap_ms, backend_slots))
+    limited = AdmissionController(**settings)
+    _report("With admission control",
+            *await _run(limited, users, greedy, duration, llm_ms, gap_ms, backend_slots))
+    stats = limited.get_stats()
+    print(f"  admitted {stats['admitted']}, rate limited {stats['rate_limited']}, "
+          f"shed {stats['shed_deadline'] + stats['shed_queue_full'] + stats['shed_displaced']}, "
+          f"mean queue wait {stats['mean_wait_ms']:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--greedy", type=int, default=40, help="Concurrent requests from the greedy user")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--llm-ms", type=float, default=100.0, help="Stub generation time")
+    parser.add_argument("--gap-ms", type=float, default=1000.0, help="Mean pause between a normal user's requests")
+    parser.add_argument("--backend-slots", type=int, default=8, help="Concurrent generations the stub backend runs")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.greedy, args.duration, args.llm_ms, args.gap_ms, args.backend_slots))
@@ -0,0 +1,65 @@
+"""Measure get_current_user latency with and without the token/user cache.
+
+Run from the backend directory against the configured MongoDB, or pass
+--in-memory to use mongomock-motor instead:
+
+    python -m benchmarks.bench_auth --iterations 2000
+"""
+import argparse
+import asyncio
+import time
+import statistics
+from datetime import timedelta
+from app.models.user import User
+from app.services.db_service import mongodb_service
+from app.routes.auth import get_current_user, create_access_token, token_cache
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6,
+        "mean_us": statistics.mean(samples) * 1e6
+    }
+
+async def _measure(token: str, iterations: int, cached: bool):
+    samples = []
+    for _ in range(iterations):
+        if not cached:
+            token_cache.clear()
+            mongodb_service.user_cache.clear()
+        start = time.perf_counter()
+        await get_current_user(token)
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+async def main(iterations: int, in_memory: bool):
+    if in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        mongodb_service.client = AsyncMongoMockClient()
+        mongodb_service.db = mongodb_service.client["bench"]
+    else:
+        await mongodb_service.connect()
+
+    email = "bench-auth@example.com"
+    await mongodb_service.db.users.delete_many({"email": email})
+    await mongodb_service.create_user(User(email=email, hashed_password="x"))
+    token = create_access_token({"sub": email}, expires_delta=timedelta(minutes=30))
+
+    results = {
+        "uncached": await _measure(token, iterations, cached=False),
+        "cached": await _measure(token, iterations, cached=True)
+    }
+    await mongodb_service.db.users.delete_many({"email": email})
+    await mongodb_service.close()
+
+    print(f"{'mode':<10}{'p50 (us)':>12}{'p99 (us)':>12}{'mean (us)':>12}")
+    for mode, stats in results.items():
+        print(f"{mode:<10}{stats['p50_us']:>12.1f}{stats['p99_us']:>12.1f}{stats['mean_us']:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--in-memory", action="store_true", help="Use mongomock-motor instead of MongoDB")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.in_memory))
@@ -0,0 +1,118 @@
+"""Compare diagnosis prompt context before and after budgeting.
+
+Builds a temporary Chroma collection of long repair chunks, many of them
+near-duplicates (the same passage ingested from several manuals with small
+edits), then for each query compares the old context, the top 5 results joined
+verbatim, with the assembled context: its size, how many distinct topics it
+covers, the assembly latency and the prefill time saved at --prefill-tps:
+
+    python -m benchmarks.bench_context_budget --queries 200 --budget 1024 --prefill-tps 400
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from app.services.vector_db_service import vector_db_service
+from app.services.context_service import ContextAssembler, estimate_tokens
+from benchmarks.offline import HashEmbeddingFunction
+
+TOPICS = {
+    "misfire": "spark plug ignition coil misfire rough idle cylinder firing order plug gap coil pack",
+    "vacuum": "vacuum leak intake manifold gasket lean condition hose crack smoke test fuel trim",
+    "brakes": "brake pad rotor caliper grinding squeal pedal pulsation brake fluid backing plate",
+    "cooling": "coolant thermostat water pump radiator overheating fan reservoir head gasket",
+    "cv_joint": "cv joint axle boot clicking turning grease wheel bearing steering knuckle",
+    "battery": "battery alternator charging voltage terminal corrosion starter slow crank",
+    "transmission": "transmission fluid slipping shift solenoid torque converter harsh shift clutch",
+    "fuel": "fuel pump pressure injector filter regulator hesitation stall rail"
+}
+FILLER = "inspect check replace measure verify the component before continuing with the procedure".split()
+
+def _chunk(rng: random.Random, topic: str, words: int) -> str:
+    vocabulary = TOPICS[topic].split()
+    return " ".join(rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(FILLER) for _ in range(words))
+
+def _near_duplicate(rng: random.Random, text: str, edits: int = 3) -> str:
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(FILLER)
+    return " ".join(words)
+
+def _topic_coverage(context: str, documents: dict) -> int:
+    return len({documents[chunk] for chunk in context.split("\n") if chunk in documents})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks-per-topic", type=int, default=12)
+    parser.add_argument("--duplicates", type=int, default=3, help="Near-duplicate copies of each chunk")
+    parser.add_argument("--words", type=int, default=170, help="Words per chunk (~1000 characters)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1024, help="Context token budget")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--prefill-tps", type=float, default=400, help="LLM prompt evaluation rate, tokens/s")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topic_of = {}
+    for topic in TOPICS:
+        for _ in range(args.chunks_per_topic):
+            chunk = _chunk(rng, topic, args.words)
+            topic_of[chunk] = topic
+            for _ in range(args.duplicates):
+                topic_of[_near_duplicate(rng, chunk)] = topic
+    documents = list(topic_of)
+
+    path = tempfile.mkdtemp(prefix="bench-context-")
+    try:
+        vector_db_service.connect(path=path, embedding_function=HashEmbeddingFunction())
+        vector_db_service.add_documents(
+            "automotive_knowledge", documents, [{"topic": topic_of[d]} for d in documents],
+            [f"chunk-{index}" for index in range(len(documents))]
+        )
+        assembler = ContextAssembler(candidates=args.candidates, token_budget=args.budget,
+                                     prefill_tokens_per_second=args.prefill_tps)
+
+        baseline_tokens, budget_tokens, baseline_topics, budget_topics, latencies = [], [], [], [], []
+        topics = list(TOPICS)
+        for _ in range(args.queries):
+            # Symptoms usually span one or two systems
+            query = " ".join(_chunk(rng, topic, 12) for topic in rng.sample(topics, rng.choice((1, 2))))
+            embedding = vector_db_service.embed_texts([query])[0]
+            baseline = vector_db_service.query_collection("automotive_knowledge", query, 5, query_embedding=embedding)
+            baseline_context = "\n".join(baseline["documents"][0])
+            wide = vector_db_service.query_collection(
+                "automotive_knowledge", query, args.candidates, query_embedding=embedding,
+                include=ContextAssembler.QUERY_INCLUDE
+            )
+
+            started = time.perf_counter()
+            context, report = assembler.assemble(wide, embedding)
+            latencies.append((time.perf_counter() - started) * 1e6)
+
+            baseline_tokens.append(estimate_tokens(baseline_context))
+            budget_tokens.append(report["context_tokens"])
+            baseline_topics.append(_topic_coverage(baseline_context, topic_of))
+            budget_topics.append(_topic_coverage(context, topic_of))
+    finally:
+        vector_db_service.close()
+        shutil.rmtree(path, ignore_errors=True)
+
+    saved = statistics.mean(baseline_tokens) - statistics.mean(budget_tokens)
+    latencies.sort()
+    print(f"corpus: {len(documents)} chunks ({args.duplicates} near-duplicates per original), "
+          f"{args.queries} queries, budget {args.budget} tokens")
+    print(f"{'':>22} {'tokens (mean)':>14} {'tokens (max)':>13} {'topics':>7}")
+    print(f"{'top-5 verbatim':>22} {statistics.mean(baseline_tokens):>14.0f} {max(baseline_tokens):>13} "
+          f"{statistics.mean(baseline_topics):>7.2f}")
+    print(f"{'reranked + budgeted':>22} {statistics.mean(budget_tokens):>14.0f} {max(budget_tokens):>13} "
+          f"{statistics.mean(budget_topics):>7.2f}")
+    print(f"tokens saved per prompt: {saved:.0f} (~{saved / args.prefill_tps * 1000:.0f} ms prefill "
+          f"at {args.prefill_tps:.0f} tokens/s)")
+    print(f"assembly latency: p50 {latencies[len(latencies) // 2]:.0f}us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.0f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Report hit rate and latency of the rule-based DTC fast path.
+
+Replays a mix of requests (single well-known codes, related codes, codes from
+different systems, unknown codes, no codes) through the DTC engine and reports
+how many would skip the LLM, plus triage and severity-classification latency.
+Pass --llm-seconds to estimate the generation time saved:
+
+    python -m benchmarks.bench_dtc_triage --requests 20000 --llm-seconds 8
+"""
+import argparse
+import random
+import time
+import statistics
+from app.services.dtc_service import DTCKnowledgeEngine
+
+def _request_mix(engine: DTCKnowledgeEngine, count: int, rng: random.Random):
+    codes = sorted(engine.codes)
+    groups = {}
+    for code, entry in engine.codes.items():
+        groups.setdefault(entry["group"], []).append(code)
+    related = [group for group in groups.values() if len(group) > 1]
+    unknown = ["P0999", "P1456", "P2A00", "B1234", "U0401"]
+
+    mix = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.45:
+            mix.append([rng.choice(codes)])
+        elif kind < 0.6:
+            mix.append(rng.sample(rng.choice(related), 2))
+        elif kind < 0.75:
+            mix.append(rng.sample(codes, 2))
+        elif kind < 0.85:
+            mix.append([rng.choice(unknown)])
+        else:
+            mix.append([])
+    return mix
+
+def _summary(samples):
+    samples = sorted(samples)
+    return (f"p50 {samples[len(samples) // 2] * 1e6:.1f}µs  "
+            f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:.1f}µs  "
+            f"mean {statistics.mean(samples) * 1e6:.1f}µs")
+
+def main(requests: int, llm_seconds: float, seed: int):
+    engine = DTCKnowledgeEngine()
+    started = time.perf_counter()
+    engine.load()
+    print(f"index built in {(time.perf_counter() - started) * 1000:.1f}ms "
+          f"({len(engine.codes)} codes, {len(engine.prefixes)} families)")
+
+    mix = _request_mix(engine, requests, random.Random(seed))
+    triage_times, severity_times = [], []
+    for codes in mix:
+        start = time.perf_counter()
+        engine.triage(codes)
+        triage_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        engine.classify_severity(codes)
+        severity_times.append(time.perf_counter() - start)
+
+    stats = engine.get_stats()
+    with_codes = stats["hits"] + stats["fallbacks"]
+    print(f"requests:            {requests} ({with_codes} with codes)")
+    print(f"fast-path hit rate:  {stats['hit_rate']:.1%} of requests with codes "
+          f"({stats['hits']} answered locally, {stats['fallbacks']} sent to the LLM)")
+    print(f"triage:              {_summary(triage_times)}")
+    print(f"severity:            {_summary(severity_times)}")
+    if llm_seconds:
+        print(f"LLM time avoided:    ~{stats['hits'] * llm_seconds / 60:.1f} min "
+              f"at {llm_seconds:.1f}s per generation")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--llm-seconds", type=float, default=0.0,
+                        help="Typical LLM diagnosis latency, to estimate time saved")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.requests, args.llm_seconds, args.seed)
@@ -0,0 +1,86 @@
+"""Measure how much embedding time the embedding cache saves on repeated diagnosis queries.
+
+Diagnosis queries are built from a vehicle and an issue description, so
+popular vehicle/issue pairs repeat constantly. The workload draws --queries
+such texts from a Zipf distribution over --distinct pairs and embeds them
+one at a time and in batches of --batch, three ways: straight through the
+model, through the in-memory cache, and through a cache with a cold memory
+tier but a disk store filled by an earlier run (a restarted worker). By
+default the model is a hashing function with --model-ms of simulated latency
+per call plus --text-ms per text; pass --embedding-function default to time
+the real local ONNX model instead:
+
+    python -m benchmarks.bench_embedding_cache --queries 5000 --distinct 500 --batch 16
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from typing import List
+from app.services.embedding_service import CachedEmbeddingFunction, create_embedding_function
+from benchmarks.offline import HashEmbeddingFunction
+
+MAKES = ["Honda Civic", "Toyota Corolla", "Ford F-150", "Chevrolet Silverado", "Nissan Altima", "BMW 3 Series"]
+ISSUES = ["rough idle when cold", "grinding noise when braking", "clicking sound when turning",
+          "engine overheats in traffic", "check engine light with P0420", "transmission slips in second gear",
+          "battery drains overnight", "steering wheel shakes at highway speed"]
+
+class SimulatedModel(HashEmbeddingFunction):
+    """Hash embeddings that take as long as a small local model would"""
+
+    def __init__(self, call_ms: float, text_ms: float):
+        super().__init__(dimensions=384)
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+
+    def __call__(self, input):
+        time.sleep((self.call_ms + self.text_ms * len(input)) / 1000)
+        return super().__call__(input)
+
+def _workload(rng: random.Random, queries: int, distinct: int) -> List[str]:
+    pairs = [f"{rng.choice(MAKES)} {2000 + rng.randint(0, 25)} {rng.choice(ISSUES)} #{index}" for index in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(pairs, weights, k=queries)
+
+def _run(embed, texts: List[str], batch: int) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch):
+        embed(texts[start:start + batch])
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    parser.add_argument("--model-ms", type=float, default=2.0, help="Simulated latency per model call")
+    parser.add_argument("--text-ms", type=float, default=0.5, help="Simulated latency per embedded text")
+    parser.add_argument("--embedding-function", help="'default' or module:factory instead of the simulated model")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    texts = _workload(random.Random(args.seed), args.queries, args.distinct)
+    model = create_embedding_function(args.embedding_function) if args.embedding_function \
+        else SimulatedModel(args.model_ms, args.text_ms)
+    store = tempfile.mkdtemp(prefix="embedding-store-")
+    try:
+        print(f"{args.queries} queries over {args.distinct} distinct texts, model: {model.name()}")
+        print(f"{'embedding':<14}{'calls':<8}{'seconds':>9}{'us/text':>9}{'hit rate':>10}")
+        for batch in (1, args.batch):
+            calls = "single" if batch == 1 else f"x{batch}"
+            elapsed = _run(model, texts, batch)
+            print(f"{'uncached':<14}{calls:<8}{elapsed:>9.3f}{elapsed / len(texts) * 1e6:>9.0f}{'-':>10}")
+            for tier in ("cold start", "warm disk"):
+                # warm disk: an empty memory tier over the store the cold start run filled
+                embed = CachedEmbeddingFunction(model, max_size=args.cache_size, disk_path=f"{store}/{batch}")
+                elapsed = _run(embed, texts, batch)
+                stats = embed.get_stats()
+                print(f"{tier:<14}{calls:<8}{elapsed:>9.3f}{elapsed / len(texts) * 1e6:>9.0f}{stats['hit_rate']:>10.1%}")
+                embed.close()
+    finally:
+        shutil.rmtree(store, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare per-call httpx clients against the pooled LLMService client.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_llm_client --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from app.services.llm_service import LLMService
+from benchmarks.stub_ollama import StubOllamaServer
+
+async def _run(call, total: int, concurrency: int) -> float:
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+async def main(total: int, concurrency: int, latency: float):
+    server = StubOllamaServer(latency=latency)
+    await server.start()
+    url = f"{server.base_url}/api/generate"
+    payload = {"model": "stub", "prompt": "ping", "stream": False}
+
+    # Baseline: a fresh client (and TCP connection) for every call
+    async def unpooled():
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, json=payload)
+            response.raise_for_status()
+
+    before_connections = server.connections
+    unpooled_rps = await _run(unpooled, total, concurrency)
+    unpooled_connections = server.connections - before_connections
+
+    # Every call sends the same prompt, so single-flight would coalesce them into a few requests
+    service = LLMService(backends=[("ollama", server.base_url)], max_concurrency=concurrency, single_flight=False)
+    await service.connect()
+
+    async def pooled():
+        await service.generate_response("ping")
+
+    before_connections = server.connections
+    pooled_rps = await _run(pooled, total, concurrency)
+    pooled_connections = server.connections - before_connections
+
+    await service.close()
+    await server.stop()
+
+    print(f"{'mode':<10}{'req/s':>12}{'connections':>14}")
+    print(f"{'unpooled':<10}{unpooled_rps:>12.1f}{unpooled_connections:>14}")
+    print(f"{'pooled':<10}{pooled_rps:>12.1f}{pooled_connections:>14}")
+    print(f"speedup: {pooled_rps / unpooled_rps:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency per request (seconds)")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency))
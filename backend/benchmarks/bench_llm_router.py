@@ -0,0 +1,90 @@
+"""Compare one LLM backend with a routed pool, with and without hedging.
+
+Starts local stub Ollama servers: two healthy ones whose latency has a tail
+(--slow-probability of requests take --slow-factor times as long) and one that
+only returns 500s, standing in for a dead GPU box. Then it drives the same
+closed-loop load through each configuration and reports throughput, latency
+percentiles, failovers, hedges and circuit breaker opens:
+
+    python -m benchmarks.bench_llm_router --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import logging
+import time
+from app.services.llm_router_service import LLMRouter, OllamaBackend
+from benchmarks.stub_ollama import StubOllamaServer
+
+async def _drive(router: LLMRouter, total: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                await router.generate("ping")
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000 if ordered else float("nan")
+
+async def main(args):
+    healthy = [
+        StubOllamaServer(latency=args.latency, slow_probability=args.slow_probability,
+                         slow_factor=args.slow_factor, seed=seed)
+        for seed in (1, 2)
+    ]
+    broken = StubOllamaServer(latency=0.001, fail_probability=1.0)
+    for server in (*healthy, broken):
+        await server.start()
+
+    configurations = [
+        ("single backend", [healthy[0]], "least_outstanding", False),
+        ("pool, least outstanding", [*healthy, broken], "least_outstanding", False),
+        ("pool, latency weighted", [*healthy, broken], "latency", False),
+        ("pool + hedging", [*healthy, broken], "least_outstanding", True)
+    ]
+    print(f"{'configuration':<26}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          f"{'failovers':>11}{'hedges':>8}{'won':>6}{'opens':>7}")
+    for name, servers, balancing, hedge in configurations:
+        backends = [OllamaBackend(server.base_url, model="stub", max_concurrency=args.concurrency)
+                    for server in servers]
+        router = LLMRouter(backends, balancing=balancing, hedge=hedge,
+                           hedge_min_delay=args.hedge_min_delay, hedge_min_samples=20)
+        await router.connect()
+        # Warm-up fills the latency windows the hedge delay is based on; counters include it
+        await _drive(router, args.concurrency * 4, args.concurrency)
+
+        latencies, errors, elapsed = await _drive(router, args.requests, args.concurrency)
+        latencies.sort()
+        opens = sum(backend.breaker.opens for backend in backends)
+        print(f"{name:<26}{len(latencies) / elapsed:>8.1f}{_percentile(latencies, 0.5):>9.1f}"
+              f"{_percentile(latencies, 0.95):>9.1f}{_percentile(latencies, 0.99):>9.1f}{errors:>8}"
+              f"{router.stats['failovers']:>11}{router.stats['hedges']:>8}{router.stats['hedge_wins']:>6}{opens:>7}")
+        await router.close()
+
+    # Let stubs finish requests abandoned by hedging before shutting them down
+    await asyncio.sleep(args.latency * args.slow_factor)
+    for server in (*healthy, broken):
+        await server.stop()
+
+if __name__ == "__main__":
+    # The broken backend logs a warning per failed request
+    logging.basicConfig(level=logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="Healthy backend latency, seconds")
+    parser.add_argument("--slow-probability", type=float, default=0.04)
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
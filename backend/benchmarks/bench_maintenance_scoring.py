@@ -0,0 +1,104 @@
+"""Measure predictive maintenance scoring throughput, batched with NumPy against one vehicle at a time.
+
+Generates a synthetic fleet with a few years of issue history per vehicle and
+scores it twice in memory: chunk by chunk with one matrix product per chunk,
+and vehicle by vehicle as per-request inference would. With --end-to-end it
+also runs the full scoring job against the offline in-memory Mongo, including
+the chunked cursor reads, the $in issue queries and the bulk score writes
+(mongomock evaluates $in by scanning, so keep --vehicles small for this part):
+
+    python -m benchmarks.bench_maintenance_scoring --vehicles 20000 --issues-per-vehicle 4
+    python -m benchmarks.bench_maintenance_scoring --vehicles 2000 --end-to-end
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.services.db_service import mongodb_service
+from app.services.maintenance_service import MaintenanceService
+from benchmarks.offline import OfflineBackends
+
+CODES = ["P0300", "P0301", "P0171", "P0420", "P0442", "P0128", "P0700", "P0562", "C0035", "B0001", "U0100", "P0500"]
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+def _fleet(rng: random.Random, vehicles: int, issues_per_vehicle: float, now: datetime):
+    fleet, issues = [], []
+    for index in range(vehicles):
+        vehicle_id = ObjectId()
+        year = rng.randint(2000, now.year)
+        fleet.append({
+            "_id": vehicle_id,
+            "user_id": f"user-{index // 5}",
+            "year": year,
+            "mileage": rng.randint(0, 15000) * (now.year - year + 1) if rng.random() < 0.8 else None,
+            "last_service_date": now - timedelta(days=rng.randint(0, 900)) if rng.random() < 0.7 else None
+        })
+        for _ in range(int(rng.expovariate(1 / issues_per_vehicle)) if issues_per_vehicle else 0):
+            issues.append({
+                "vehicle_id": str(vehicle_id),
+                "created_at": now - timedelta(days=rng.uniform(0, 700)),
+                "severity": rng.choice(SEVERITIES),
+                "diagnostic_codes": rng.sample(CODES, rng.randint(0, 2))
+            })
+    return fleet, issues
+
+def _batched(service: MaintenanceService, fleet, issues_by_vehicle, now: datetime) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(fleet), service.chunk_size):
+        chunk = fleet[start:start + service.chunk_size]
+        chunk_issues = [issue for vehicle in chunk for issue in issues_by_vehicle.get(str(vehicle["_id"]), ())]
+        service.score_vehicles(chunk, chunk_issues, now)
+    return time.perf_counter() - started
+
+def _one_at_a_time(service: MaintenanceService, fleet, issues_by_vehicle, now: datetime) -> float:
+    started = time.perf_counter()
+    for vehicle in fleet:
+        service.score_vehicles([vehicle], issues_by_vehicle.get(str(vehicle["_id"]), []), now)
+    return time.perf_counter() - started
+
+async def _end_to_end(service: MaintenanceService, fleet, issues) -> dict:
+    backends = OfflineBackends()
+    await backends.start()
+    try:
+        await mongodb_service.db.vehicles.insert_many(fleet)
+        await mongodb_service.db.vehicle_issues.insert_many(issues)
+        return await service.run()
+    finally:
+        await backends.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=20000)
+    parser.add_argument("--issues-per-vehicle", type=float, default=4, help="Mean issues per vehicle")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--end-to-end", action="store_true", help="Also run the job against in-memory Mongo")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    now = datetime.now()
+    fleet, issues = _fleet(random.Random(args.seed), args.vehicles, args.issues_per_vehicle, now)
+    issues_by_vehicle = defaultdict(list)
+    for issue in issues:
+        issues_by_vehicle[issue["vehicle_id"]].append(issue)
+    service = MaintenanceService(chunk_size=args.chunk_size)
+    # Warm the DTC index and the code-to-subsystem cache before timing
+    service.score_vehicles(fleet[:100], issues, now)
+
+    print(f"{len(fleet)} vehicles, {len(issues)} issues, chunks of {args.chunk_size}")
+    print(f"{'scoring':<16}{'seconds':>9}{'vehicles/s':>12}")
+    for name, score in (("batched", _batched), ("one at a time", _one_at_a_time)):
+        elapsed = score(service, fleet, issues_by_vehicle, now)
+        print(f"{name:<16}{elapsed:>9.3f}{len(fleet) / elapsed:>12.0f}")
+
+    if args.end_to_end:
+        report = asyncio.run(_end_to_end(service, fleet, issues))
+        print(f"{'end to end':<16}{report['seconds']:>9.3f}{report['vehicles_per_second']:>12.0f}"
+              f"  (scoring alone {report['scoring_vehicles_per_second']:.0f} vehicles/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure the cost of metrics instrumentation.
+
+Times a bare span and a trivial endpoint served with and without
+MetricsMiddleware, calling the ASGI app directly so HTTP client overhead
+does not hide the difference:
+
+    python -m benchmarks.bench_metrics_overhead --iterations 50000
+"""
+import argparse
+import asyncio
+import time
+from fastapi import FastAPI
+from app.services.metrics_service import MetricsService, MetricsMiddleware
+
+def _span_cost(metrics: MetricsService, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.span("bench"):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping/{item_id}")
+    async def ping(item_id: int):
+        return {"item_id": item_id}
+
+    return app
+
+async def _request_cost(app, iterations: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping/1", "raw_path": b"/ping/1", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80)
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / iterations
+
+async def main(iterations: int):
+    enabled, disabled = MetricsService(enabled=True), MetricsService(enabled=False)
+    print(f"span (enabled):   {_span_cost(enabled, iterations) * 1e9:8.0f} ns")
+    print(f"span (disabled):  {_span_cost(disabled, iterations) * 1e9:8.0f} ns")
+
+    plain = _build_app()
+    instrumented = _build_app()
+    instrumented.add_middleware(MetricsMiddleware, metrics=MetricsService(enabled=True))
+    # Warm up both apps (middleware stack construction, route compilation)
+    await _request_cost(plain, 100)
+    await _request_cost(instrumented, 100)
+    baseline = await _request_cost(plain, iterations)
+    with_metrics = await _request_cost(instrumented, iterations)
+    print(f"request (plain):        {baseline * 1e6:8.1f} µs")
+    print(f"request (instrumented): {with_metrics * 1e6:8.1f} µs  "
+          f"(+{(with_metrics - baseline) * 1e6:.1f} µs, {(with_metrics / baseline - 1):+.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
@@ -0,0 +1,83 @@
+"""Latency of an unrelated endpoint during a burst of logins.
+
+Compares bcrypt run inline on the event loop against the password
+service's worker pool. Uses mongomock-motor, so no MongoDB is needed:
+
+    python -m benchmarks.bench_password_burst --logins 50 --probes 200
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from mongomock_motor import AsyncMongoMockClient
+from app.models.user import User
+from app.routes import auth
+from app.services.db_service import mongodb_service
+from app.services.password_service import password_service
+
+EMAIL = "bench-login@example.com"
+PASSWORD = "correct horse battery staple"
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth.router)
+
+    @app.get("/probe")
+    async def probe():
+        return {"ok": True}
+
+    return app
+
+async def _run_inline(func, *args):
+    return func(*args)
+
+async def _burst(client: httpx.AsyncClient, logins: int, probes: int):
+    async def login():
+        response = await client.post("/api/auth/token", data={"username": EMAIL, "password": PASSWORD})
+        response.raise_for_status()
+
+    async def probe_loop():
+        # Probes are measured from their scheduled start, so time spent waiting
+        # for a blocked event loop counts against them
+        samples = []
+        first = time.perf_counter()
+        for i in range(probes):
+            scheduled = first + i * 0.005
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await client.get("/probe")
+            samples.append(time.perf_counter() - scheduled)
+        return samples
+
+    login_tasks = [asyncio.create_task(login()) for _ in range(logins)]
+    samples = await probe_loop()
+    await asyncio.gather(*login_tasks)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+async def main(logins: int, probes: int):
+    mongodb_service.client = AsyncMongoMockClient()
+    mongodb_service.db = mongodb_service.client["bench"]
+    await mongodb_service.create_user(User(email=EMAIL, hashed_password=await password_service.hash(PASSWORD)))
+
+    transport = httpx.ASGITransport(app=_build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Baseline: bcrypt called directly on the event loop, as before
+        offloaded_run = password_service._run
+        password_service._run = _run_inline
+        inline = await _burst(client, logins, probes)
+        password_service._run = offloaded_run
+        offloaded = await _burst(client, logins, probes)
+
+    password_service.close()
+    print(f"probe latency during {logins} concurrent logins")
+    print(f"{'mode':<12}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    print(f"{'inline':<12}{inline[0]:>10.2f}{inline[1]:>10.2f}")
+    print(f"{'offloaded':<12}{offloaded[0]:>10.2f}{offloaded[1]:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.probes))
@@ -0,0 +1,94 @@
+"""Compare model-based response serialization with the direct document fast path.
+
+Builds Mongo-shaped vehicle documents (ObjectIds, millisecond datetimes) with
+0, 100 and 1,000 issues and serializes each as GET /api/vehicles/{id} would:
+once by constructing Vehicle and VehicleIssue models and encoding them the way
+FastAPI's default response path does (jsonable_encoder, then json.dumps), and
+once with public_doc and FastJSONResponse. Also compares a 50-vehicle list
+returned as full Vehicle models against VehicleListItem documents. Both paths
+must produce the same JSON:
+
+    python -m benchmarks.bench_serialization --repeat 200
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.models.vehicle import Vehicle, VehicleIssue
+from app.services.serialization_service import FastJSONResponse, public_doc, public_docs, orjson
+
+def _now(rng: random.Random) -> datetime:
+    # Mongo stores datetimes with millisecond precision
+    return (datetime(2026, 1, 1) + timedelta(seconds=rng.randint(0, 10 ** 7))).replace(microsecond=rng.randint(0, 999) * 1000)
+
+def _vehicle(rng: random.Random) -> dict:
+    return {
+        "_id": ObjectId(), "user_id": str(ObjectId()), "make": "Honda", "model": "Civic",
+        "year": rng.randint(2000, 2026), "type": "sedan", "vin": "1HGCM82633A004352",
+        "mileage": rng.randint(0, 250000), "last_service_date": _now(rng),
+        "created_at": _now(rng), "updated_at": _now(rng)
+    }
+
+def _issue(rng: random.Random, vehicle_id: str) -> dict:
+    return {
+        "_id": ObjectId(), "vehicle_id": vehicle_id, "title": "Issue on 2026-03-14",
+        "description": "Rough idle when cold and a flashing check engine light under load",
+        "severity": rng.choice(["low", "medium", "high", "critical"]), "created_at": _now(rng),
+        "resolved": rng.random() < 0.3, "resolution": None, "diagnostic_codes": ["P0300", "P0301"]
+    }
+
+def _models(vehicle: dict, issues: list) -> bytes:
+    """What get_vehicle and the default response path did: build models, then encode them"""
+    doc = dict(vehicle, id=str(vehicle["_id"]))
+    doc["issues"] = [VehicleIssue(**dict(issue, id=str(issue["_id"]))) for issue in issues]
+    return JSONResponse(jsonable_encoder(Vehicle(**doc))).body
+
+def _fast(vehicle: dict, issues: list) -> bytes:
+    # The route owns the documents it read; copies here keep the inputs reusable between rounds
+    doc = dict(vehicle)
+    doc["issues"] = public_docs(dict(issue) for issue in issues)
+    return FastJSONResponse(public_doc(doc)).body
+
+def _models_list(vehicles: list) -> bytes:
+    return JSONResponse(jsonable_encoder([Vehicle(**dict(v, id=str(v["_id"]))) for v in vehicles])).body
+
+def _fast_list(vehicles: list) -> bytes:
+    fields = ("_id", "make", "model", "year", "type", "vin", "mileage", "last_service_date")
+    return FastJSONResponse(public_docs({field: v[field] for field in fields} for v in vehicles)).body
+
+def _time(function, repeat: int, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - started) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"JSON library: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"{'response':<22}{'models us':>11}{'fast us':>10}{'speedup':>9}{'bytes':>9}")
+    for count in (0, 100, 1000):
+        vehicle = _vehicle(rng)
+        issues = [_issue(rng, str(vehicle["_id"])) for _ in range(count)]
+        expected, actual = json.loads(_models(vehicle, issues)), json.loads(_fast(vehicle, issues))
+        assert expected == actual, f"fast path differs from the model path with {count} issues"
+        repeat = max(args.repeat // max(count // 100, 1), 5)
+        models, fast = _time(_models, repeat, vehicle, issues), _time(_fast, repeat, vehicle, issues)
+        print(f"{f'vehicle, {count} issues':<22}{models * 1e6:>11.0f}{fast * 1e6:>10.0f}"
+              f"{models / fast:>8.1f}x{len(_fast(vehicle, issues)):>9}")
+
+    vehicles = [_vehicle(rng) for _ in range(50)]
+    models, fast = _time(_models_list, args.repeat, vehicles), _time(_fast_list, args.repeat, vehicles)
+    print(f"{'list, 50 vehicles':<22}{models * 1e6:>11.0f}{fast * 1e6:>10.0f}"
+          f"{models / fast:>8.1f}x{len(_fast_list(vehicles)):>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Measure LLM calls saved by single-flight coalescing during bursts of identical diagnoses.
+
+Runs on the offline stand-ins. Each burst fires --burst-size concurrent
+diagnoses of the same trending fault, mixed with --distinct one-off issues, once
+with coalescing off and once with it on. It reports how many generations reached
+the (stub) LLM and the latency callers saw:
+
+    python -m benchmarks.bench_single_flight --bursts 5 --burst-size 50 --first-token-ms 800
+"""
+import argparse
+import asyncio
+import logging
+import time
+from app.services.llm_service import llm_service
+from app.services.cache_service import diagnosis_cache
+from benchmarks.offline import OfflineBackends
+
+VEHICLE = {"make": "Honda", "model": "Civic", "year": 2018, "mileage": 60000}
+
+async def _timed(coroutine):
+    started = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - started
+
+async def _run(bursts: int, burst_size: int, distinct: int, label: str):
+    latencies = []
+    for burst in range(bursts):
+        trending = f"check engine light and shudder at 40 mph ({label} fault {burst})"
+        issues = [trending] * burst_size + [f"unrelated noise {label} {burst}-{i}" for i in range(distinct)]
+        latencies += await asyncio.gather(*(
+            _timed(llm_service.diagnose_vehicle_issue(VEHICLE, issue)) for issue in issues
+        ))
+    return sorted(latencies)
+
+async def main(args):
+    backends = OfflineBackends(first_token_latency=args.first_token_ms / 1000)
+    await backends.start()
+    try:
+        print(f"{'single-flight':<14}{'diagnoses':>10}{'llm calls':>11}{'coalesced':>11}{'p50 ms':>9}{'p95 ms':>9}")
+        for enabled in (False, True):
+            llm_service.single_flight = enabled
+            diagnosis_cache.clear()
+            before = backends.ollama.requests
+            latencies = await _run(args.bursts, args.burst_size, args.distinct, "on" if enabled else "off")
+            calls = backends.ollama.requests - before
+            coalesced = llm_service.get_single_flight_stats().get("diagnosis", {}).get("coalesced", 0)
+            print(f"{'on' if enabled else 'off':<14}{len(latencies):>10}{calls:>11}{coalesced:>11}"
+                  f"{latencies[len(latencies) // 2] * 1000:>9.0f}{latencies[int(len(latencies) * 0.95)] * 1000:>9.0f}")
+    finally:
+        await backends.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--distinct", type=int, default=5, help="One-off issues mixed into each burst")
+    parser.add_argument("--first-token-ms", type=float, default=800, help="Stub Ollama latency")
+    asyncio.run(main(parser.parse_args()))
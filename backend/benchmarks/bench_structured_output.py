@@ -0,0 +1,81 @@
+"""Compare the old brace-slicing JSON extraction with the tolerant structured-output parser.
+
+Builds a corpus of diagnosis responses shaped like real model output: clean
+JSON, JSON wrapped in prose or a code fence, JSON with trailing commas, and
+responses cut off at a random point (the token limit, a dropped stream). Each
+parser runs over the whole corpus; the report shows how many responses each
+turned into a valid diagnosis, which is how many generations no longer have to
+be thrown away, and the parse latency:
+
+    python -m benchmarks.bench_structured_output --responses 5000 --truncated 0.2
+"""
+import argparse
+import json
+import random
+import time
+from app.models.diagnosis import Diagnosis
+from app.services.structured_output_service import StructuredOutput, orjson
+
+CAUSES = ["Worn spark plugs", "Failing ignition coil", "Vacuum leak", "Clogged fuel injector",
+          "Faulty oxygen sensor", "Dirty mass airflow sensor", "Low fuel pressure"]
+ACTIONS = ["Inspect spark plugs", "Test ignition coils", "Smoke test for vacuum leaks",
+           "Check fuel pressure", "Clean the MAF sensor", "Read freeze frame data"]
+
+def _diagnosis(rng: random.Random) -> dict:
+    return {
+        "likely_causes": rng.sample(CAUSES, rng.randint(1, 4)),
+        "severity": rng.choice(["low", "medium", "high", "critical"]),
+        "recommended_actions": rng.sample(ACTIONS, rng.randint(1, 4)),
+        "diagnostic_codes": [f"P0{rng.randint(100, 399)}" for _ in range(rng.randint(0, 3))],
+        "explanation": " ".join(rng.choice(CAUSES + ACTIONS).lower() for _ in range(rng.randint(20, 80))) + "."
+    }
+
+def _response(rng: random.Random, truncated: float) -> str:
+    body = json.dumps(_diagnosis(rng), indent=rng.choice([None, 2]))
+    if rng.random() < truncated:
+        # Cut somewhere in the explanation, the last and longest field, like a token limit would
+        return body[:rng.randint(body.index('"explanation"') + 20, len(body) - 2)]
+    shape = rng.random()
+    if shape < 0.15:
+        return f"Here is the diagnosis for the vehicle:\n{body}\nLet me know if you need more detail."
+    if shape < 0.3:
+        return f"```json\n{body}\n```"
+    if shape < 0.35:
+        return body.replace("]", ",]", 1)
+    return body
+
+def _old_parse(response: str):
+    """The previous extraction: slice between the outermost braces, then json.loads"""
+    try:
+        json_start = response.find('{')
+        json_end = response.rfind('}') + 1
+        if json_start >= 0 and json_end > json_start:
+            return Diagnosis(**json.loads(response[json_start:json_end]))
+    except ValueError:
+        pass
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", type=int, default=5000)
+    parser.add_argument("--truncated", type=float, default=0.2, help="Fraction of responses cut off early")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [_response(rng, args.truncated) for _ in range(args.responses)]
+    output = StructuredOutput(Diagnosis, "diagnosis")
+
+    print(f"JSON library: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"{'parser':<12}{'usable':>9}{'unusable':>10}{'us/parse':>10}")
+    for name, parse in (("old", _old_parse), ("tolerant", output.parse)):
+        started = time.perf_counter()
+        usable = sum(parse(response) is not None for response in corpus)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<12}{usable:>9}{len(corpus) - usable:>10}{elapsed / len(corpus) * 1e6:>10.1f}")
+    stats = output.get_stats()
+    print(f"tolerant parser: {stats['parsed']} clean, {stats['repaired']} repaired, "
+          f"{stats['invalid']} invalid, {stats['failed']} failed")
+
+if __name__ == "__main__":
+    main()
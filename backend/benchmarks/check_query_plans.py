@@ -0,0 +1,27 @@
+"""Fail if any hot MongoDB query is planned as a collection scan.
+
+Runs explain() for each query in MongoDBService.explain_hot_queries against
+the configured MongoDB (indexes are provisioned on connect):
+
+    python -m benchmarks.check_query_plans
+"""
+import asyncio
+import sys
+from app.services.db_service import mongodb_service
+
+async def main() -> int:
+    await mongodb_service.connect()
+    try:
+        report = await mongodb_service.explain_hot_queries()
+    finally:
+        await mongodb_service.close()
+
+    failures = 0
+    for name, result in report.items():
+        status = "ok" if result["uses_index"] else "COLLSCAN"
+        failures += not result["uses_index"]
+        print(f"{name:<28}{status:<10}{' > '.join(result['stages'])}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,147 @@
+"""Measure cold start: process spawn to liveness, readiness and first diagnosis.
+
+By default this launches `uvicorn app.main:app` against the configured MongoDB,
+Chroma and Ollama, seeding a user and vehicle directly in MongoDB. With
+--offline the server runs on the stand-ins from benchmarks.offline instead.
+Those are connected before the app starts, so connect times there reflect the
+stand-ins, not real pools.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --offline --first-token-ms 800
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_import() -> float:
+    """Seconds to import app.main in a fresh interpreter"""
+    output = subprocess.check_output([
+        sys.executable, "-c",
+        "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+    ])
+    return float(output.decode().strip().splitlines()[-1])
+
+async def seed_mongodb():
+    """Create a throwaway user and vehicle in the configured MongoDB"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.config import MONGODB_URI, MONGODB_DB_NAME
+    from app.routes.auth import create_access_token
+
+    db = AsyncIOMotorClient(MONGODB_URI)[MONGODB_DB_NAME]
+    email = f"cold-start-{os.getpid()}@example.com"
+    user = await db.users.insert_one({"email": email, "hashed_password": "unused"})
+    vehicle = await db.vehicles.insert_one({
+        "user_id": str(user.inserted_id), "make": "Honda", "model": "Civic", "year": 2018, "type": "sedan"
+    })
+
+    async def cleanup():
+        await db.vehicle_issues.delete_many({"vehicle_id": str(vehicle.inserted_id)})
+        await db.vehicles.delete_one({"_id": vehicle.inserted_id})
+        await db.users.delete_one({"_id": user.inserted_id})
+
+    return create_access_token({"sub": email}), str(vehicle.inserted_id), cleanup
+
+async def wait_for(client: httpx.AsyncClient, path: str, timeout: float) -> float:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get(path)).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.01)
+    raise TimeoutError(f"{path} not healthy after {timeout}s")
+
+async def run(args) -> int:
+    import_seconds = measure_import()
+    port = free_port()
+    cleanup = None
+
+    if args.offline:
+        command = [sys.executable, "-m", "benchmarks.cold_start", "--serve-offline", str(port),
+                   "--first-token-ms", str(args.first_token_ms)]
+    else:
+        token, vehicle_id, cleanup = await seed_mongodb()
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+
+    spawned = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        if args.offline:
+            # The offline server seeds its own in-memory database and reports the credentials
+            seeded = json.loads(await asyncio.to_thread(process.stdout.readline))
+            token, vehicle_id = seeded["token"], seeded["vehicle_id"]
+
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout) as client:
+            live = await wait_for(client, "/health/live", args.timeout)
+            ready = await wait_for(client, "/health/ready", args.timeout)
+            status = (await client.get("/health/ready")).json()
+
+            headers = {"Authorization": f"Bearer {token}"}
+            latencies = []
+            for attempt in range(2):
+                started = time.perf_counter()
+                response = await client.post("/api/diagnostics/", headers=headers, json={
+                    "vehicle_id": vehicle_id,
+                    "issue_description": f"rough idle and hesitation on acceleration (run {attempt})"
+                })
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        if cleanup is not None:
+            await cleanup()
+
+    print(f"import app.main (fresh interpreter): {import_seconds:6.2f}s")
+    print(f"spawn -> live:                        {live - spawned:6.2f}s")
+    print(f"spawn -> ready:                       {ready - spawned:6.2f}s")
+    print(f"first diagnosis after ready:          {latencies[0]:6.2f}s")
+    print(f"second diagnosis:                     {latencies[1]:6.2f}s")
+    print(f"spawn -> first diagnosis complete:    {ready - spawned + latencies[0]:6.2f}s")
+    print(f"app-reported phases: {json.dumps(status['timings'])}")
+    print(f"checks: {json.dumps(status['checks'])}")
+    return 0
+
+async def serve_offline(port: int, first_token_ms: float):
+    import uvicorn
+    from app.main import app
+    from app.models.user import User
+    from app.models.vehicle import Vehicle
+    from app.routes.auth import create_access_token
+    from app.services.db_service import mongodb_service
+    from benchmarks.offline import OfflineBackends
+
+    # Stand-ins connect first; the app's own connect calls then see them as already connected
+    backends = OfflineBackends(first_token_latency=first_token_ms / 1000)
+    await backends.start()
+    user_id = await mongodb_service.create_user(User(email="cold-start@example.com", hashed_password="unused"))
+    vehicle_id = await mongodb_service.create_vehicle(
+        Vehicle(user_id=user_id, make="Honda", model="Civic", year=2018, type="sedan")
+    )
+    print(json.dumps({"token": create_access_token({"sub": "cold-start@example.com"}), "vehicle_id": vehicle_id}),
+          flush=True)
+    await uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")).serve()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--offline", action="store_true", help="Use in-memory/stub backends")
+    parser.add_argument("--first-token-ms", type=float, default=300, help="Stub Ollama latency (offline only)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--serve-offline", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve_offline:
+        asyncio.run(serve_offline(args.serve_offline, args.first_token_ms))
+    else:
+        sys.exit(asyncio.run(run(args)))
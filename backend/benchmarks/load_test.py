@@ -0,0 +1,327 @@
+"""Drive the real API routes with concurrent clients against offline backends.
+
+MongoDB, Ollama and Chroma are replaced by the stand-ins in benchmarks.offline,
+so runs are reproducible on any machine. The app is served by uvicorn on a local
+port (or called in-process with --transport asgi, which buffers streamed bodies).
+Reports throughput and latency percentiles per endpoint, and can compare against
+a saved baseline:
+
+    python -m benchmarks.load_test --clients 32 --duration 20 --output baseline.json
+    python -m benchmarks.load_test --clients 32 --duration 20 --baseline baseline.json --max-regression 0.10
+
+With --baseline the exit status is 1 if any endpoint's p95 regressed by more
+than --max-regression (and by more than --min-delta-ms, to ignore jitter on
+very fast endpoints).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Callable
+
+# Cheap bcrypt for the seeded users; the login scenario measures the pool, not the cost factor
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# The simulated clients share a few users; per-user rate limits would turn the run into a 429 count
+os.environ.setdefault("ADMISSION_RATE_PER_MINUTE", "1000000")
+os.environ.setdefault("ADMISSION_BURST", "100000")
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from app.main import app
+from app.models.user import User
+from app.models.vehicle import Vehicle, VehicleIssue, IssueSeverity
+from app.routes.auth import create_access_token
+from app.services.db_service import mongodb_service
+from app.services.vector_db_service import vector_db_service
+from app.services.cache_service import diagnosis_cache
+from app.services.password_service import password_service
+from benchmarks.offline import OfflineBackends
+
+DIAGNOSIS_TEXT = json.dumps({
+    "likely_causes": ["Worn spark plugs", "Failing ignition coil", "Vacuum leak"],
+    "severity": "high",
+    "recommended_actions": ["Inspect spark plugs", "Test ignition coils", "Smoke test for vacuum leaks"],
+    "diagnostic_codes": ["P0300"],
+    "explanation": "A rough idle with a misfire code usually points to the ignition system or unmetered air."
+})
+
+KNOWLEDGE = [
+    "Rough idle and misfires are commonly caused by worn spark plugs or failing ignition coils.",
+    "A vacuum leak lets unmetered air into the intake and causes lean codes such as P0171.",
+    "Grinding noises when braking usually mean the brake pads are worn down to the backing plate.",
+    "A clicking sound when turning often indicates a worn CV joint.",
+    "Overheating can be caused by low coolant, a stuck thermostat or a failed water pump."
+]
+CACHED_ISSUES = [
+    "rough idle when cold",
+    "grinding noise when braking",
+    "clicking sound when turning",
+    "engine overheats in traffic"
+]
+PASSWORD = "load-test-password"
+
+@dataclass
+class ClientContext:
+    email: str
+    token: str
+    vehicle_id: str
+    issue_id: str
+    rng: random.Random
+    counter: int = 0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    first_byte: List[float] = field(default_factory=list)
+    errors: int = 0
+
+# Scenarios
+def _request(method: str, path: Callable[[ClientContext], str], body: Optional[Callable[[ClientContext], Any]] = None,
+             form: bool = False, authenticated: bool = True):
+    def build(context: ClientContext) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"headers": context.headers if authenticated else {}}
+        if body is not None:
+            kwargs["data" if form else "json"] = body(context)
+        return {"method": method, "url": path(context), **kwargs}
+    return build
+
+def _unique_issue(context: ClientContext) -> str:
+    context.counter += 1
+    return f"intermittent stalling at highway speed, report {context.email} #{context.counter}"
+
+SCENARIOS = {
+    "diagnose_llm": _request(
+        "POST", lambda c: "/api/diagnostics/",
+        lambda c: {"vehicle_id": c.vehicle_id, "issue_description": _unique_issue(c)}
+    ),
+    "diagnose_cached": _request(
+        "POST", lambda c: "/api/diagnostics/",
+        lambda c: {"vehicle_id": c.vehicle_id, "issue_description": c.rng.choice(CACHED_ISSUES)}
+    ),
+    "diagnose_dtc": _request(
+        "POST", lambda c: "/api/diagnostics/",
+        lambda c: {"vehicle_id": c.vehicle_id, "issue_description": "check engine light", "obd_codes": ["P0420"]}
+    ),
+    "diagnose_stream": _request(
+        "POST", lambda c: "/api/diagnostics/stream",
+        lambda c: {"vehicle_id": c.vehicle_id, "issue_description": _unique_issue(c)}
+    ),
+    "list_issues": _request("GET", lambda c: f"/api/diagnostics/issues?vehicle_id={c.vehicle_id}&limit=20"),
+    "list_vehicles": _request("GET", lambda c: "/api/vehicles"),
+    "get_vehicle": _request("GET", lambda c: f"/api/vehicles/{c.vehicle_id}"),
+    "repair_guide": _request("GET", lambda c: f"/api/diagnostics/repair-guide/{c.issue_id}?vehicle_id={c.vehicle_id}"),
+    "me": _request("GET", lambda c: "/api/auth/me"),
+    "login": _request(
+        "POST", lambda c: "/api/auth/token",
+        lambda c: {"username": c.email, "password": PASSWORD}, form=True, authenticated=False
+    )
+}
+
+DEFAULT_MIX = "diagnose_llm=2,diagnose_cached=3,diagnose_dtc=2,diagnose_stream=1,list_issues=4,list_vehicles=2,get_vehicle=2,repair_guide=1,me=4,login=1"
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+# Setup
+async def seed(clients: int, seed_value: int) -> List[ClientContext]:
+    vector_db_service.add_documents(
+        "automotive_knowledge", KNOWLEDGE, [{"source": "load_test"}] * len(KNOWLEDGE),
+        [f"kb-{index}" for index in range(len(KNOWLEDGE))]
+    )
+    hashed_password = await password_service.hash(PASSWORD)
+    contexts = []
+    for index in range(clients):
+        email = f"load{index}@example.com"
+        user_id = await mongodb_service.create_user(User(email=email, hashed_password=hashed_password))
+        vehicle_id = await mongodb_service.create_vehicle(
+            Vehicle(user_id=user_id, make="Honda", model="Civic", year=2015 + index % 8, type="sedan", mileage=80000)
+        )
+        issue_ids = []
+        for number in range(25):
+            issue = VehicleIssue(
+                title=f"Seeded issue {number}",
+                description=CACHED_ISSUES[number % len(CACHED_ISSUES)],
+                severity=IssueSeverity.medium,
+                diagnostic_codes=["P0300"]
+            )
+            issue_ids.append(await mongodb_service.add_issue_to_vehicle(vehicle_id, issue))
+        contexts.append(ClientContext(
+            email=email,
+            token=create_access_token({"sub": email}),
+            vehicle_id=vehicle_id,
+            issue_id=issue_ids[0],
+            rng=random.Random(seed_value + index)
+        ))
+    return contexts
+
+# Load generation
+async def run_client(client: httpx.AsyncClient, context: ClientContext, scenarios: List[str], weights: List[float],
+                     deadline: float, record_after: float, results: Dict[str, EndpointStats]):
+    while time.perf_counter() < deadline:
+        name = context.rng.choices(scenarios, weights)[0]
+        request = SCENARIOS[name](context)
+        started = time.perf_counter()
+        first_byte = None
+        try:
+            async with client.stream(**request) as response:
+                async for _ in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        if started < record_after:
+            continue
+        stats = results.setdefault(name, EndpointStats())
+        if ok:
+            stats.latencies.append(elapsed)
+            stats.first_byte.append(first_byte if first_byte is not None else elapsed)
+        else:
+            stats.errors += 1
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+def summarize(results: Dict[str, EndpointStats], measured_seconds: float) -> Dict[str, Dict[str, Any]]:
+    report = {}
+    for name, stats in sorted(results.items()):
+        report[name] = {
+            "requests": len(stats.latencies),
+            "errors": stats.errors,
+            "rps": round(len(stats.latencies) / measured_seconds, 2),
+            **{f"p{int(q * 100)}_ms": _ms(percentile(stats.latencies, q)) for q in (0.5, 0.95, 0.99)},
+            "ttfb_p50_ms": _ms(percentile(stats.first_byte, 0.5))
+        }
+    return report
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 2) if value is not None else None
+
+def print_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'endpoint':<18}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}")
+    for name, row in report.items():
+        print(f"{name:<18}{row['requests']:>7}{row['errors']:>6}{row['rps']:>9.1f}"
+              f"{_fmt(row['p50_ms'])}{_fmt(row['p95_ms'])}{_fmt(row['p99_ms'])}{_fmt(row['ttfb_p50_ms'])}")
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+def compare(report: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            max_regression: float, min_delta_ms: float) -> List[str]:
+    """Endpoints whose p95 regressed beyond the threshold"""
+    regressions = []
+    for name, row in report.items():
+        before, after = baseline.get(name, {}).get("p95_ms"), row["p95_ms"]
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        status = "REGRESSED" if change > max_regression and after - before > min_delta_ms else "ok"
+        print(f"{name:<18} p95 {before:>9.1f} -> {after:>9.1f} ms ({change:+.1%}) {status}")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+async def start_server(app: FastAPI) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+def server_url(server: uvicorn.Server) -> str:
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    return f"http://{host}:{port}"
+
+async def main(args) -> int:
+    logging.basicConfig(level=logging.WARNING)
+    weights = parse_mix(args.mix)
+    backends = OfflineBackends(
+        first_token_latency=args.first_token_ms / 1000,
+        token_latency=args.token_ms / 1000,
+        response_text=DIAGNOSIS_TEXT
+    )
+    await backends.start()
+    server = None
+    try:
+        contexts = await seed(args.clients, args.seed)
+        diagnosis_cache.clear()
+        # The stand-ins are already connected, so the app runs without its lifespan
+        if args.transport == "asgi":
+            client_options = {"transport": httpx.ASGITransport(app=app), "base_url": "http://load-test"}
+        else:
+            server = await start_server(app)
+            client_options = {
+                "base_url": server_url(server),
+                "limits": httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+            }
+        async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), **client_options) as client:
+            results: Dict[str, EndpointStats] = {}
+            start = time.perf_counter()
+            record_after = start + args.warmup
+            deadline = record_after + args.duration
+            await asyncio.gather(*(
+                run_client(client, context, list(weights), list(weights.values()), deadline, record_after, results)
+                for context in contexts
+            ))
+            measured = time.perf_counter() - record_after
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await asyncio.sleep(0.1)
+        await backends.stop()
+
+    report = summarize(results, measured)
+    print(f"{args.clients} clients, {measured:.1f}s measured after {args.warmup:.0f}s warm-up "
+          f"(first token {args.first_token_ms:.0f}ms, {args.token_ms:.0f}ms/token)")
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "endpoints": report}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+        print(f"\nCompared with {args.baseline} (max p95 regression {args.max_regression:.0%}):")
+        regressions = compare(report, baseline, args.max_regression, args.min_delta_ms)
+        if regressions:
+            print(f"p95 regression in: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma-separated scenario=weight pairs")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="Stub Ollama time to first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="Stub Ollama time per further token")
+    parser.add_argument("--transport", choices=("http", "asgi"), default="http")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON (use as a future --baseline)")
+    parser.add_argument("--baseline", help="Report JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed p95 increase, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore p95 increases smaller than this")
+    sys.exit(asyncio.run(main(parser.parse_args())))
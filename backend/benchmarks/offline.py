@@ -0,0 +1,98 @@
+"""Offline stand-ins so the API can run without MongoDB, Ollama or a downloaded embedding model.
+
+- MongoDB: mongomock-motor, an in-memory Motor-compatible client
+- Ollama: StubOllamaServer, a local HTTP server with configurable token latency
+- Chroma: a PersistentClient in a temporary directory, using a deterministic
+  hashing embedding function instead of the default ONNX model
+"""
+import hashlib
+import inspect
+import logging
+import shutil
+import tempfile
+from typing import List, Optional
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from app.services.db_service import mongodb_service
+from app.services.vector_db_service import vector_db_service
+from app.services.llm_service import llm_service
+from benchmarks.stub_ollama import StubOllamaServer
+
+logger = logging.getLogger(__name__)
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """Bag-of-words feature hashing; fast, deterministic and needs no model download"""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        embeddings = []
+        for text in input:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for word in text.lower().split():
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimensions] += 1
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm else vector)
+        return embeddings
+
+    @staticmethod
+    def name() -> str:
+        return "hash"
+
+    def get_config(self):
+        return {"dimensions": self.dimensions}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction(config.get("dimensions", 256))
+
+def _patch_mongomock_bulk_updates():
+    """pymongo 4.9+ passes `sort` to bulk update and replace builders, which mongomock doesn't accept yet"""
+    from mongomock.collection import BulkOperationBuilder
+
+    for name in ("add_update", "add_replace"):
+        method = getattr(BulkOperationBuilder, name)
+        if "sort" not in inspect.signature(method).parameters:
+            setattr(BulkOperationBuilder, name, _without_sort(method))
+
+def _without_sort(method):
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+class OfflineBackends:
+    """Start every stand-in and point the service singletons at them"""
+
+    def __init__(self, first_token_latency: float = 0.2, token_latency: float = 0.01,
+                 response_text: Optional[str] = None):
+        self.ollama = StubOllamaServer(
+            latency=first_token_latency,
+            token_latency=token_latency,
+            **({"response_text": response_text} if response_text else {})
+        )
+        self.chroma_path: Optional[str] = None
+
+    async def start(self):
+        from mongomock_motor import AsyncMongoMockClient
+
+        _patch_mongomock_bulk_updates()
+        mongodb_service.client = AsyncMongoMockClient()
+        mongodb_service.db = mongodb_service.client["autofix_offline"]
+        await mongodb_service.ensure_indexes()
+
+        self.chroma_path = tempfile.mkdtemp(prefix="autofix-chroma-")
+        vector_db_service.connect(path=self.chroma_path, embedding_function=HashEmbeddingFunction())
+
+        await self.ollama.start()
+        llm_service.backend_specs = [("ollama", self.ollama.base_url)]
+        await llm_service.connect()
+        logger.info(f"Offline backends ready (chroma at {self.chroma_path}, ollama at {self.ollama.base_url})")
+
+    async def stop(self):
+        await llm_service.close()
+        await self.ollama.stop()
+        vector_db_service.close()
+        mongodb_service.db = None
+        if self.chroma_path:
+            shutil.rmtree(self.chroma_path, ignore_errors=True)
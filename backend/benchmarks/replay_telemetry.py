@@ -0,0 +1,120 @@
+"""Simulate thousands of vehicles streaming OBD-II telemetry.
+
+In-process mode (default) drives TelemetryService directly and flushes to
+MongoDB, reporting ingest throughput, flush cost and memory per vehicle.
+--no-db skips MongoDB and measures ingestion and buffering only:
+
+    python -m benchmarks.replay_telemetry --vehicles 5000 --seconds 30 --no-db
+
+With --ws-url it instead opens one WebSocket per vehicle against a running
+server (requires the `websockets` package and a token that owns the vehicles):
+
+    python -m benchmarks.replay_telemetry --ws-url ws://localhost:8000 --token ... --vehicle-ids ids.txt
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+import numpy as np
+from app.services.db_service import mongodb_service
+from app.services.telemetry_service import TelemetryService, PIDS
+
+def _generate_samples(rng: np.random.Generator, start: float, count: int, hz: float):
+    # Plausible idle-to-cruise ranges for each PID, with noise
+    base = np.array([800, 40, 90, 30, 35, 15, 8, 0, 2, 0.45])
+    spread = np.array([2500, 60, 8, 10, 40, 40, 20, 5, 3, 0.4])
+    values = base + spread * rng.random((count, len(PIDS)))
+    times = start + np.arange(count) / hz
+    return [
+        {"t": float(t), **{pid: float(v) for pid, v in zip(PIDS, row)}}
+        for t, row in zip(times, values)
+    ]
+
+async def run_in_process(vehicles: int, seconds: int, hz: float, batch: int):
+    service = TelemetryService(flush_interval=3600)
+    rng = np.random.default_rng(0)
+    vehicle_ids = [f"sim-{i:06d}" for i in range(vehicles)]
+    start_time = time.time() - seconds
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    ingest_seconds, flush_seconds, total_samples = 0.0, 0.0, 0
+    per_message = max(1, int(batch))
+    for offset in range(0, int(seconds * hz), per_message):
+        # Every vehicle sends one message covering `per_message` samples
+        messages = [
+            _generate_samples(rng, start_time + offset / hz, per_message, hz)
+            for _ in vehicle_ids
+        ]
+        started = time.perf_counter()
+        for vehicle_id, samples in zip(vehicle_ids, messages):
+            total_samples += service.ingest(vehicle_id, samples)
+        ingest_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        await service.flush()
+        flush_seconds += time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = service.get_stats()
+    print(f"vehicles:              {vehicles}")
+    print(f"samples ingested:      {total_samples}")
+    print(f"ingest throughput:     {total_samples / ingest_seconds:,.0f} samples/s")
+    if stats["flushed_samples"]:
+        print(f"flush throughput:      {stats['flushed_samples'] / flush_seconds:,.0f} samples/s "
+              f"({stats['bucket_writes']} bucket upserts)")
+    print(f"ring buffer per vehicle: {stats['buffer_bytes'] / vehicles / 1024:.1f} KiB")
+    print(f"retained heap per vehicle: {(current - baseline) / vehicles / 1024:.1f} KiB (peak {peak / 2**20:.1f} MiB)")
+
+async def run_websocket(url: str, token: str, vehicle_ids, seconds: int, hz: float, batch: int):
+    import websockets
+
+    sent = 0
+
+    async def vehicle(vehicle_id: str):
+        nonlocal sent
+        rng = np.random.default_rng(hash(vehicle_id) & 0xFFFF)
+        async with websockets.connect(f"{url}/api/telemetry/ws/{vehicle_id}?token={token}") as ws:
+            deadline = time.time() + seconds
+            while time.time() < deadline:
+                samples = _generate_samples(rng, time.time(), batch, hz)
+                await ws.send(json.dumps({"samples": samples}))
+                sent += len(samples)
+                await asyncio.sleep(batch / hz)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(vehicle(vehicle_id) for vehicle_id in vehicle_ids))
+    elapsed = time.perf_counter() - started
+    print(f"{len(vehicle_ids)} vehicles sent {sent} samples in {elapsed:.1f}s ({sent / elapsed:,.0f} samples/s)")
+
+async def main(args):
+    if args.ws_url:
+        with open(args.vehicle_ids) as f:
+            vehicle_ids = [line.strip() for line in f if line.strip()]
+        await run_websocket(args.ws_url, args.token, vehicle_ids, args.seconds, args.hz, args.batch)
+        return
+
+    if args.no_db:
+        await run_in_process(args.vehicles, args.seconds, args.hz, args.batch)
+        return
+
+    await mongodb_service.connect()
+    try:
+        await run_in_process(args.vehicles, args.seconds, args.hz, args.batch)
+    finally:
+        await mongodb_service.db.telemetry_buckets.delete_many({"vehicle_id": {"$regex": "^sim-"}})
+        await mongodb_service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=10, help="Simulated seconds of driving")
+    parser.add_argument("--hz", type=float, default=10, help="Samples per second per vehicle")
+    parser.add_argument("--batch", type=int, default=10, help="Samples per message")
+    parser.add_argument("--no-db", action="store_true", help="Skip MongoDB flushes")
+    parser.add_argument("--ws-url")
+    parser.add_argument("--token")
+    parser.add_argument("--vehicle-ids", help="File with one vehicle id per line (WebSocket mode)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A complete diagnosis, so responses pass the same validation as a real model's
+DEFAULT_RESPONSE = json.dumps({
+    "likely_causes": ["Faulty oxygen sensor"],
+    "severity": "medium",
+    "recommended_actions": ["Read the stored codes", "Test the upstream oxygen sensor"],
+    "diagnostic_codes": ["P0131"],
+    "explanation": "A slow or failed oxygen sensor makes the engine run rich or lean."
+})
+# Sent instead when the request's `format` is the repair guide schema
+REPAIR_GUIDE_RESPONSE = json.dumps({
+    "Safety Precautions": "Let the exhaust cool and disconnect the battery.",
+    "Tools Required": ["Oxygen sensor socket", "Ratchet", "Anti-seize compound"],
+    "Parts Required": "Upstream oxygen sensor",
+    "Step-by-Step Instructions": ["Unplug the sensor", "Unscrew it", "Fit the new sensor", "Clear the codes"],
+    "Estimated Time": "45 minutes",
+    "Tips and Warnings": "Keep anti-seize off the sensor tip."
+})
+
+class StubOllamaServer:
+    """Minimal HTTP/1.1 keep-alive server that mimics Ollama's /api/generate.
+
+    ``latency`` is the time to the first token and ``token_latency`` the time per
+    further token; streaming requests get NDJSON chunks paced accordingly. For
+    routing tests, ``slow_probability`` of requests take ``slow_factor`` times as
+    long (a latency tail) and ``fail_probability`` of them get a 500. Requests
+    whose ``format`` is a JSON schema get the text in ``format_responses`` under
+    the schema's title, if there is one, so repair guides get a repair guide.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 response_text: str = DEFAULT_RESPONSE, token_latency: float = 0.0,
+                 slow_probability: float = 0.0, slow_factor: float = 5.0, fail_probability: float = 0.0,
+                 seed: Optional[int] = None, format_responses: Optional[Dict[str, str]] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_latency = token_latency
+        self.slow_probability = slow_probability
+        self.slow_factor = slow_factor
+        self.fail_probability = fail_probability
+        self.rng = random.Random(seed)
+        self.response_text = response_text
+        self.tokens = _tokenize(response_text)
+        format_responses = {"RepairGuide": REPAIR_GUIDE_RESPONSE} if format_responses is None else format_responses
+        self.format_responses = {title: (text, _tokenize(text)) for title, text in format_responses.items()}
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Stub Ollama listening on {self.base_url}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Close idle keep-alive connections so their handlers finish rather than being cancelled
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests += 1
+                await self._respond(writer, json.loads(body or b"{}"))
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _response_for(self, payload: dict) -> Tuple[str, List[str]]:
+        response_format = payload.get("format")
+        title = response_format.get("title") if isinstance(response_format, dict) else None
+        return self.format_responses.get(title, (self.response_text, self.tokens))
+
+    def _final_chunk(self, payload: dict, response: str, tokens: List[str]) -> dict:
+        return {
+            "model": payload.get("model", ""),
+            "response": response,
+            "done": True,
+            # Usage fields as Ollama reports them; whitespace-split words stand in for tokens
+            "prompt_eval_count": len(payload.get("prompt", "").split()),
+            "eval_count": len(tokens),
+            "eval_duration": int((self.latency + self.token_latency * len(tokens)) * 1e9)
+        }
+
+    async def _respond(self, writer: asyncio.StreamWriter, payload: dict):
+        if self.rng.random() < self.fail_probability:
+            await asyncio.sleep(self.latency)
+            writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            return
+        slowdown = self.slow_factor if self.rng.random() < self.slow_probability else 1.0
+        text, tokens = self._response_for(payload)
+
+        if payload.get("stream", True):
+            await self._respond_streaming(writer, payload, tokens, slowdown)
+            return
+
+        await asyncio.sleep((self.latency + self.token_latency * len(tokens)) * slowdown)
+        body = json.dumps(self._final_chunk(payload, text, tokens)).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+        )
+        await writer.drain()
+
+    async def _respond_streaming(self, writer: asyncio.StreamWriter, payload: dict, tokens: List[str],
+                                 slowdown: float = 1.0):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await asyncio.sleep(self.latency * slowdown)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.token_latency * slowdown)
+            self._write_chunk(writer, {"model": payload.get("model", ""), "response": token, "done": False})
+            await writer.drain()
+        self._write_chunk(writer, self._final_chunk(payload, "", tokens))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def _write_chunk(self, writer: asyncio.StreamWriter, data: dict):
+        line = json.dumps(data).encode() + b"\n"
+        writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+
+def _tokenize(text: str) -> List[str]:
+    # Whitespace stays attached so the tokens join back into the text
+    return re.findall(r"\s*\S+\s*?", text) or [text]
@@ -37,10 +37,19 @@ export function ChatInterface({ vehicleInfo }: { vehicleInfo: VehicleInfo }) {
       
       setLoading(true);
       try {
-        const result = await diagnosticsAPI.diagnoseIssue({
-          vehicle_id: vehicleInfo.id,
-          issue_description: vehicleInfo.issue
-        });
+        // Show tokens as they arrive, then replace them with the formatted diagnosis
+        let streamed = "";
+        const result = await diagnosticsAPI.diagnoseIssueStream(
+          {
+            vehicle_id: vehicleInfo.id,
+            issue_description: vehicleInfo.issue
+          },
+          (token) => {
+            streamed += token;
+            setMessages([{ role: "assistant", content: streamed }]);
+          }
+        );
+        if (!result) throw new Error("Diagnosis stream ended without a result");
         
         setDiagnosis(result.diagnosis);
         setIssueId(result.issue_id);
@@ -135,7 +144,17 @@ export function ChatInterface({ vehicleInfo }: { vehicleInfo: VehicleInfo }) {
         userQuestion.toLowerCase().includes("repair")
       ) {
         if (issueId) {
-          const repairGuide = await diagnosticsAPI.getRepairGuide(issueId, vehicleInfo.id);
+          // Stream the guide into a placeholder message that is replaced once it is complete
+          let streamed = "";
+          setMessages(prev => [...prev, { role: "assistant", content: "" }]);
+          const replaceLastMessage = (content: string) =>
+            setMessages(prev => [...prev.slice(0, -1), { role: "assistant", content }]);
+          
+          const repairGuide = await diagnosticsAPI.getRepairGuideStream(issueId, vehicleInfo.id, (token) => {
+            streamed += token;
+            replaceLastMessage(streamed);
+          });
+          if (!repairGuide) throw new Error("Repair guide stream ended without a result");
           
           let response = "Here's a step-by-step repair guide:\n\n";
           
@@ -174,7 +193,7 @@ export function ChatInterface({ vehicleInfo }: { vehicleInfo: VehicleInfo }) {
             }
           }
           
-          setMessages(prev => [...prev, { role: "assistant", content: response }]);
+          replaceLastMessage(response);
         } else {
           setMessages(prev => [...prev, { 
             role: "assistant", 
@@ -95,6 +95,48 @@ export const vehicleAPI = {
   },
 };
 
+// Read a server-sent event stream, calling onEvent for every event
+const streamEvents = async (
+  path: string,
+  init: RequestInit,
+  onEvent: (event: string, data: any) => void
+) => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_URL}${path}`, {
+    ...init,
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary >= 0) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (data) onEvent(event, JSON.parse(data));
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+};
+
 // Diagnostics API
 export const diagnosticsAPI = {
   diagnoseIssue: async (data: {
@@ -106,10 +148,43 @@ export const diagnosticsAPI = {
     return response.data;
   },
   
+  diagnoseIssueStream: async (
+    data: {
+      vehicle_id: string;
+      issue_description: string;
+      obd_codes?: string[];
+    },
+    onToken: (token: string) => void
+  ) => {
+    let result: any = null;
+    await streamEvents(
+      '/api/diagnostics/stream',
+      { method: 'POST', body: JSON.stringify(data) },
+      (event, payload) => {
+        if (event === 'token') onToken(payload.token);
+        else if (event === 'diagnosis') result = payload;
+      }
+    );
+    return result;
+  },
+  
   getRepairGuide: async (issueId: string, vehicleId: string) => {
     const response = await apiClient.get(`/api/diagnostics/repair-guide/${issueId}?vehicle_id=${vehicleId}`);
     return response.data;
   },
+  
+  getRepairGuideStream: async (issueId: string, vehicleId: string, onToken: (token: string) => void) => {
+    let result: any = null;
+    await streamEvents(
+      `/api/diagnostics/repair-guide/${issueId}/stream?vehicle_id=${vehicleId}`,
+      { method: 'GET' },
+      (event, payload) => {
+        if (event === 'token') onToken(payload.token);
+        else if (event === 'repair_guide') result = payload;
+      }
+    );
+    return result;
+  },
 };
 
 export default apiClient;
\ No newline at end of file